@@ -1,296 +1,339 @@
+import hmac
 import os
-from flask import Flask, request, jsonify
+import time
+import threading
+import contextvars
+from flask import Flask, Response, request, jsonify, g
 from dotenv import load_dotenv
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor
-from utils.general_utils import extract_specialty_and_age, build_or_load_faiss
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from langchain_core.runnables import RunnableConfig
-from typing import List, Dict, Optional, Literal # Make sure Literal is here for decide_bot_route return type
-import typing
+from utils.general_utils import build_or_load_faiss
+import psutil
+from contextlib import ExitStack
+from config.constants import SESSION_TIMEOUT
+from config.settings import WARM_UP_ON_START, LLM_CASSETTE_MODE, CASSETTE_RECORDED_PATHS, ADMIN_TOKEN
 
 import lance_main  # Import everything from lance_main
+from conversation import message_flow, prewarm
+from conversation.session_store import make_session_store, LockTimeout, EXPIRED, MISSING
+from utils.concurrency import SingleFlight
+from utils.admission import AdmissionController, AdmissionRejected
+from utils import metrics, prompt_db
+from utils.log import get_logger, restart_after_fork
+from conversation import graph_builder
+from middleware.config.db import dispose_engine_after_fork
 from conversation.chat_state import initialize_symptom_session
 
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
+log = get_logger(__name__)
 
 application = Flask(__name__)
 
-executor = ThreadPoolExecutor(max_workers=(os.cpu_count() or 2) * 2)
+# Caps concurrent bot invocations and sheds excess load with 429 (see utils/admission.py)
+admission = AdmissionController()
+executor = ThreadPoolExecutor(max_workers=admission.max_in_flight or (os.cpu_count() or 2) * 2)
 
-conversations = {}
-SESSION_TIMEOUT = timedelta(minutes=15) # Session expires after 15 minutes of inactivity
+# Per-thread session records; SESSION_STORE=redis shares them across workers
+conversations = make_session_store()
+conversations.start_reaper()
+
+# Identical messages for a thread that arrive while the first is still running share its reply
+inflight = SingleFlight()
+
+BUSY_ERROR = ({'error': 'Another message for this thread is still being processed. Retry shortly.'}, 409)
+
+metrics.register_service_collectors(conversations, inflight, admission)
+
+# Track app start time for health checks
+start_time = datetime.now(timezone.utc)
+
+# PROMPT_CACHE=snapshot: the prompts are read once, here (in the gunicorn master when preloaded)
+prompt_db.load_at_startup()
+prompt_db.install_reload_signal()
+
+if WARM_UP_ON_START:
+    # In the background, so the worker starts accepting requests (and /health) right away
+    threading.Thread(target=lance_main.warm_up, name="warm-up", daemon=True).start()
+
+
+def after_fork():
+    """
+    Per-worker setup when the app is preloaded in a gunicorn master (gunicorn.conf.py post_fork):
+    threads do not survive fork and connections must not be shared with the parent, so the log
+    writer, the session reaper, the DB pool and the Redis pools are re-created in each worker.
+    """
+    restart_after_fork()
+    dispose_engine_after_fork()
+    graph_builder.reset_after_fork()
+    conversations.after_fork()
+    log.info("Worker ready", pid=os.getpid())
+
+
+def _bot_app(bot_key):
+    """Returns the compiled LangGraph app for a bot key (e.g. lance_main.symptom_app)."""
+    return getattr(lance_main, f"{bot_key}_app")
+
+
+@application.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@application.after_request
+def _observe_request(response):
+    # For /message/stream this is the time to the first byte; the turn's stages cover the rest
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        elapsed = time.perf_counter() - started
+        metrics.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=response.status_code)
+        if LLM_CASSETTE_MODE == "record" and endpoint in CASSETTE_RECORDED_PATHS:
+            from models.cassette import record_request
+            record_request(endpoint, request.get_json(silent=True), response.status_code, elapsed)
+    return response
+
+
+@application.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint: stage latencies, LLM calls and tokens, cache hit ratios, admission queues."""
+    return Response(metrics.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+
+@application.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint for monitoring: memory, live sessions and session store counters."""
+    return jsonify({
+        'status': 'healthy',
+        'memory_usage_mb': round(psutil.Process().memory_info().rss / 1024 / 1024, 2),
+        'uptime': str(datetime.now(timezone.utc) - start_time),
+        'session_timeout_minutes': SESSION_TIMEOUT.total_seconds() / 60,
+        'sessions': conversations.stats(),
+        'coalescing': inflight.stats(),
+        'admission': admission.stats(),
+    })
 
 
 @application.route('/start_conversation', methods=['POST'])
 def start_conversation():
     """
     Start a new conversation thread with optional context parameters.
-    Initializes a conversation session, storing references to the compiled bot apps
-    and setting up initial conversation state.
+    Initializes a conversation session and sets up initial conversation state.
     """
     data = request.get_json() or {}
     thread_id = data.get('thread_id')
     doctor_name = data.get('doctor_name')
-    consultation_type = data.get('consultation_type')
-    specialty = data.get('specialty')
-    age_group = data.get('age_group')
-    age = data.get('age')
-    vaccine_visit = data.get('vaccine_visit')
-    symptoms = data.get('symptoms')
-
-    # If consultation_type is provided, extract specialty and age_group from it
-    if consultation_type:
-        specialty, age_group = extract_specialty_and_age(consultation_type)
-    else:
-        # fallback to provided values or defaults
-        specialty = specialty or 'paediatrics'
-        age_group = age_group or None
-    
+
     if not thread_id or not doctor_name:
         return jsonify({'error': 'thread_id and doctor_name are required'}), 400
 
     # Initialize the conversation state for the new thread_id
-    conversations[thread_id] = {
-        'get_info_app': lance_main.get_info_app,   # Reference to the compiled Get Info bot
-        'symptom_app': lance_main.symptom_app,     # Reference to the compiled Symptom bot
-        'followup_app': lance_main.followup_app,   # Reference to the compiled Follow-up bot
-        'last_activity': datetime.now(timezone.utc), # Timestamp for session timeout
-        'configurable': {
-            'thread_id': thread_id,
-            'doctor_name': doctor_name,
-            'clinic_name': data.get('clinic_name', lance_main.CLINIC_INFO["name"]),
-            'specialty': specialty,
-            'age_group': age_group,
-            'age': age,
-            'gender': data.get('gender'),
-            'consultation_type': consultation_type,
-            'vaccine_visit': vaccine_visit,
-            'current_thread_history': [],
-            'is_initial_message': True,
-            'current_bot_key': None,
-            'ask_same_episode': False,
-            'prescription': data.get('prescription', lance_main.SAMPLE_PRESCRIPTION),
-            'symptom_summary': None,
-            'doctor_info_url': data.get('doctor_info_url', None),
-            'services': data.get('services', ""),
-            'symptoms': symptoms,
-        },
-        'appointment_data': data.get('appointment_data', {}) # Store appointment details
-    }
-    
+    conv = message_flow.build_conversation(data, datetime.now(timezone.utc))
+    conversations.save(thread_id, conv)
+    # Route prediction, prompt classification and fetch start now, not on the first /message
+    prewarm.start(conv, admission)
+
     return jsonify({
-        'message': f'Conversation {thread_id} started with doctor: {doctor_name} and specialty: {conversations[thread_id]["configurable"]["specialty"]}.'
+        'message': f'Conversation {thread_id} started with doctor: {doctor_name} and specialty: {conv["configurable"]["specialty"]}.'
     }), 200
 
 
+def _load_turn(data):
+    """
+    Validates a /message payload and loads the session, applying the payload's dynamic fields.
+    Must run under conversations.lock(thread_id). Returns ((thread_id, conv), None) or (None, (error_body, status)).
+    """
+    thread_id = data.get('thread_id')
+    user_message = data.get('message')
+
+    if not thread_id or not user_message:
+        return None, ({'error': 'thread_id and message are required'}, 400)
+
+    conv, state = conversations.lookup(thread_id)
+    if state == EXPIRED:
+        # The store has already dropped the expired session
+        return None, ({'error': 'Session expired after 15 minutes of inactivity.'}, 440)
+    if state == MISSING:
+        return None, ({'error': 'Conversation not found. Call /start_conversation first.'}, 404)
+
+    conv['last_activity'] = datetime.now(timezone.utc) # Update last activity timestamp
+
+    # Update all dynamic fields from payload BEFORE routing
+    message_flow.apply_message_updates(conv, data)
+    return (thread_id, conv), None
+
+
+def _route_turn(thread_id, conv, data, route):
+    """Appends the user message, routes the turn and prepares the bot session. Runs once the turn is admitted."""
+    plan = message_flow.plan_turn(conv, thread_id, data['message'], route)
+    plan['message_id'] = str(data['message_id']) if data.get('message_id') else None
+    if plan['bot_key'] is not None:
+        # Ensure the symptom/followup session is initialized before the bot is invoked
+        message_flow.initialize_bot_session(conv)
+    return plan
+
+
+def _finish_turn(thread_id, conv, plan, reply):
+    """
+    Shapes the /message body and persists the session (restarting its inactivity timer),
+    together with the body for replay when the client sent a message_id.
+    """
+    response = message_flow.build_response(plan, reply)
+    conversations.save(thread_id, conv, plan['message_id'], response)
+    return response
+
+
+def _lookup_replay(data):
+    """The response already sent for this message_id (a client retry), or None. Replays skip the graph and the checkpointer."""
+    if not data.get('thread_id') or not data.get('message_id'):
+        return None
+    return conversations.lookup_reply(data['thread_id'], str(data['message_id']))
+
+
+def _turn_key(data):
+    """Coalescing key: the same message_id (or, without one, the same text) on the same thread while the first copy is in flight."""
+    if data.get('message_id'):
+        return data.get('thread_id'), 'id', str(data['message_id'])
+    return data.get('thread_id'), 'text', (data.get('message') or '').strip()
+
+
+def _run_turn(data):
+    """
+    Runs one /message turn under the thread's lock. Returns (body, status); raises
+    AdmissionRejected when the server is saturated (before the session is modified).
+    """
+    try:
+        with conversations.lock(data.get('thread_id')):
+            replay = _lookup_replay(data)
+            if replay is not None:
+                return replay, 200
+            loaded, error = _load_turn(data)
+            if error:
+                return error
+            thread_id, conv = loaded
+            priority, route = message_flow.priority_class(conv, data['message'])
+            with admission.admit(priority), metrics.bot_context(message_flow.bot_for_class(priority)):
+                plan = _route_turn(thread_id, conv, data, route)
+
+                if plan['bot_key'] is None:
+                    # Answered by the routing rules themselves (same-episode check), no bot invoked
+                    return _finish_turn(thread_id, conv, plan, plan['reply']), 200
+
+                # --- Invoke the Selected Bot's LangGraph Application ---
+                selected_app = _bot_app(plan['bot_key'])
+                log.debug("Invoking bot", bot=plan['bot_key'], thread_id=thread_id)
+
+                # Execute the selected bot's graph in a separate thread to avoid blocking Flask
+                # (in a copy of this context, so its stages and LLM calls keep the bot label)
+                future = executor.submit(contextvars.copy_context().run, selected_app.invoke, conv['configurable'], plan['config'])
+                state_after_invoke = future.result() # Get the result from the bot
+
+                reply = message_flow.record_reply(conv, state_after_invoke)
+                return _finish_turn(thread_id, conv, plan, reply), 200
+    except LockTimeout:
+        return BUSY_ERROR
+
+
 @application.route('/message', methods=['POST'])
 def send_message():
     """
     Sends a user message to the chatbot. This endpoint handles routing to the correct bot
-    and managing the conversation history.
+    and managing the conversation history. Turns on one thread run one at a time, and a
+    duplicate of a message that is still being answered gets the same reply without a second LLM call.
     """
     data = request.get_json() or {}
-    print("Received /message payload:", data)  # Debug print
-    thread_id = data.get('thread_id')
-    user_message = data.get('message')
+    log.debug("Received /message", thread_id=data.get('thread_id'), message_id=data.get('message_id'), payload=data)
+    body, status = inflight.do(_turn_key(data), lambda: _run_turn(data))
+    return jsonify(body), status
 
-    if not thread_id or not user_message:
-        return jsonify({'error': 'thread_id and message are required'}), 400
 
-    if thread_id not in conversations:
-        return jsonify({'error': 'Conversation not found. Call /start_conversation first.'}), 404
+def _replay_stream(body):
+    yield message_flow.sse_event('start', {'bot_selection': body.get('bot_selection')})
+    yield message_flow.sse_event('done', body)
 
-    conv = conversations[thread_id]
 
-    # Check for session timeout
-    if datetime.now(timezone.utc) - conv['last_activity'] > SESSION_TIMEOUT:
-        conversations.pop(thread_id, None) # Remove expired session
-        return jsonify({'error': 'Session expired after 15 minutes of inactivity.'}), 440
+def _early_stream_response(body, status):
+    """/message/stream answer for a turn that never streams: errors as JSON, a coalesced or replayed reply as 'start' + 'done'."""
+    if status != 200:
+        return jsonify(body), status
+    return Response(_replay_stream(body), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
-    conv['last_activity'] = datetime.now(timezone.utc) # Update last activity timestamp
 
-    # Update all dynamic fields from payload BEFORE constructing ChatState
-    if data.get('appointment_data'):
-        conv['appointment_data'] = data['appointment_data']
-    if data.get('prescription'):
-        conv['configurable']['prescription'] = data['prescription']
-    if data.get('doctor_info_url'):
-        conv['configurable']['doctor_info_url'] = data['doctor_info_url']
-    if data.get('clinic_name'):
-        conv['configurable']['clinic_name'] = data['clinic_name']
-    if data.get('doctor_name'):
-        conv['configurable']['doctor_name'] = data['doctor_name']
-    if data.get('services'):
-        conv['configurable']['services'] = data['services']
-    for key in ['age_group', 'age', 'gender', 'specialty', 'vaccine_visit', 'symptoms']:
-        if data.get(key) is not None:
-            conv['configurable'][key] = data[key]
-
-    # Add symptoms to state if present
-    if data.get('symptoms'):
-        conv['configurable']['symptoms'] = data['symptoms']
-
-    user_message_obj = HumanMessage(content=user_message)
-    
-    # Append the new user message to the thread's cumulative history
-    conv['configurable']['current_thread_history'].append(user_message_obj)
-
-    selected_app = None # This will hold the LangGraph app to invoke (e.g., lance_main.symptom_app)
-    bot_selection_message = None # Message indicating which bot was selected
-    reply = '' # The AI's response
-
-    # RunnableConfig for LangGraph's checkpointer (memory) and other configurable parameters
-    runnable_config_obj = RunnableConfig(configurable={
-        "thread_id": thread_id, # CRITICAL: This links to the MemorySaver for each bot
-        "doctor_name": conv['configurable']['doctor_name'],
-        "clinic_name": conv['configurable']['clinic_name'],
-        "specialty": conv['configurable']['specialty']
-    })
+@application.route('/message/stream', methods=['POST'])
+def stream_message():
+    """
+    Streaming variant of /message. Replies with Server-Sent Events: a 'start' event with the
+    bot selection, one 'token' event per LLM token as the bot node produces it, and a final
+    'done' event carrying the same body /message would have returned.
+    """
+    data = request.get_json() or {}
+    key = _turn_key(data)
+    flight, leader = inflight.join(key)
+    if not leader:
+        return _early_stream_response(*flight.result())
 
-    # Ensure appointment_data is present for routing
-    if not conv.get('appointment_data') or not conv['appointment_data']:
-        conv['appointment_data'] = conversations[thread_id].get('appointment_data', {})
-    print('[DEBUG] appointment_data before routing:', conv['appointment_data'])
-
-    # Ensure appointment_data is present in the configurable state for routing
-    conv['configurable']['appointment_data'] = conv['appointment_data']
-
-    # --- Routing Logic: Prioritized If-Else Structure ---
-    print(f"[DEBUG] Routing logic - ask_same_episode: {conv['configurable']['ask_same_episode']}")
-    print(f"[DEBUG] Routing logic - is_initial_message: {conv['configurable']['is_initial_message']}")
-    print(f"[DEBUG] Routing logic - current_bot_key: {conv['configurable']['current_bot_key']}")
-
-    # Priority 1: Handling "Same Episode" follow-up question (Rule 3's second step)
-    if conv['configurable']['ask_same_episode']:
-        user_response = user_message.lower().strip()
-        conv['configurable']['ask_same_episode'] = False # Reset the flag after processing the response
-
-        if user_response == 'yes':
-            # User confirmed it's the same episode, retrieve previous details
-            previous_appointment = next((appt for appt in conv['appointment_data'].get("appointments", []) if appt.get("appt_status") == "completed" and appt.get("doctor_name") == conv['configurable']['doctor_name']), None)
-            if previous_appointment:
-                # Update current state with previous prescription and symptom summary
-                prescription = previous_appointment.get("prescription", None)
-                symptom_summary = previous_appointment.get("symptom-summary", None)
-                conv['configurable']['prescription'] = prescription
-                conv['configurable']['symptom_summary'] = symptom_summary
-                print("User confirmed same episode. Routing to Symptom Bot with previous context.")
-            else:
-                print("Previous appointment details not found for continuity. Starting fresh symptom collection.")
-            conv['configurable']['current_bot_key'] = 'symptom' # Set symptom bot as active
-            return jsonify({'reply': 'Continuing with previous episode. Please describe any new symptoms or concerns.'}), 200
-        else: # user_response is 'no' or anything else
-            print("User indicated new episode. Routing to Symptom Bot for fresh collection.")
-            conv['configurable']['current_bot_key'] = 'symptom' # Set symptom bot as active
-            return jsonify({'reply': 'Starting a new episode. Please describe your current symptoms.'}), 200
-
-    # Priority 2: Initial routing (first message in a new conversation thread)
-    elif conv['configurable']['is_initial_message']:
-        print("[DEBUG] Initial routing - calling decide_bot_route")
-        conv['configurable']['is_initial_message'] = False # Mark as not initial anymore
-
-        # Ensure 'messages' key is present for routing
-        conv['configurable']['messages'] = conv['configurable']['current_thread_history']
-        # Use the external router function from lance_main to decide the initial bot
-        route_decision = lance_main.decide_bot_route(conv['configurable'], runnable_config_obj)
-        print(f"[DEBUG] Router decision: {route_decision}")
-        
-        if route_decision == "get_info":
-            selected_app = conv['get_info_app']
-            bot_selection_message = "Get Info Bot selected."
-        elif route_decision == "symptom":
-            selected_app = conv['symptom_app']
-            bot_selection_message = "Symptom Bot selected."
-        elif route_decision == "followup":
-            selected_app = conv['followup_app']
-            bot_selection_message = "Follow-up Bot selected."
-        elif route_decision == "same_episode_check":
-            conv['configurable']['ask_same_episode'] = True # Set flag to ask "same episode?" next
-            # Immediately return the question to the user, no bot invoked yet
-            return jsonify({
-                'reply': f"Is this related to your previous visit with Dr. {conv['configurable']['doctor_name']}? Please answer 'yes' or 'no'.",
-                'bot_selection': "Same Episode Check initiated."
-            }), 200
-        else: # Fallback for unexpected route_decision (should ideally not happen)
-            selected_app = conv['get_info_app']
-            bot_selection_message = "Defaulting to Get Info Bot."
-        
-        conv['configurable']['current_bot_key'] = route_decision # Store the key of the selected bot
-
-    # Priority 3: Continue with the last selected bot for ongoing conversation
-    else:
-        # Retrieve the last chosen bot and use it for continuity
-        bot_key = conv['configurable']['current_bot_key']
-        if bot_key == "get_info":
-            selected_app = conv['get_info_app']
-        elif bot_key == "symptom":
-            selected_app = conv['symptom_app']
-        elif bot_key == "followup":
-            selected_app = conv['followup_app']
-        else:
-            # Fallback if current_bot_key is somehow invalid or missing
-            print(f"Warning: current_bot_key '{bot_key}' not found. Defaulting to Get Info Bot.")
-            selected_app = conv['get_info_app']
-            bot_selection_message = "Continuing with default bot (get_info)."
-
-        bot_selection_message = f"Continuing with previously selected bot: {bot_key}."
-
-    # Ensure symptom session is initialized if symptom bot is selected
-    if conv['configurable'].get('current_bot_key') == 'symptom' and not conv['configurable'].get('symptom_prompt'):
-        conv['configurable'] = initialize_symptom_session(conv['configurable'])
-        conv['configurable']['symptom_prompt'] = conv['configurable'].get('symptom_prompt')
-        print("[DEBUG] After initialize_symptom_session, symptom_prompt:", conv['configurable'].get('symptom_prompt'))
-        conv['configurable']['messages'] = conv['configurable']['current_thread_history']
-        conv['configurable']['messages'].append(HumanMessage(content='start'))
-        conv['configurable']['messages'].append(HumanMessage(content='Which bot are you or what can you assist me with?'))
-
-    # Ensure followup session is initialized if followup bot is selected
-    from conversation.chat_state import initialize_followup_session
-    if conv['configurable'].get('current_bot_key') == 'followup' and not conv['configurable'].get('followup_prompt'):
-        conv['configurable'] = initialize_followup_session(conv['configurable'])
-        conv['configurable']['followup_prompt'] = conv['configurable'].get('followup_prompt')
-        print("[DEBUG] After initialize_followup_session, followup_prompt:", conv['configurable'].get('followup_prompt'))
-        conv['configurable']['messages'] = conv['configurable']['current_thread_history']
-
-    # Ensure 'messages' key is present for the bot state (set after any session initialization)
-    conv['configurable']['messages'] = conv['configurable']['current_thread_history']
-
-    # --- Invoke the Selected Bot's LangGraph Application ---
-    if selected_app:
-        print(f"Invoking {bot_selection_message} on thread: {thread_id}")
-        
-        # Execute the selected bot's graph in a separate thread to avoid blocking Flask
-        future = executor.submit(lambda: selected_app.invoke(conv['configurable'], runnable_config_obj))
-        
-        state_after_invoke = future.result() # Get the result from the bot
-
-        if state_after_invoke and state_after_invoke.get('messages'):
-            # Extract the last AI message from the bot's full response history
-            ai_reply_message = None
-            for msg in reversed(state_after_invoke['messages']):
-                if isinstance(msg, AIMessage):
-                    ai_reply_message = msg
-                    break
-            
-            if ai_reply_message:
-                reply = ai_reply_message.content
-                # Append the bot's AI message to the thread's cumulative history
-                conv['configurable']['current_thread_history'].append(ai_reply_message)
-            else:
-                reply = "I'm sorry, I couldn't generate a clear response from the bot."
-        else:
-            reply = "I'm sorry, I couldn't get a valid response from the bot's processing."
-    else:
-        reply = "I'm sorry, I couldn't determine how to respond to your request."
+    # The thread lock and admission slot are held until the stream is closed, not just until this view returns
+    guard = ExitStack()
+    outcome = [({'error': 'Stream closed before the reply was complete.'}, 500)]
 
-    # Prepare the JSON response
-    response_data = {'reply': reply}
-    if bot_selection_message:
-        response_data['bot_selection'] = bot_selection_message
+    def release():
+        guard.close()
+        inflight.finish(key, outcome[0])
 
-    return jsonify(response_data), 200
+    try:
+        guard.enter_context(conversations.lock(data.get('thread_id')))
+        replay = _lookup_replay(data)
+        if replay is not None:
+            early = (replay, 200)
+        else:
+            loaded, early = _load_turn(data)
+            if not early:
+                thread_id, conv = loaded
+                priority, route = message_flow.priority_class(conv, data['message'])
+                guard.enter_context(admission.admit(priority))
+                with metrics.bot_context(message_flow.bot_for_class(priority)):
+                    plan = _route_turn(thread_id, conv, data, route)
+    except LockTimeout:
+        early = BUSY_ERROR
+    except BaseException as e:
+        guard.close()
+        inflight.finish(key, error=e)
+        raise
+    if early:
+        outcome[0] = early
+        release()
+        return _early_stream_response(*early)
+
+    def generate():
+        yield message_flow.sse_event('start', {'bot_selection': plan.get('bot_selection')})
+        if plan['bot_key'] is None:
+            outcome[0] = (_finish_turn(thread_id, conv, plan, plan['reply']), 200)
+            yield message_flow.sse_event('done', outcome[0][0])
+            return
+        selected_app = _bot_app(plan['bot_key'])
+        final_state = None
+        try:
+            # The generator runs after the view returned, outside the bot_context set above
+            with metrics.bot_context(plan['bot_key']):
+                for mode, payload in selected_app.stream(conv['configurable'], plan['config'], stream_mode=message_flow.STREAM_MODES):
+                    token = message_flow.stream_token(mode, payload, plan['bot_key'])
+                    if token:
+                        yield message_flow.sse_event('token', {'token': token})
+                    elif mode == 'values':
+                        final_state = payload
+        except Exception as e:
+            log.exception("Exception while streaming", thread_id=thread_id)
+            outcome[0] = ({'error': str(e), 'type': type(e).__name__}, 500)
+            yield message_flow.sse_event('error', outcome[0][0])
+            return
+        # The graph has written its checkpoint by now; keep the session history in step with it
+        reply = message_flow.record_reply(conv, final_state)
+        outcome[0] = (_finish_turn(thread_id, conv, plan, reply), 200)
+        yield message_flow.sse_event('done', outcome[0][0])
+
+    response = Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release)
+    return response
 
 @application.route('/embed_website', methods=['POST'])
 def embed_website():
@@ -305,16 +348,48 @@ def embed_website():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@application.route('/route_batch', methods=['POST'])
+def route_batch():
+    """
+    Bulk routing for triage jobs: {"threads": {...columns}, "appointments": {...columns}, "now": ISO
+    time (optional)} -> {"thread_id": [...], "route": [...]}. See conversation/bulk_routing.py.
+    """
+    from conversation.bulk_routing import route_batch as route_columns
+    data = request.get_json() or {}
+    try:
+        now = datetime.fromisoformat(data['now']) if data.get('now') else None
+        return jsonify(route_columns(data.get('threads') or {}, data.get('appointments') or {}, now)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@application.route('/admin/reload_prompts', methods=['POST'])
+def reload_prompts():
+    """
+    Loads a new prompt snapshot in this process (utils/prompt_db.py). If the database fails, the
+    previous snapshot keeps serving and the answer is 503.
+    """
+    # Without ADMIN_TOKEN the admin endpoints are closed; the token is compared in constant time
+    if not ADMIN_TOKEN or not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), ADMIN_TOKEN.encode()):
+        return jsonify({'error': 'forbidden'}), 403
+    try:
+        return jsonify(prompt_db.reload_prompts("admin")), 200
+    except Exception as e:
+        log.error("Prompt reload failed", error=str(e))
+        return jsonify({'error': str(e), 'serving': 'previous snapshot'}), 503
+
 def process_quiz_wizard_submission(state):
     # ... existing logic to populate state with quiz wizard data ...
     state = initialize_symptom_session(state)
     # ... continue with routing to symptom_node or storing state ...
     return state
 
+@application.errorhandler(AdmissionRejected)
+def handle_overload(e):
+    return jsonify({'error': str(e), 'retry_after': e.retry_after}), 429, {'Retry-After': str(e.retry_after)}
+
 @application.errorhandler(Exception)
 def handle_exception(e):
-    import traceback
-    print("Exception in Flask app:", traceback.format_exc())
+    log.exception("Unhandled exception in Flask app", path=request.path)
     response = {
         "error": str(e),
         "type": type(e).__name__
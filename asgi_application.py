@@ -0,0 +1,386 @@
+# asgi_application.py
+# Async (ASGI) serving mode for the bot. Same endpoints and routing as application.py, but the
+# LangGraph apps are driven with ainvoke so a single worker can keep hundreds of LLM calls in flight
+# instead of parking a WSGI thread and a pool thread on every request.
+#
+# Run with: uvicorn asgi_application:app --host 0.0.0.0 --port 8000
+import asyncio
+import hmac
+import signal
+import time
+from contextlib import asynccontextmanager, AsyncExitStack
+from datetime import datetime, timezone
+import anyio
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+import psutil
+
+from config.constants import SESSION_TIMEOUT
+from config.settings import WARM_UP_ON_START, LLM_CASSETTE_MODE, CASSETTE_RECORDED_PATHS, ADMIN_TOKEN
+from conversation import message_flow, prewarm
+from conversation.graph_builder import abuild_bot_apps
+from conversation.session_store import make_session_store, LockTimeout, EXPIRED, MISSING
+from middleware.config.db import dispose_async_engine
+from utils.concurrency import AsyncSingleFlight
+from utils.admission import AsyncAdmissionController, AdmissionRejected
+from utils import metrics, prompt_db
+from utils.log import get_logger
+from utils.general_utils import build_or_load_faiss
+
+load_dotenv()
+log = get_logger(__name__)
+
+conversations = make_session_store()
+# Identical messages for a thread that arrive while the first is still running share its reply
+inflight = AsyncSingleFlight()
+BUSY_ERROR = ({'error': 'Another message for this thread is still being processed. Retry shortly.'}, 409)
+# Caps concurrent bot invocations and sheds excess load with 429 (see utils/admission.py)
+admission = AsyncAdmissionController()
+metrics.register_service_collectors(conversations, inflight, admission)
+bot_apps = {}
+_bot_apps_lock = asyncio.Lock()
+start_time = datetime.now(timezone.utc)
+
+
+async def _bot_app(bot_key):
+    """
+    The compiled graph for a bot key. Graphs are compiled against an async checkpointer, so they are
+    built inside the event loop, on first use (or by the warm-up task) rather than before startup.
+    """
+    if not bot_apps:
+        async with _bot_apps_lock:
+            if not bot_apps:
+                bot_apps.update(await abuild_bot_apps())
+                log.info("Async Bot Graphs compiled.")
+    return bot_apps[bot_key]
+
+
+async def _warm_up():
+    import lance_main
+    await _bot_app('get_info')
+    # Chat model and embeddings clients: blocking construction, kept off the event loop
+    await asyncio.to_thread(lance_main.warm_up_clients)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    conversations.start_reaper()
+    # PROMPT_CACHE=snapshot: the prompts are read before the first request; SIGHUP reloads them
+    await asyncio.to_thread(prompt_db.load_at_startup)
+    if prompt_db.PROMPT_CACHE != "off" and hasattr(signal, "SIGHUP"):
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, lambda: loop.run_in_executor(None, prompt_db.reload_quietly, "sighup"))
+        except (NotImplementedError, RuntimeError):
+            # Only the main thread's loop can handle signals (not, e.g., a test client's)
+            log.info("SIGHUP prompt reload not available in this event loop")
+    # In the background, so the server starts accepting requests (and /health) right away
+    warm_up = asyncio.create_task(_warm_up()) if WARM_UP_ON_START else None
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    conversations.stop_reaper()
+    await dispose_async_engine()
+
+
+app = FastAPI(title="Medical Assistant Bot (async)", lifespan=lifespan)
+
+
+async def _json_body(request: Request) -> dict:
+    try:
+        body = await request.json() or {}
+    except ValueError:
+        body = {}
+    # Kept for the cassette recorder in observe_request
+    request.state.json_body = body
+    return body
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    # For /message/stream this is the time to the first byte; the turn's stages cover the rest
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
+    elapsed = time.perf_counter() - started
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=response.status_code)
+    if LLM_CASSETTE_MODE == "record" and endpoint in CASSETTE_RECORDED_PATHS:
+        from models.cassette import record_request
+        record_request(endpoint, getattr(request.state, "json_body", None), response.status_code, elapsed)
+    return response
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint: stage latencies, LLM calls and tokens, cache hit ratios, admission queues."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint for monitoring: memory, live sessions and session store counters."""
+    return {
+        'status': 'healthy',
+        'memory_usage_mb': round(psutil.Process().memory_info().rss / 1024 / 1024, 2),
+        'uptime': str(datetime.now(timezone.utc) - start_time),
+        'session_timeout_minutes': SESSION_TIMEOUT.total_seconds() / 60,
+        'sessions': conversations.stats(),
+        'coalescing': inflight.stats(),
+        'admission': admission.stats(),
+    }
+
+
+@app.post("/start_conversation")
+async def start_conversation(request: Request):
+    """Start a new conversation thread. Mirrors /start_conversation in application.py."""
+    data = await _json_body(request)
+    thread_id = data.get('thread_id')
+    doctor_name = data.get('doctor_name')
+
+    if not thread_id or not doctor_name:
+        return JSONResponse({'error': 'thread_id and doctor_name are required'}, status_code=400)
+
+    conv = message_flow.build_conversation(data, datetime.now(timezone.utc))
+    await conversations.asave(thread_id, conv)
+    # Route prediction, prompt classification and fetch start now, not on the first /message
+    await prewarm.astart(conv, admission)
+    return JSONResponse({
+        'message': f'Conversation {thread_id} started with doctor: {doctor_name} and specialty: {conv["configurable"]["specialty"]}.'
+    }, status_code=200)
+
+
+async def _load_turn(data: dict):
+    """Async counterpart of application._load_turn. Returns ((thread_id, conv), None) or (None, (error_body, status))."""
+    thread_id = data.get('thread_id')
+    user_message = data.get('message')
+
+    if not thread_id or not user_message:
+        return None, ({'error': 'thread_id and message are required'}, 400)
+
+    conv, state = await conversations.alookup(thread_id)
+    if state == EXPIRED:
+        return None, ({'error': 'Session expired after 15 minutes of inactivity.'}, 440)
+    if state == MISSING:
+        return None, ({'error': 'Conversation not found. Call /start_conversation first.'}, 404)
+
+    conv['last_activity'] = datetime.now(timezone.utc) # Update last activity timestamp
+    message_flow.apply_message_updates(conv, data)
+    return (thread_id, conv), None
+
+
+async def _route_turn(thread_id, conv, data: dict, route):
+    plan = message_flow.plan_turn(conv, thread_id, data['message'], route)
+    plan['message_id'] = str(data['message_id']) if data.get('message_id') else None
+    if plan['bot_key'] is not None:
+        await message_flow.ainitialize_bot_session(conv)
+    return plan
+
+
+async def _finish_turn(thread_id, conv, plan, reply):
+    """Persists the session (restarting its inactivity timer) and shapes the /message body."""
+    response = message_flow.build_response(plan, reply)
+    await conversations.asave(thread_id, conv, plan['message_id'], response)
+    return response
+
+
+async def _lookup_replay(data: dict):
+    if not data.get('thread_id') or not data.get('message_id'):
+        return None
+    return await conversations.alookup_reply(data['thread_id'], str(data['message_id']))
+
+
+def _turn_key(data: dict):
+    if data.get('message_id'):
+        return data.get('thread_id'), 'id', str(data['message_id'])
+    return data.get('thread_id'), 'text', (data.get('message') or '').strip()
+
+
+async def _run_turn(data: dict):
+    """Runs one /message turn under the thread's lock. Returns (body, status); raises AdmissionRejected when saturated."""
+    try:
+        async with conversations.alock(data.get('thread_id')):
+            replay = await _lookup_replay(data)
+            if replay is not None:
+                return replay, 200
+            loaded, error = await _load_turn(data)
+            if error:
+                return error
+            thread_id, conv = loaded
+            priority, route = message_flow.priority_class(conv, data['message'])
+            async with admission.admit(priority):
+                with metrics.bot_context(message_flow.bot_for_class(priority)):
+                    plan = await _route_turn(thread_id, conv, data, route)
+
+                if plan['bot_key'] is None:
+                    return await _finish_turn(thread_id, conv, plan, plan['reply']), 200
+
+                with metrics.bot_context(plan['bot_key']):
+                    state_after_invoke = await (await _bot_app(plan['bot_key'])).ainvoke(conv['configurable'], plan['config'])
+
+                reply = message_flow.record_reply(conv, state_after_invoke)
+                return await _finish_turn(thread_id, conv, plan, reply), 200
+    except LockTimeout:
+        return BUSY_ERROR
+
+
+@app.post("/message")
+async def send_message(request: Request):
+    """Sends a user message to the chatbot without blocking the event loop on the LLM round-trip."""
+    data = await _json_body(request)
+    body, status = await inflight.do(_turn_key(data), lambda: _run_turn(data))
+    return JSONResponse(body, status_code=status)
+
+
+async def _replay_stream(body: dict):
+    yield message_flow.sse_event('start', {'bot_selection': body.get('bot_selection')})
+    yield message_flow.sse_event('done', body)
+
+
+def _early_stream_response(body: dict, status: int):
+    """Errors as JSON, a coalesced or replayed reply as 'start' + 'done' events."""
+    if status != 200:
+        return JSONResponse(body, status_code=status)
+    return StreamingResponse(_replay_stream(body), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+class _GuardedStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that awaits release() once the response is over: streamed, failed, cancelled, or
+    dropped before the body iterator ever started (e.g. the client left before the headers were sent).
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Shielded, so a cancelled response still closes the bot stream and frees its lock and slot
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+                await self._release()
+
+
+@app.post("/message/stream")
+async def stream_message(request: Request):
+    """Streaming variant of /message (Server-Sent Events). Same event protocol as application.stream_message."""
+    data = await _json_body(request)
+    key = _turn_key(data)
+    flight, leader = inflight.join(key)
+    if not leader:
+        return _early_stream_response(*await asyncio.shield(flight))
+
+    # The thread lock and admission slot are held until the response is over, not just until this handler returns
+    guard = AsyncExitStack()
+    outcome = ({'error': 'Stream closed before the reply was complete.'}, 500)
+    try:
+        await guard.enter_async_context(conversations.alock(data.get('thread_id')))
+        replay = await _lookup_replay(data)
+        if replay is not None:
+            early = (replay, 200)
+        else:
+            loaded, early = await _load_turn(data)
+            if not early:
+                thread_id, conv = loaded
+                priority, route = message_flow.priority_class(conv, data['message'])
+                # Released by _GuardedStreamingResponse even if the body never starts, or a dropped client leaks the slot
+                await guard.enter_async_context(admission.admit(priority))
+                with metrics.bot_context(message_flow.bot_for_class(priority)):
+                    plan = await _route_turn(thread_id, conv, data, route)
+    except LockTimeout:
+        early = BUSY_ERROR
+    except BaseException as e:
+        await guard.aclose()
+        inflight.finish(key, error=e)
+        raise
+    if early:
+        await guard.aclose()
+        inflight.finish(key, early)
+        return _early_stream_response(*early)
+
+    async def generate():
+        nonlocal outcome
+        yield message_flow.sse_event('start', {'bot_selection': plan.get('bot_selection')})
+        if plan['bot_key'] is None:
+            outcome = (await _finish_turn(thread_id, conv, plan, plan['reply']), 200)
+            yield message_flow.sse_event('done', outcome[0])
+            return
+        final_state = None
+        try:
+            with metrics.bot_context(plan['bot_key']):
+                async for mode, payload in (await _bot_app(plan['bot_key'])).astream(conv['configurable'], plan['config'], stream_mode=message_flow.STREAM_MODES):
+                    token = message_flow.stream_token(mode, payload, plan['bot_key'])
+                    if token:
+                        yield message_flow.sse_event('token', {'token': token})
+                    elif mode == 'values':
+                        final_state = payload
+        except Exception as e:
+            log.exception("Exception while streaming", thread_id=thread_id)
+            outcome = ({'error': str(e), 'type': type(e).__name__}, 500)
+            yield message_flow.sse_event('error', outcome[0])
+            return
+        reply = message_flow.record_reply(conv, final_state)
+        outcome = (await _finish_turn(thread_id, conv, plan, reply), 200)
+        yield message_flow.sse_event('done', outcome[0])
+
+    async def release():
+        await guard.aclose()
+        inflight.finish(key, outcome)
+
+    return _GuardedStreamingResponse(generate(), release, media_type='text/event-stream',
+                                     headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.post("/embed_website")
+async def embed_website(request: Request):
+    data = await _json_body(request)
+    url = data.get('url')
+    if not url:
+        return JSONResponse({'success': False, 'error': 'No URL provided'}, status_code=400)
+    try:
+        # Scraping and embedding are blocking, keep them off the event loop
+        await asyncio.to_thread(build_or_load_faiss, url, True)
+        return JSONResponse({'success': True}, status_code=200)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+@app.post("/route_batch")
+async def route_batch(request: Request):
+    """Bulk routing for triage jobs. Mirrors /route_batch in application.py."""
+    from conversation.bulk_routing import route_batch as route_columns
+    data = await _json_body(request)
+    try:
+        now = datetime.fromisoformat(data['now']) if data.get('now') else None
+        # Large batches take a while in NumPy; keep them off the event loop
+        result = await asyncio.to_thread(route_columns, data.get('threads') or {}, data.get('appointments') or {}, now)
+        return JSONResponse(result, status_code=200)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+
+@app.post("/admin/reload_prompts")
+async def reload_prompts(request: Request):
+    """Loads a new prompt snapshot in this process. Mirrors /admin/reload_prompts in application.py."""
+    if not ADMIN_TOKEN or not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), ADMIN_TOKEN.encode()):
+        return JSONResponse({'error': 'forbidden'}, status_code=403)
+    try:
+        return JSONResponse(await asyncio.to_thread(prompt_db.reload_prompts, "admin"), status_code=200)
+    except Exception as e:
+        log.error("Prompt reload failed", error=str(e))
+        return JSONResponse({'error': str(e), 'serving': 'previous snapshot'}, status_code=503)
+
+
+@app.exception_handler(AdmissionRejected)
+async def handle_overload(request: Request, e: AdmissionRejected):
+    return JSONResponse({'error': str(e), 'retry_after': e.retry_after}, status_code=429, headers={'Retry-After': str(e.retry_after)})
+
+
+@app.exception_handler(Exception)
+async def handle_exception(request: Request, e: Exception):
+    log.error("Unhandled exception in ASGI app", path=request.url.path, exc_info=e)
+    return JSONResponse({"error": str(e), "type": type(e).__name__}, status_code=500)
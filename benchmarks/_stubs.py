@@ -0,0 +1,30 @@
+# benchmarks/_stubs.py
+# Offline stand-ins used by the benchmark scripts. install_stub_llm() must run before any
+# project module is imported, because models/chains.py binds config.llm_config.llm at import time.
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models.fake_llm import FakeChatModel, fake_embeddings
+
+
+# Dimension of OpenAI's text-embedding-3-small, so stub indexes are the size of real ones
+EMBEDDING_DIM = 1536
+
+
+def install_stub_embeddings():
+    """Swaps the shared OpenAI embeddings client for a deterministic offline one (for FAISS retrieval)."""
+    import utils.general_utils
+    utils.general_utils._embeddings = fake_embeddings(EMBEDDING_DIM)
+
+
+def install_stub_llm(latency: float):
+    """Swaps the shared chat model for FakeChatModel and keeps checkpoints in memory."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+    os.environ["CHECKPOINT_BACKEND"] = "memory"
+    import config.llm_config
+    from utils.metrics import token_usage
+    config.llm_config.llm = FakeChatModel(latency=latency, callbacks=[token_usage])
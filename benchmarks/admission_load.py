@@ -0,0 +1,156 @@
+# benchmarks/admission_load.py
+# Open-loop burst against /message with a stubbed slow LLM, with and without admission control.
+# Requests arrive at a fixed rate regardless of how fast the server answers (like real patients),
+# so once the arrival rate exceeds capacity an unprotected server's latency keeps growing while the
+# admission controller keeps p99 bounded and sheds the excess with 429.
+# First, with no server, it checks that a request with a free slot is admitted even when the queue
+# allows no waiters (ADMISSION_MAX_QUEUE=0), and that only a request that has to wait is shed.
+#
+#   python benchmarks/admission_load.py --server flask --rate 60 --duration 20 --latency 0.5 --max-in-flight 8 --max-queue 16
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from _stubs import ROOT
+from async_vs_flask import _wait_ready
+
+DOCTOR_NAME = "Dr. Bench"
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def _one_request(base_url: str, timeout: float):
+    thread_id = f"adm-{uuid.uuid4().hex}"
+    requests.post(f"{base_url}/start_conversation", json={"thread_id": thread_id, "doctor_name": DOCTOR_NAME}, timeout=timeout)
+    started = time.perf_counter()
+    try:
+        resp = requests.post(f"{base_url}/message", json={"thread_id": thread_id, "message": f"Hello {DOCTOR_NAME}, when are you open?"}, timeout=timeout)
+        return time.perf_counter() - started, resp.status_code, resp.headers.get("Retry-After")
+    except requests.Timeout:
+        return time.perf_counter() - started, "timeout", None
+
+
+def drive(base_url: str, rate: float, duration: float, timeout: float) -> dict:
+    results = []
+    lock = threading.Lock()
+
+    def run():
+        result = _one_request(base_url, timeout)
+        with lock:
+            results.append(result)
+
+    total = int(rate * duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(2000, total)) as pool:
+        for i in range(total):
+            # Open loop: submit on schedule, never wait for earlier responses
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run)
+    ok = sorted(r[0] for r in results if r[1] == 200)
+    return {
+        "sent": total,
+        "ok": len(ok),
+        "shed": sum(1 for r in results if r[1] == 429),
+        "timeouts": sum(1 for r in results if r[1] == "timeout"),
+        "other": sum(1 for r in results if r[1] not in (200, 429, "timeout")),
+        "retry_after": sorted({r[2] for r in results if r[2]}),
+        "p50": _percentile(ok, 0.50),
+        "p95": _percentile(ok, 0.95),
+        "p99": _percentile(ok, 0.99),
+    }
+
+
+def check_free_slot_admission():
+    """With max_queue=0, a request with a free slot is admitted and only the next one is shed (sync and async)."""
+    from utils.admission import AdmissionController, AsyncAdmissionController, AdmissionRejected, QUEUE_FULL
+
+    def expect_full(admit):
+        try:
+            admit()
+        except AdmissionRejected as e:
+            return e.reason == QUEUE_FULL
+        return False
+
+    controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout_seconds=0.1, class_limits={})
+    with controller.admit():
+        ok = expect_full(lambda: controller.admit().__enter__())
+    with controller.admit():
+        pass
+
+    async def run_async():
+        controller = AsyncAdmissionController(max_in_flight=1, max_queue=0, queue_timeout_seconds=0.1, class_limits={})
+        async with controller.admit():
+            try:
+                async with controller.admit():
+                    return False
+            except AdmissionRejected as e:
+                full = e.reason == QUEUE_FULL
+        async with controller.admit():
+            return full
+
+    ok = ok and asyncio.run(run_async())
+    print(f"free slot with ADMISSION_MAX_QUEUE=0: {'admitted, overflow shed' if ok else 'FAILED'}")
+    if not ok:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--port", type=int, default=5131)
+    parser.add_argument("--latency", type=float, default=0.5, help="stubbed LLM latency in seconds")
+    parser.add_argument("--rate", type=float, default=60, help="arrivals per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of traffic")
+    parser.add_argument("--timeout", type=float, default=30, help="client timeout, like an upstream proxy")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    check_free_slot_admission()
+    rows = []
+    # "off" keeps only the counters (ADMISSION_MAX_IN_FLIGHT=0), i.e. the behaviour before admission control
+    for offset, (label, max_in_flight) in enumerate([("off", 0), ("on", args.max_in_flight)]):
+        port = args.port + offset
+        env = dict(os.environ, ADMISSION_MAX_IN_FLIGHT=str(max_in_flight), ADMISSION_MAX_QUEUE=str(args.max_queue),
+                   ADMISSION_QUEUE_TIMEOUT_SECONDS=str(args.queue_timeout))
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "async_vs_flask.py"), "--serve", args.server, "--port", str(port), "--latency", str(args.latency)],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_ready(base_url)
+            result = drive(base_url, args.rate, args.duration, args.timeout)
+            result["admission"] = requests.get(f"{base_url}/health", timeout=10).json().get("admission", {})
+            rows.append((label, result))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"server={args.server} stub LLM latency={args.latency}s rate={args.rate}/s duration={args.duration}s "
+          f"max_in_flight={args.max_in_flight} max_queue={args.max_queue} queue_timeout={args.queue_timeout}s")
+    print(f"{'admission':<10} {'sent':>5} {'ok':>5} {'429':>5} {'t/o':>5} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7}  queue wait avg/max s")
+    for label, r in rows:
+        adm = r["admission"]
+        print(f"{label:<10} {r['sent']:>5} {r['ok']:>5} {r['shed']:>5} {r['timeouts']:>5} {r['p50']:>7.2f} {r['p95']:>7.2f} {r['p99']:>7.2f}"
+              f"  {adm.get('queue_wait_avg_seconds', 0):.2f}/{adm.get('queue_wait_max_seconds', 0):.2f}"
+              f"  (max depth {adm.get('max_queue_depth_seen', 0)}, Retry-After {r['retry_after'] or '-'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/appointment_routing.py
+# Per-turn appointment work of a /message for a family account with many appointments: the scans
+# that ran on every turn before conversation/appointments.py (doctor filter, datetime parsing of
+# every pre-consultation, same-episode lookup) vs the cached per-session index. Each turn resends
+# the whole appointment_data, as clients do. "unchanged" is the common case (same payload as the
+# previous turn); "changed" pays for the hash and a rebuild of the index on every turn.
+#
+#   python benchmarks/appointment_routing.py --appointments 50,300,1000 --turns 2000
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from _stubs import ROOT  # noqa: F401  (puts the repo on sys.path)
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from conversation import message_flow
+from conversation.router import decide_bot_route
+
+DOCTORS = [f"Dr. Family {i}" for i in range(8)]
+
+
+def appointment_data(count: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    appointments = []
+    for i in range(count):
+        keyword = rng.choice(["pre-consultation", "post-consultation", "vaccination"])
+        when = now + timedelta(hours=rng.uniform(-24 * 365, 24 * 30))
+        appointments.append({
+            "appt_id": f"a{i}", "appt_datetime": when.strftime("%Y-%m-%dT%H:%M:%S"),
+            "appt_status": "completed" if when < now else "booked", "doctor_name": rng.choice(DOCTORS),
+            "procedure_keyword": keyword, "symptom-summary": "- Primary complaint: fever", "prescription": "1. Paracetamol",
+        })
+    return {"appointments": appointments}
+
+
+def legacy_route(appointment_data: dict, doctor_name: str, first_message: str) -> str:
+    """decide_bot_route as it was: filter by doctor and parse every pre-consultation, per call."""
+    now = datetime.now(timezone.utc)
+    doctor_appointments = [a for a in appointment_data.get("appointments", []) if a.get("doctor_name") == doctor_name]
+    future = [a for a in doctor_appointments if a.get("procedure_keyword") == "pre-consultation" and
+              (datetime.fromisoformat(a.get("appt_datetime")).replace(tzinfo=timezone.utc) - now).total_seconds() < 48 * 3600]
+    past = [a for a in doctor_appointments if a.get("procedure_keyword") == "post-consultation"]
+    if first_message.startswith(f"Hello {doctor_name}") and not past:
+        return "get_info"
+    if future and not past:
+        return "symptom"
+    if future and past:
+        return "same_episode_check"
+    if past and not future:
+        return "followup"
+    return "get_info"
+
+
+def legacy_turn(conv: dict, payload: dict, doctor_name: str):
+    """apply_message_updates + priority_class + routing + same-episode lookup, before the index."""
+    conv["appointment_data"] = payload["appointment_data"]
+    data = conv["appointment_data"]
+    route = legacy_route(data, doctor_name, "My son has a fever")
+    doctor_appointments = [a for a in data.get("appointments", []) if a.get("doctor_name") == doctor_name]
+    now = datetime.now(timezone.utc)
+    [a for a in doctor_appointments if a.get("procedure_keyword") == "pre-consultation" and
+     (datetime.fromisoformat(a.get("appt_datetime")).replace(tzinfo=timezone.utc) - now).total_seconds() < 48 * 3600]
+    legacy_route(data, doctor_name, "My son has a fever")
+    next((a for a in data.get("appointments", []) if a.get("appt_status") == "completed" and a.get("doctor_name") == doctor_name), None)
+    return route
+
+
+def indexed_turn(conv: dict, payload: dict, doctor_name: str):
+    """The same work through message_flow and the session's appointment index."""
+    message_flow.apply_message_updates(conv, payload)
+    index = message_flow.appointment_index(conv)
+    state = {"appointment_data": conv["appointment_data"], "messages": [HumanMessage(content="My son has a fever")]}
+    config = RunnableConfig(configurable={"doctor_name": doctor_name})
+    route = decide_bot_route(state, config, index)
+    index.pre_consultations_within(doctor_name, datetime.now(timezone.utc))
+    decide_bot_route(state, config, index)
+    index.completed_appointment(doctor_name)
+    return route
+
+
+def measure(turn, payloads, doctor_name: str) -> float:
+    conv = {"appointment_data": {}, "configurable": {}}
+    started = time.perf_counter()
+    for payload in payloads:
+        turn(conv, payload, doctor_name)
+    return (time.perf_counter() - started) / len(payloads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--appointments", default="50,300,1000", help="comma-separated appointment counts per payload")
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'appointments':>12} {'legacy us/turn':>15} {'index, unchanged':>17} {'index, changed':>15}")
+    for count in (int(c) for c in args.appointments.split(",")):
+        data = appointment_data(count)
+        doctor = DOCTORS[0]
+        # Every turn decodes a fresh copy of the payload from JSON, like a request body
+        encoded = json.dumps(data)
+        same = [{"appointment_data": json.loads(encoded)} for _ in range(args.turns)]
+        changed = [{"appointment_data": appointment_data(count, seed=i)} for i in range(args.turns)]
+        for payload in same[:50]:
+            assert legacy_route(payload["appointment_data"], doctor, "My son has a fever") == \
+                decide_bot_route({"appointment_data": payload["appointment_data"], "messages": [HumanMessage(content="My son has a fever")]},
+                                 RunnableConfig(configurable={"doctor_name": doctor}))
+        legacy = measure(legacy_turn, same, doctor)
+        unchanged = measure(indexed_turn, same, doctor)
+        rebuilt = measure(indexed_turn, changed, doctor)
+        print(f"{count:>12} {legacy:>15.1f} {unchanged:>17.1f} {rebuilt:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
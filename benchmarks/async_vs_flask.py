@@ -0,0 +1,107 @@
+# benchmarks/async_vs_flask.py
+# Throughput comparison of the Flask path (application.py, executor.submit().result()) against the
+# ASGI path (asgi_application.py, ainvoke), both serving /message with a stubbed slow LLM.
+#
+#   python benchmarks/async_vs_flask.py --latency 1.0 --conversations 400 --concurrency 200
+#
+# Each simulated patient calls /start_conversation and then sends one get-info /message, so every
+# measured /message costs exactly one stubbed LLM round-trip.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from _stubs import ROOT, install_stub_llm
+
+DOCTOR_NAME = "Dr. Bench"
+
+
+def serve(kind: str, port: int, latency: float):
+    install_stub_llm(latency)
+    if kind == "flask":
+        from werkzeug.serving import make_server
+        from application import application
+        # Threaded werkzeug is the most generous WSGI setup for the Flask path; the pool in
+        # application.py (cpu_count * 2) is still the cap on concurrent LLM calls.
+        make_server("127.0.0.1", port, application, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run("asgi_application:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def _wait_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.post(f"{base_url}/message", json={}, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not come up")
+
+
+def _one_conversation(base_url: str):
+    thread_id = f"bench-{uuid.uuid4().hex}"
+    requests.post(f"{base_url}/start_conversation", json={"thread_id": thread_id, "doctor_name": DOCTOR_NAME}, timeout=300)
+    started = time.perf_counter()
+    resp = requests.post(f"{base_url}/message", json={"thread_id": thread_id, "message": f"Hello {DOCTOR_NAME}, when are you open?"}, timeout=300)
+    return time.perf_counter() - started, resp.status_code
+
+
+def drive(base_url: str, conversations: int, concurrency: int) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _one_conversation(base_url), range(conversations)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(r[0] for r in results)
+    return {
+        "ok": sum(1 for r in results if r[1] == 200),
+        "rps": conversations / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--serve", choices=["flask", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=5101)
+    parser.add_argument("--latency", type=float, default=1.0, help="stubbed LLM latency in seconds")
+    parser.add_argument("--conversations", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.latency)
+        return
+
+    rows = []
+    for offset, kind in enumerate(["flask", "asgi"]):
+        port = args.port + offset
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", kind, "--port", str(port), "--latency", str(args.latency)],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_ready(base_url)
+            rows.append((kind, drive(base_url, args.conversations, args.concurrency)))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"stub LLM latency={args.latency}s conversations={args.conversations} concurrency={args.concurrency} cpu_count={os.cpu_count()}")
+    print(f"{'path':<6} {'ok':>5} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'max s':>7}")
+    for kind, r in rows:
+        print(f"{kind:<6} {r['ok']:>5} {r['rps']:>8.1f} {r['p50']:>7.2f} {r['p95']:>7.2f} {r['max']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bulk_routing.py
+# Nightly triage of a large appointment batch: decide_bot_route called once per thread (what a job
+# had to do before) vs conversation/bulk_routing.route_batch on the columnar batch. Both decide at
+# the same fixed time and every decision is compared; the script exits 1 on any difference. A few
+# appointments carry timezone offsets, malformed times or another doctor's name, to exercise the
+# same edge cases in both.
+#
+#   python benchmarks/bulk_routing.py --appointments 100000 --threads 20000
+import argparse
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from _stubs import ROOT  # noqa: F401  (puts the repo on sys.path)
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from conversation.appointments import AppointmentIndex
+from conversation.bulk_routing import route_batch
+from conversation.router import decide_bot_route
+
+KEYWORDS = ["pre-consultation", "post-consultation", "vaccination"]
+
+
+def make_batch(appointments: int, threads: int, now: datetime, seed: int = 11) -> tuple:
+    rng = random.Random(seed)
+    doctors = [f"Dr. Bench {i}" for i in range(50)]
+    thread_cols = {"thread_id": [f"t{i}" for i in range(threads)], "doctor_name": [rng.choice(doctors) for _ in range(threads)],
+                   "first_message": []}
+    for i in range(threads):
+        thread_cols["first_message"].append(f"Hello {thread_cols['doctor_name'][i]}, a question" if rng.random() < 0.2 else "My son has a fever")
+    appt_cols = {"thread_id": [], "doctor_name": [], "procedure_keyword": [], "appt_datetime": []}
+    for _ in range(appointments):
+        t = rng.randrange(threads)
+        when = now + timedelta(hours=rng.uniform(-24 * 60, 24 * 10), microseconds=rng.randrange(10**6))
+        roll = rng.random()
+        if roll < 0.002:
+            stamp = "not a date"
+        elif roll < 0.004:
+            stamp = when.strftime("%Y-%m-%dT%H:%M:%S") + "+05:30"
+        else:
+            stamp = when.strftime("%Y-%m-%dT%H:%M:%S")
+        appt_cols["thread_id"].append(f"t{t}" if rng.random() > 0.001 else "unknown-thread")
+        appt_cols["doctor_name"].append(thread_cols["doctor_name"][t] if rng.random() > 0.1 else rng.choice(doctors))
+        appt_cols["procedure_keyword"].append(rng.choice(KEYWORDS))
+        appt_cols["appt_datetime"].append(stamp)
+    return thread_cols, appt_cols
+
+
+def route_one_by_one(thread_cols: dict, appt_cols: dict, now: datetime) -> list:
+    """One decide_bot_route call per thread, on that thread's appointments."""
+    per_thread = defaultdict(list)
+    for i, thread_id in enumerate(appt_cols["thread_id"]):
+        per_thread[thread_id].append({name: appt_cols[name][i] for name in appt_cols})
+    routes = []
+    for thread_id, doctor, first_message in zip(thread_cols["thread_id"], thread_cols["doctor_name"], thread_cols["first_message"]):
+        appointment_data = {"appointments": per_thread.get(thread_id, [])}
+        state = {"appointment_data": appointment_data, "messages": [HumanMessage(content=first_message)]}
+        routes.append(decide_bot_route(state, RunnableConfig(configurable={"doctor_name": doctor}), AppointmentIndex(appointment_data), now))
+    return routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--threads", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    thread_cols, appt_cols = make_batch(args.appointments, args.threads, now)
+
+    scalar_times, bulk_times = [], []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        scalar = route_one_by_one(thread_cols, appt_cols, now)
+        scalar_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        bulk = route_batch(thread_cols, appt_cols, now)["route"]
+        bulk_times.append(time.perf_counter() - started)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(scalar, bulk)) if a != b]
+    print(f"{args.appointments} appointments over {args.threads} threads")
+    print(f"scalar decide_bot_route: {min(scalar_times) * 1000:8.1f} ms")
+    print(f"route_batch (NumPy):     {min(bulk_times) * 1000:8.1f} ms  ({min(scalar_times) / min(bulk_times):.1f}x)")
+    print(f"routes: {dict(Counter(bulk))}")
+    print(f"mismatches: {len(mismatches)}")
+    if mismatches or len(scalar) != len(bulk):
+        for i in mismatches[:10]:
+            print(f"  {thread_cols['thread_id'][i]}: scalar={scalar[i]} bulk={bulk[i]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/classifier_agreement.py
+# Coverage, accuracy and speed of the prompt classifiers' rule engines (models/classifier_rules.py)
+# on hand-labeled sets. Each case goes through the same input fallbacks as a session
+# (_symptom_classifier_input / _followup_classifier_input). The report shows:
+# - the share of cases the rules resolve without an LLM call,
+# - how often the rules match the label,
+# - the time per rule classification.
+# With --llm, every case is also sent to the real classifier chain, which needs OPENAI_API_KEY.
+# The report then adds the LLM's accuracy, the agreement between rules and LLM where the rules
+# answered, and the accuracy of the hybrid that serves with CLASSIFIER_RULES=on.
+#
+#   python benchmarks/classifier_agreement.py --classifier symptom
+#   python benchmarks/classifier_agreement.py --classifier followup --llm
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from _stubs import ROOT
+
+CLASSIFIERS = ("symptom", "followup")
+
+
+def load_cases(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def classifier(name: str) -> tuple:
+    """(case -> classifier input, rule engine, LLM chain) for a classifier name."""
+    from conversation import chat_state
+    from models import classifier_rules
+
+    def state_of(case):
+        state = {k: v for k, v in case.items() if k != "label"}
+        if "symptom" in state:
+            state["symptoms"] = state.pop("symptom")
+        return state
+
+    if name == "symptom":
+        return (lambda case: chat_state._symptom_classifier_input(state_of(case)),
+                classifier_rules.classify_symptom_prompt, chat_state.classifier_chain)
+    return (lambda case: chat_state._followup_classifier_input(state_of(case)),
+            classifier_rules.classify_followup_prompt, chat_state.followup_classifier_chain)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--classifier", choices=CLASSIFIERS, default="symptom")
+    parser.add_argument("--labeled", help="labeled JSON lines (default: benchmarks/data/<classifier>_classifier_labeled.jsonl)")
+    parser.add_argument("--llm", action="store_true", help="also run the LLM classifier (needs OPENAI_API_KEY)")
+    parser.add_argument("--repeat", type=int, default=2000, help="rule classifications timed per case")
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+    classifier_input, classify, chain = classifier(args.classifier)
+    cases = load_cases(args.labeled or os.path.join(ROOT, "benchmarks", "data", f"{args.classifier}_classifier_labeled.jsonl"))
+    inputs = [classifier_input(case) for case in cases]
+    labels = [case["label"] for case in cases]
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for item in inputs:
+            classify(item)
+    per_call_us = (time.perf_counter() - started) / (args.repeat * len(inputs)) * 1e6
+    rules = [classify(item) for item in inputs]
+
+    resolved = [i for i, key in enumerate(rules) if key is not None]
+    correct = [i for i in resolved if rules[i] == labels[i]]
+    print(f"{args.classifier} classifier, {len(cases)} labeled cases")
+    print(f"resolved by rules: {len(resolved)}/{len(cases)} ({len(resolved) / len(cases):.0%}), {per_call_us:.1f} us per call")
+    print(f"rules vs label:    {len(correct)}/{len(resolved)} agree")
+    for i in resolved:
+        if rules[i] != labels[i]:
+            print(f"  rules={rules[i]} label={labels[i]} input={cases[i]}")
+    print(f"left to the LLM:   {dict(Counter(labels[i] for i, key in enumerate(rules) if key is None))}")
+
+    if args.llm:
+        llm = [chain.invoke(item).strip() for item in inputs]
+        hybrid = [rules[i] if rules[i] is not None else llm[i] for i in range(len(cases))]
+        print(f"LLM vs label:      {sum(a == b for a, b in zip(llm, labels))}/{len(cases)} agree")
+        print(f"rules vs LLM:      {sum(rules[i] == llm[i] for i in resolved)}/{len(resolved)} agree where the rules answered")
+        print(f"hybrid vs label:   {sum(a == b for a, b in zip(hybrid, labels))}/{len(cases)} agree")
+
+    if len(correct) != len(resolved):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
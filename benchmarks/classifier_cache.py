@@ -0,0 +1,85 @@
+# benchmarks/classifier_cache.py
+# Hit rate and latency of the classifier memo cache (models/classifier_cache.py) over a realistic
+# stream of symptom-classifier inputs. Ages come in mixed formats ("9 months", "9 mo", "1.5 yrs"),
+# and symptoms are drawn Zipf-like from a set of common complaints with case and punctuation
+# variants. The "LLM" sleeps --latency seconds and answers like the rules, or with general_child.
+# The stream runs three times:
+#   cold     - an empty cache
+#   restart  - a new process-level cache on the same persistent tier (--backend sqlite or redis),
+#              so only what the tier kept can hit
+#   new prompt - the same cache after the classifier prompt text changed: nothing may hit
+#
+#   python benchmarks/classifier_cache.py --sessions 5000 --latency 0.4 --backend sqlite
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from _stubs import ROOT  # noqa: F401  (puts the repo on sys.path)
+
+SYMPTOMS = ["fever", "cough", "cold and runny nose", "vomiting", "loose stools", "rash", "ear pain", "stomach pain",
+            "not eating well", "headache", "sore throat", "cough and fever", "itchy eyes", "constipation",
+            "breathing difficulty", "crying at night", "swelling of testis", "white discharge", "private parts itching",
+            "fever since yesterday", "cough for a week", "mouth ulcers", "teething", "nose bleed", "hair loss"]
+AGES = [("{} months", range(6, 24)), ("{} mo", range(6, 24)), ("{} years", range(2, 16)), ("{} yrs", range(2, 16)),
+        ("{}y", range(2, 16))]
+
+
+def make_inputs(count: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(SYMPTOMS))]
+    inputs = []
+    for _ in range(count):
+        template, values = rng.choice(AGES)
+        symptom = rng.choices(SYMPTOMS, weights)[0]
+        symptom = rng.choice([symptom, symptom.capitalize(), symptom + ".", "  " + symptom.upper()])
+        inputs.append({"age": template.format(rng.choice(values)), "gender": rng.choice(["male", "female", "Male", "Female"]),
+                       "vaccine_visit": rng.choice(["", "no"]), "consultation_type": "child consultation", "symptom": symptom})
+    return inputs
+
+
+def run(cache, inputs: list, latency: float) -> tuple:
+    from models.classifier_rules import classify_symptom_prompt
+    llm_calls, started = 0, time.perf_counter()
+    for item in inputs:
+        if cache.get(item) is None:
+            time.sleep(latency)
+            llm_calls += 1
+            cache.put(item, classify_symptom_prompt(item) or "general_child")
+    return llm_calls, (time.perf_counter() - started) / len(inputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.4, help="simulated classifier LLM latency in seconds")
+    parser.add_argument("--backend", choices=["memory", "sqlite", "redis"], default="sqlite")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="classifier-cache-")
+    os.environ["CLASSIFIER_CACHE_SQLITE_PATH"] = os.path.join(tmp, "classifier_cache.sqlite3")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from models.classifier_cache import ClassifierCache
+    from models.classifier_rules import SYMPTOM_PROMPT_KEYS
+
+    prompt = ["Classify: {age} {gender} {vaccine_visit} {symptom}"]
+    inputs = make_inputs(args.sessions)
+    print(f"{args.sessions} sessions, {len({str(sorted(i.items())) for i in inputs})} distinct raw inputs, "
+          f"simulated LLM latency {args.latency * 1000:.0f} ms, backend={args.backend}")
+    print(f"{'run':<11} {'LLM calls':>10} {'hit rate':>9} {'ms/classification':>18}")
+
+    def report(name, cache):
+        llm_calls, per_item = run(cache, inputs, args.latency)
+        print(f"{name:<11} {llm_calls:>10} {1 - llm_calls / len(inputs):>9.1%} {per_item * 1000:>18.2f}")
+
+    cache = ClassifierCache("bench", lambda: prompt[0], SYMPTOM_PROMPT_KEYS, backend=args.backend)
+    report("cold", cache)
+    if args.backend != "memory":
+        report("restart", ClassifierCache("bench", lambda: prompt[0], SYMPTOM_PROMPT_KEYS, backend=args.backend))
+    prompt[0] += "\nReturn only the category name."
+    report("new prompt", cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# benchmarks/e2e_suite.py
+# End-to-end load test of the whole serving path, fully offline. The app runs unmodified in a
+# subprocess with the fake backends selected by configuration (LLM_BACKEND=fake,
+# EMBEDDING_BACKEND=fake, see models/fake_llm.py). SQLite seeded with classifier/questioner prompts
+# stands in for Postgres (DATABASE_URL), and a fakeredis server holds the sessions
+# (SESSION_STORE=redis). LangGraph checkpoints stay in memory: RedisSaver needs RediSearch, which
+# fakeredis does not implement.
+#
+# Every simulated patient calls /start_conversation and then sends --turns messages through one
+# route. The appointment data picks the route:
+#   get_info      no appointments, greets the doctor, FAISS retrieval over a synthetic index
+#   symptom       pre-consultation within 48h: classifier, prompt fetch, symptom chain
+#   followup      past post-consultation: followup classifier, prompt fetch, followup chain
+#   same_episode  both: "same episode?" question, "yes", then symptom turns
+# Reports requests/sec, p50/p95/p99 /message latency per route, server CPU per request, and wall
+# and CPU time per stage read from the server's /metrics (METRICS_STAGE_CPU=1).
+#
+#   python benchmarks/e2e_suite.py --server flask --conversations 200 --concurrency 32 --latency 0.2
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import psutil
+import requests
+
+from _stubs import ROOT
+from async_vs_flask import _wait_ready
+from multi_worker_sessions import _start_fake_redis
+
+DOCTOR_NAME = "Dr. Bench"
+ROUTES = ("get_info", "symptom", "followup", "same_episode")
+MESSAGES = {
+    "get_info": [f"Hello {DOCTOR_NAME}, when are you open?", "Do you see children under one year?", "Where is the clinic?", "Thanks"],
+    "symptom": ["My son has had a fever since yesterday", "It was 101F this morning", "No rash, but he is coughing", "done"],
+    "followup": ["He is better after the medicine", "He still coughs at night", "Should we continue the syrup?", "Thanks"],
+    "same_episode": ["The fever is back", "yes", "It started this morning", "done"],
+}
+
+
+def seed_database(url: str):
+    """Creates the prompt tables in SQLite and fills them with prompts of production size."""
+    os.environ["DATABASE_URL"] = url
+    from middleware.config.db import (SessionLocal, create_tables, ClassifierPrompt, QuestionerPrompt,
+                                      followUpClassifierPrompt, followUpQuestionerPrompt)
+    create_tables()
+    with open(os.path.join(ROOT, "Allergy_prompt.txt"), encoding="utf-8") as f:
+        questions = f.read()
+    session = SessionLocal()
+    try:
+        session.add(ClassifierPrompt(specialty_name="paediatrics", doctor_id=1, prompt_text="Classify: {symptom}"))
+        session.add(followUpClassifierPrompt(specialty_name="paediatrics", doctor_id=1, prompt_text="Classify: {symptom_summary}"))
+        for key in ("general_child", "less_than_6_months", "male_child", "female_child"):
+            session.add(QuestionerPrompt(classifier_prompt_ids=[1], prompt_key=key, prompt_text=questions))
+        for key in ("child_consultation", "allergy_asthma_consultation"):
+            session.add(followUpQuestionerPrompt(
+                classifier_prompt_ids=[1], prompt_key=key,
+                prompt_text=questions + "\n\nPrescription: {prescription}\nConversation so far: {messages}"))
+        session.commit()
+    finally:
+        session.close()
+
+
+def build_index(path: str, docs: int):
+    from langchain_community.vectorstores import FAISS
+    from models.fake_llm import fake_embeddings
+    texts = [f"chunk {i}: " + ("Clinic timings, services and fees. " * 25)[:790] for i in range(docs)]
+    FAISS.from_texts(texts, fake_embeddings(int(os.getenv("FAKE_EMBEDDING_DIM", "1536")))).save_local(path)
+
+
+def _appointment(keyword: str, when: datetime) -> dict:
+    return {
+        "appt_id": uuid.uuid4().hex[:6], "appt_datetime": when.strftime("%Y-%m-%dT%H:%M:%S"),
+        "appt_status": "completed" if keyword == "post-consultation" else "booked",
+        "doctor_name": DOCTOR_NAME, "procedure_keyword": keyword,
+        "symptom-summary": "- Primary complaint: fever\n- Duration: 2 days", "prescription": "1. Paracetamol syrup 5 ml, 1-1-1, 3 days",
+    }
+
+
+def start_payload(route: str, thread_id: str) -> dict:
+    now = datetime.now(timezone.utc)
+    appointments = {
+        "get_info": [],
+        "symptom": [_appointment("pre-consultation", now + timedelta(hours=24))],
+        "followup": [_appointment("post-consultation", now - timedelta(days=3))],
+        "same_episode": [_appointment("pre-consultation", now + timedelta(hours=24)),
+                         _appointment("post-consultation", now - timedelta(days=3))],
+    }[route]
+    return {
+        "thread_id": thread_id, "doctor_name": DOCTOR_NAME, "age": "4 years", "gender": "male",
+        "consultation_type": "child consultation", "doctor_info_url": "https://clinic.example/about",
+        "appointment_data": {"appointments": appointments},
+    }
+
+
+def conversation(base_url: str, route: str, turns: int):
+    """Runs one patient conversation; returns [(route, seconds, status)] for its /message calls."""
+    thread_id = f"e2e-{route}-{uuid.uuid4().hex}"
+    requests.post(f"{base_url}/start_conversation", json=start_payload(route, thread_id), timeout=300)
+    results = []
+    for message in MESSAGES[route][:turns]:
+        started = time.perf_counter()
+        resp = requests.post(f"{base_url}/message", json={"thread_id": thread_id, "message": message}, timeout=300)
+        results.append((route, time.perf_counter() - started, resp.status_code))
+    return results
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+def stage_table(metrics_text: str) -> dict:
+    """stage -> {calls, wall, cpu} summed over bots, from the Prometheus text of /metrics."""
+    stages = defaultdict(lambda: {"calls": 0, "wall": 0.0, "cpu": 0.0})
+    patterns = (("wall", r'^chatbot_stage_duration_seconds_sum\{stage="([^"]+)",bot="[^"]*"\} (\S+)$'),
+                ("calls", r'^chatbot_stage_duration_seconds_count\{stage="([^"]+)",bot="[^"]*"\} (\S+)$'),
+                ("cpu", r'^chatbot_stage_cpu_seconds_total\{stage="([^"]+)",bot="[^"]*"\} (\S+)$'))
+    for field, pattern in patterns:
+        for name, value in re.findall(pattern, metrics_text, re.M):
+            stages[name][field] += float(value)
+    return stages
+
+
+def serve(kind: str, port: int):
+    if kind == "flask":
+        from werkzeug.serving import make_server
+        from application import application
+        make_server("127.0.0.1", port, application, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run("asgi_application:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--serve", choices=["flask", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM latency in seconds")
+    parser.add_argument("--output-tokens", type=int, default=60, help="words per fake LLM reply")
+    parser.add_argument("--conversations", type=int, default=200, help="spread evenly over the routes")
+    parser.add_argument("--turns", type=int, default=4, help="messages per conversation (max 4)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--index-docs", type=int, default=2000, help="chunks in the synthetic FAISS index")
+    parser.add_argument("--redis-port", type=int, default=6392)
+    parser.add_argument("--port", type=int, default=5141)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="e2e-")
+    try:
+        database_url = f"sqlite:///{os.path.join(tmp, 'prompts.db')}"
+        seed_database(database_url)
+        index_path = os.path.join(tmp, "faiss")
+        build_index(index_path, args.index_docs)
+        _start_fake_redis(args.redis_port)
+        env = dict(os.environ, LLM_BACKEND="fake", EMBEDDING_BACKEND="fake", OPENAI_API_KEY="sk-offline-benchmark",
+                   FAKE_LLM_LATENCY_SECONDS=str(args.latency), FAKE_LLM_OUTPUT_TOKENS=str(args.output_tokens),
+                   DATABASE_URL=database_url, FAISS_DB_PATH=index_path, CHECKPOINT_BACKEND="memory",
+                   SESSION_STORE="redis", SESSION_REDIS_URL=f"redis://127.0.0.1:{args.redis_port}",
+                   METRICS_STAGE_CPU="1", LOG_LEVEL="WARNING", WARM_UP_ON_START="1")
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", args.server, "--port", str(args.port)],
+                                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            _wait_ready(base_url, timeout=120)
+            # One conversation per route first, so first-use costs (graph compile, index load) are not measured
+            for route in ROUTES:
+                conversation(base_url, route, args.turns)
+            before = requests.get(f"{base_url}/metrics", timeout=10).text
+            cpu_before = sum(psutil.Process(proc.pid).cpu_times()[:2])
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                batches = list(pool.map(lambda i: conversation(base_url, ROUTES[i % len(ROUTES)], args.turns), range(args.conversations)))
+            elapsed = time.perf_counter() - started
+            cpu = sum(psutil.Process(proc.pid).cpu_times()[:2]) - cpu_before
+            after = requests.get(f"{base_url}/metrics", timeout=10).text
+        finally:
+            proc.terminate()
+            proc.wait()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    results = [r for batch in batches for r in batch]
+    requests_sent = len(results) + args.conversations  # /message plus /start_conversation
+    print(f"server={args.server} fake LLM latency={args.latency}s output={args.output_tokens} words "
+          f"conversations={args.conversations} turns={args.turns} concurrency={args.concurrency} cpu_count={os.cpu_count()}")
+    print(f"{requests_sent / elapsed:.1f} req/s ({len(results) / elapsed:.1f} /message/s), "
+          f"server CPU {cpu / requests_sent * 1000:.2f} ms/request over {elapsed:.1f}s")
+    print()
+    print(f"{'route':<13} {'ok':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route in ROUTES + ("all",):
+        rows = [r for r in results if route in ("all", r[0])]
+        latencies = [r[1] * 1000 for r in rows]
+        ok = sum(1 for r in rows if r[2] == 200)
+        print(f"{route:<13} {f'{ok}/{len(rows)}':>6} {statistics.median(latencies):>8.1f} "
+              f"{percentile(latencies, 0.95):>8.1f} {percentile(latencies, 0.99):>8.1f}")
+
+    start, end = stage_table(before), stage_table(after)
+    print()
+    if args.server == "asgi":
+        print("(asgi: the CPU of a stage that awaits includes other requests served by the loop meanwhile)")
+    print(f"{'stage':<28} {'calls':>7} {'wall ms/call':>13} {'cpu ms/call':>12}")
+    for name in sorted(end, key=lambda n: -(end[n]["cpu"] - start[n]["cpu"])):
+        calls = end[name]["calls"] - start[name]["calls"]
+        if calls:
+            wall = (end[name]["wall"] - start[name]["wall"]) / calls * 1000
+            cpu_ms = (end[name]["cpu"] - start[name]["cpu"]) / calls * 1000
+            print(f"{name:<28} {int(calls):>7} {wall:>13.2f} {cpu_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# benchmarks/import_budget.py
+# Import-time budget for the app modules, measured with `python -X importtime` in a fresh interpreter.
+# Fails (exit 1) when importing the app takes longer than the budget or pulls in a module that must
+# stay lazy (OpenAI SDK, FAISS, tiktoken, the Redis checkpointer, ...), so a stray top-level import
+# shows up before it slows down cold starts again. Run it after touching imports:
+#
+#   python benchmarks/import_budget.py --module application --budget-ms 1500
+#   python benchmarks/import_budget.py --module asgi_application --top 25
+import argparse
+import os
+import subprocess
+import sys
+
+from _stubs import ROOT
+
+# Loaded on first use (see config/llm_config.py, utils/general_utils.py, conversation/graph_builder.py)
+LAZY_MODULES = [
+    "openai",
+    "langchain_openai",
+    "faiss",
+    "tiktoken",
+    "bs4",
+    "langchain_community.vectorstores.faiss",
+    "langchain_community.document_loaders.web_base",
+    "langgraph.checkpoint.redis",
+    "langchain.prompts",
+]
+
+
+def importtime(module: str) -> list:
+    """(module, self_us, cumulative_us, depth) for every import made by `import module` in a fresh interpreter."""
+    env = dict(os.environ, CHECKPOINT_BACKEND="memory", WARM_UP_ON_START="0")
+    env.setdefault("OPENAI_API_KEY", "sk-import-budget")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="application")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="fail above this cumulative import time")
+    parser.add_argument("--runs", type=int, default=3, help="the fastest run counts (the first one also warms the disk cache)")
+    parser.add_argument("--top", type=int, default=15, help="show the N slowest imports")
+    args = parser.parse_args()
+
+    runs = [importtime(args.module) for _ in range(args.runs)]
+    rows = min(runs, key=lambda r: next(c for name, _, c, _ in r if name == args.module))
+    total_ms = next(c for name, _, c, _ in rows if name == args.module) / 1000
+    imported = {name for name, _, _, _ in rows}
+
+    print(f"import {args.module}: {total_ms:.0f} ms (best of {args.runs}), budget {args.budget_ms:.0f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, self_us, cumulative_us, depth in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {'  ' * depth}{name}")
+
+    problems = []
+    if total_ms > args.budget_ms:
+        problems.append(f"import time {total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        problems.append(f"imported eagerly (should load on first use): {', '.join(eager)}")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/logging_overhead.py
+# Per-request cost of a symptom turn's diagnostic output: the print() debugging that used to run on
+# every request vs utils/log.py at INFO, at DEBUG with sampling, and at DEBUG in full. The payloads
+# are realistic: payload.json's appointment data, a prompt cut from Bot_prompt.txt and four 800-char
+# retrieved chunks. Output goes to a file opened unbuffered, like stdout under PYTHONUNBUFFERED=1
+# in the Dockerfile. "caller" is the time spent in the request thread; "drained" also waits for
+# the log writer thread to finish.
+#
+#   python benchmarks/logging_overhead.py --requests 2000 --prompt-kb 20
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+
+from _stubs import ROOT
+from utils import log as log_module
+
+
+def _payloads(prompt_kb: int) -> dict:
+    with open(os.path.join(ROOT, "payload.json")) as f:
+        payload = json.load(f)
+    with open(os.path.join(ROOT, "Bot_prompt.txt"), encoding="utf-8", errors="replace") as f:
+        prompt = f.read(prompt_kb * 1024)
+    appointments = payload["appointment_data"]["appointments"]
+    return {
+        "payload": payload,
+        "appointment_data": payload["appointment_data"],
+        "appointments": appointments,
+        "classifier_input": {"age": payload["age"], "gender": payload["gender"], "vaccine_visit": "", "consultation_type": payload["consultation_type"], "symptom": "fever and cough"},
+        "prompt": prompt,
+        "chunks": [("Clinic timings and services. " * 30)[:800] for _ in range(4)],
+        "message": "My son has had a fever and cough since yesterday",
+    }
+
+
+def print_turn(p: dict, out):
+    """The print() calls the serving path made per turn before utils/log.py (application, router, message_flow, chat_state, nodes, chains)."""
+    print("Received /message payload:", p["payload"], file=out)
+    print('[DEBUG] appointment_data before routing:', p["appointment_data"], file=out)
+    print("[DEBUG] Routing logic - ask_same_episode: False", file=out)
+    print("[DEBUG] Routing logic - is_initial_message: True", file=out)
+    print("[DEBUG] Routing logic - current_bot_key: None", file=out)
+    print("[DEBUG] Initial routing - calling decide_bot_route", file=out)
+    print("--- Routing Logic for Bot Selection ---", file=out)
+    print(f"[DEBUG] doctor_name: {p['payload']['doctor_name']}", file=out)
+    print(f"[DEBUG] appointment_data: {p['appointment_data']}", file=out)
+    print(f"[DEBUG] doctor_appointments: {p['appointments']}", file=out)
+    print(f"[DEBUG] future_appointments: {p['appointments']}", file=out)
+    print("[DEBUG] past_appointments: []", file=out)
+    print(f"[DEBUG] first_message: '{p['message']}'", file=out)
+    print("Bot Router -> symptom (Rule 2)", file=out)
+    print("[DEBUG] Router decision: symptom", file=out)
+    print("[DEBUG] Classifier input:", p["classifier_input"], file=out)
+    print("[DEBUG] Classifier output:", "general_child", file=out)
+    print("[DEBUG] Final selected prompt:\n", p["prompt"], file=out)
+    print("[DEBUG] After initialize_symptom_session, symptom_prompt:", p["prompt"], file=out)
+    print("Invoking Symptom Bot selected. on thread: bench", file=out)
+    print("--- Executing Symptom Node (Chain Externalized, Serializable State) ---", file=out)
+    print(f"[DEBUG] Entered retrieve_relevant_chunks with query: '{p['message']}'", file=out)
+    print(f"[DEBUG] Retrieved {len(p['chunks'])} docs from retriever for query: '{p['message']}'", file=out)
+    for i, chunk in enumerate(p["chunks"]):
+        print(f"[DEBUG] Chunk {i}: {chunk[:200]}...", file=out)
+    print(f"Retrieved {len(p['chunks'])} context chunks", file=out)
+    for i, chunk in enumerate(p["chunks"]):
+        print(f"Chunk {i}: {chunk[:200]}...", file=out)
+    context = "\n\n".join(p["chunks"])
+    print(f"Final context passed to LLM: {context[:500]}...", file=out)
+    print("[DEBUG] Context passed to get_info prompt:", context, file=out)
+
+
+def log_turn(p: dict, log):
+    """The same turn through utils/log.py, with the calls and fields the serving path now uses."""
+    payload = p["payload"]
+    log.debug("Received /message", thread_id=payload["thread_id"], message_id=None, payload=payload)
+    log.debug("Planning turn", thread_id=payload["thread_id"], appointment_count=len(p["appointments"]),
+              ask_same_episode=False, is_initial_message=True, current_bot_key=None)
+    log.debug("Routing", doctor_name=payload["doctor_name"], doctor_appointment_count=len(p["appointments"]),
+              future_count=len(p["appointments"]), past_count=0)
+    log.debug("Bot Router -> symptom (Rule 2)")
+    log.debug("Router decision", thread_id=payload["thread_id"], route="symptom")
+    log.debug("Symptom classifier input", classifier_input=p["classifier_input"])
+    log.debug("Symptom classifier output", prompt_key="general_child")
+    log.debug("Selected symptom prompt", prompt=p["prompt"])
+    log.debug("Symptom session initialized", symptom_prompt=p["prompt"])
+    log.debug("Invoking bot", bot="symptom", thread_id=payload["thread_id"])
+    log.debug("Executing symptom node")
+    log.debug("Retrieved chunks", query=p["message"], chunk_count=len(p["chunks"]))
+    context = "\n\n".join(p["chunks"])
+    log.debug("Context passed to LLM", chunks=p["chunks"], context_chars=len(context))
+    log.debug("Context passed to get_info prompt", context=context)
+
+
+def _unbuffered(path):
+    return io.TextIOWrapper(open(path, "wb", buffering=0), encoding="utf-8", write_through=True)
+
+
+def measure(name, requests, run_turn, drain=None):
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for _ in range(requests):
+        run_turn()
+    caller = time.perf_counter() - started
+    if drain:
+        drain()
+    drained = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    return name, caller / requests * 1e6, drained / requests * 1e6, cpu / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--prompt-kb", type=int, default=20, help="size of the selected prompt, in KB")
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="LOG_DEBUG_SAMPLE_RATE for the sampled run")
+    args = parser.parse_args()
+
+    p = _payloads(args.prompt_kb)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        out = _unbuffered(os.path.join(tmp, "print.log"))
+        rows.append(measure("print()", args.requests, lambda: print_turn(p, out)))
+        out.close()
+        for name, level, rate in (("log INFO", "INFO", 1.0),
+                                  (f"log DEBUG {args.sample_rate:.0%}", "DEBUG", args.sample_rate),
+                                  ("log DEBUG 100%", "DEBUG", 1.0)):
+            out = _unbuffered(os.path.join(tmp, "log.log"))
+            log_module.configure_logging(level=level, fmt="json", sample_rate=rate, stream=out)
+            logger = log_module.get_logger("bench")
+            rows.append(measure(name, args.requests, lambda: log_turn(p, logger), log_module.flush_logging))
+            log_module.configure_logging(level="WARNING")
+            out.close()
+
+    print(f"requests={args.requests} prompt={args.prompt_kb}KB (per request, microseconds)")
+    print(f"{'mode':<16} {'caller':>10} {'drained':>10} {'cpu':>10}")
+    for name, caller, drained, cpu in rows:
+        print(f"{name:<16} {caller:>10.1f} {drained:>10.1f} {cpu:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
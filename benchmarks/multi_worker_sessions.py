@@ -0,0 +1,116 @@
+# benchmarks/multi_worker_sessions.py
+# Verifies that /start_conversation and /message work when consecutive requests for the same
+# thread land on different worker processes. A fakeredis TCP server stands in for Redis, each
+# worker is a separate Flask process with SESSION_STORE=redis and a stubbed LLM, and the client
+# sends every request to the next worker round-robin.
+#
+#   python benchmarks/multi_worker_sessions.py --workers 3 --threads 20 --turns 4
+import argparse
+import itertools
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import fakeredis
+import requests
+
+from _stubs import ROOT
+from async_vs_flask import _wait_ready
+
+DOCTOR_NAME = "Dr. Bench"
+
+
+def _start_fake_redis(port: int):
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _conversation(next_url, turns: int):
+    """Runs one thread across the workers; returns a list of problems (empty when consistent)."""
+    problems = []
+    thread_id = f"rr-{uuid.uuid4().hex}"
+    resp = requests.post(f"{next_url()}/start_conversation", json={"thread_id": thread_id, "doctor_name": DOCTOR_NAME})
+    if resp.status_code != 200:
+        return [f"{thread_id}: start returned {resp.status_code}"]
+    for turn in range(turns):
+        message = f"Hello {DOCTOR_NAME}" if turn == 0 else f"question {turn}"
+        resp = requests.post(f"{next_url()}/message", json={"thread_id": thread_id, "message": message})
+        body = resp.json()
+        expected = "Get Info Bot selected." if turn == 0 else "Continuing with previously selected bot: get_info."
+        if resp.status_code != 200 or body.get("bot_selection") != expected:
+            problems.append(f"{thread_id} turn {turn}: {resp.status_code} {body}")
+    return problems
+
+
+def _history_lengths(redis_port: int, thread_ids_prefix: str = "rr-"):
+    os.environ["SESSION_REDIS_URL"] = f"redis://127.0.0.1:{redis_port}"
+    from conversation.session_store import RedisSessionStore
+    store = RedisSessionStore(redis_url=os.environ["SESSION_REDIS_URL"])
+    lengths = {}
+    for key in store._redis.scan_iter(f"{store._prefix}{thread_ids_prefix}*"):
+        thread_id = key.decode()[len(store._prefix):]
+        conv, _ = store.lookup(thread_id)
+        lengths[thread_id] = len(conv['configurable']['current_thread_history'])
+    return lengths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=20, help="concurrent patient conversations")
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--redis-port", type=int, default=6390)
+    parser.add_argument("--port", type=int, default=5121)
+    args = parser.parse_args()
+
+    _start_fake_redis(args.redis_port)
+    env = dict(os.environ, SESSION_STORE="redis", SESSION_REDIS_URL=f"redis://127.0.0.1:{args.redis_port}")
+    procs, urls = [], []
+    try:
+        for i in range(args.workers):
+            port = args.port + i
+            procs.append(subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, "benchmarks", "async_vs_flask.py"), "--serve", "flask", "--port", str(port), "--latency", "0.05"],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+            urls.append(f"http://127.0.0.1:{port}")
+        for url in urls:
+            _wait_ready(url)
+
+        round_robin = itertools.cycle(urls)
+        lock = threading.Lock()
+
+        def next_url():
+            with lock:
+                return next(round_robin)
+
+        started = time.perf_counter()
+        results = []
+        workers = [threading.Thread(target=lambda: results.append(_conversation(next_url, args.turns))) for _ in range(args.threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+    problems = [p for r in results for p in r]
+    lengths = _history_lengths(args.redis_port)
+    # Every turn adds the user message and the bot reply
+    bad_histories = {t: n for t, n in lengths.items() if n != 2 * args.turns}
+    print(f"workers={args.workers} conversations={args.threads} turns={args.turns} elapsed={elapsed:.2f}s")
+    print(f"routing problems: {len(problems)}  sessions in redis: {len(lengths)}  inconsistent histories: {len(bad_histories)}")
+    for p in problems[:10]:
+        print("  ", p)
+    sys.exit(1 if problems or bad_histories or len(lengths) != args.threads else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# benchmarks/prefork_scaling.py
+# Memory per worker and requests/sec of `gunicorn -c gunicorn.conf.py` from 1 to N workers, with the
+# app preloaded in the master (GUNICORN_PRELOAD=1) and loaded separately in every worker (0).
+#
+# Each worker serves get-info turns that search a synthetic FAISS index (--index-docs chunks of
+# text-embedding-3-small size), with the stubbed LLM (benchmarks/stub_wsgi.py) and sessions in a
+# fakeredis server so consecutive requests can land on different workers. Memory is read from
+# /proc after the load: USS is the memory only that worker holds, PSS charges shared pages
+# proportionally, so the sum of PSS over master and workers is the real footprint of the server.
+#
+#   python benchmarks/prefork_scaling.py --workers 1,2,4 --index-docs 20000
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+import requests
+
+from _stubs import EMBEDDING_DIM, ROOT
+from async_vs_flask import _wait_ready
+from multi_worker_sessions import _start_fake_redis
+
+DOCTOR_NAME = "Dr. Bench"
+
+
+def build_index(path: str, docs: int):
+    """Saves a FAISS index of `docs` 800-character chunks embedded with the stub embeddings."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    texts = [f"chunk {i}: " + ("Clinic timings, services and fees. " * 25)[:790] for i in range(docs)]
+    FAISS.from_texts(texts, DeterministicFakeEmbedding(size=EMBEDDING_DIM)).save_local(path)
+
+
+def _one_conversation(base_url: str):
+    thread_id = f"prefork-{uuid.uuid4().hex}"
+    requests.post(f"{base_url}/start_conversation", timeout=60, json={
+        "thread_id": thread_id, "doctor_name": DOCTOR_NAME, "doctor_info_url": "https://clinic.example/about"})
+    started = time.perf_counter()
+    resp = requests.post(f"{base_url}/message", timeout=60, json={"thread_id": thread_id, "message": f"Hello {DOCTOR_NAME}, when are you open?"})
+    return time.perf_counter() - started, resp.status_code
+
+
+def drive(base_url: str, conversations: int, concurrency: int) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _one_conversation(base_url), range(conversations)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(r[0] for r in results)
+    return {
+        "ok": sum(1 for r in results if r[1] == 200),
+        "rps": conversations / elapsed,
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def memory(master_pid: int) -> dict:
+    """USS/PSS of the master and of each worker, in MB."""
+    master = psutil.Process(master_pid)
+    workers = [p.memory_full_info() for p in master.children()]
+    mb = 1024 * 1024
+    return {
+        "worker_uss": sum(m.uss for m in workers) / len(workers) / mb,
+        "worker_pss": sum(m.pss for m in workers) / len(workers) / mb,
+        "total_pss": (master.memory_full_info().pss + sum(m.pss for m in workers)) / mb,
+    }
+
+
+def run(workers: int, preload: bool, args, env: dict) -> dict:
+    port = args.port
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--pythonpath", "benchmarks",
+         "-b", f"127.0.0.1:{port}", "-w", str(workers), "--threads", str(args.threads), "stub_wsgi:application"],
+        cwd=ROOT, env=dict(env, GUNICORN_PRELOAD="1" if preload else "0"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        _wait_ready(base_url, timeout=120)
+        # Until every worker has served some turns, the ones without preload have not loaded the index
+        drive(base_url, workers * args.threads * 4, args.concurrency)
+        result = drive(base_url, args.conversations, args.concurrency)
+        result.update(memory(proc.pid))
+        return result
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--latency", type=float, default=0.05, help="stubbed LLM latency in seconds")
+    parser.add_argument("--index-docs", type=int, default=20000, help="chunks in the synthetic FAISS index")
+    parser.add_argument("--conversations", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--redis-port", type=int, default=6391)
+    parser.add_argument("--port", type=int, default=5131)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="prefork-")
+    try:
+        index_path = os.path.join(tmp, "faiss")
+        build_index(index_path, args.index_docs)
+        _start_fake_redis(args.redis_port)
+        env = dict(os.environ, FAISS_DB_PATH=index_path, CHECKPOINT_BACKEND="memory", LOG_LEVEL="WARNING",
+                   SESSION_STORE="redis", SESSION_REDIS_URL=f"redis://127.0.0.1:{args.redis_port}",
+                   STUB_LLM_LATENCY=str(args.latency))
+        rows = []
+        for preload in (False, True):
+            for workers in (int(w) for w in args.workers.split(",")):
+                rows.append((preload, workers, run(workers, preload, args, env)))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"index={args.index_docs} chunks threads={args.threads} stub LLM latency={args.latency}s "
+          f"conversations={args.conversations} concurrency={args.concurrency} cpu_count={os.cpu_count()}")
+    print(f"{'preload':<8} {'workers':>7} {'ok':>5} {'req/s':>7} {'p95 s':>6} {'worker USS MB':>14} {'worker PSS MB':>14} {'total PSS MB':>13}")
+    for preload, workers, r in rows:
+        print(f"{'yes' if preload else 'no':<8} {workers:>7} {r['ok']:>5} {r['rps']:>7.1f} {r['p95']:>6.2f} "
+              f"{r['worker_uss']:>14.1f} {r['worker_pss']:>14.1f} {r['total_pss']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
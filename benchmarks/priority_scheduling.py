@@ -0,0 +1,88 @@
+# benchmarks/priority_scheduling.py
+# Drives utils/admission.AdmissionController directly with simulated LLM work (time.sleep): a flood
+# of get-info questions plus a steady trickle of symptom turns for imminent appointments. Run once
+# with every request in one class (the single shared queue before priority classes) and once with
+# real classes, and compare the symptom_imminent queue wait and shed counts.
+#
+#   python benchmarks/priority_scheduling.py --get-info-rate 80 --imminent-rate 5 --duration 15 --work 0.5
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _stubs import ROOT  # noqa: F401  (puts the repo on sys.path)
+from utils.admission import AdmissionController, AdmissionRejected, SYMPTOM_IMMINENT
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def run(controller, arrivals, work: float, classed: bool) -> dict:
+    results = {}
+    lock = threading.Lock()
+
+    def one(label):
+        started = time.perf_counter()
+        try:
+            with controller.admit(label if classed else "get_info"):
+                waited = time.perf_counter() - started
+                time.sleep(work)
+            outcome = ("ok", waited)
+        except AdmissionRejected:
+            outcome = ("shed", None)
+        with lock:
+            results.setdefault(label, []).append(outcome)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1000) as pool:
+        for at, label in arrivals:
+            delay = t0 + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, label)
+
+    summary = {}
+    for label, outcomes in results.items():
+        waits = sorted(w for status, w in outcomes if status == "ok")
+        summary[label] = {
+            "sent": len(outcomes),
+            "ok": len(waits),
+            "shed": sum(1 for status, _ in outcomes if status == "shed"),
+            "wait_p50": _percentile(waits, 0.50),
+            "wait_p99": _percentile(waits, 0.99),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--get-info-rate", type=float, default=80, help="get-info arrivals per second")
+    parser.add_argument("--imminent-rate", type=float, default=5, help="imminent symptom arrivals per second")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--work", type=float, default=0.5, help="simulated LLM seconds per request")
+    parser.add_argument("--max-in-flight", type=int, default=32)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--queue-timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    arrivals = [(i / args.get_info_rate, "get_info") for i in range(int(args.get_info_rate * args.duration))]
+    arrivals += [(i / args.imminent_rate, SYMPTOM_IMMINENT) for i in range(int(args.imminent_rate * args.duration))]
+    arrivals.sort()
+
+    print(f"get_info={args.get_info_rate}/s imminent={args.imminent_rate}/s work={args.work}s max_in_flight={args.max_in_flight} "
+          f"capacity={args.max_in_flight / args.work:.0f}/s max_queue={args.max_queue} queue_timeout={args.queue_timeout}s")
+    print(f"{'mode':<10} {'class':<17} {'sent':>5} {'ok':>5} {'shed':>5} {'wait p50':>9} {'wait p99':>9}")
+    for mode, classed in (("one-queue", False), ("priority", True)):
+        # One queue: no per-class caps either, like the controller before priority classes
+        controller = AdmissionController(args.max_in_flight, args.max_queue, args.queue_timeout, None if classed else {})
+        summary = run(controller, arrivals, args.work, classed)
+        for label in (SYMPTOM_IMMINENT, "get_info"):
+            r = summary[label]
+            print(f"{mode:<10} {label:<17} {r['sent']:>5} {r['ok']:>5} {r['shed']:>5} {r['wait_p50']:>9.3f} {r['wait_p99']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
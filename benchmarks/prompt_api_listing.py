@@ -0,0 +1,125 @@
+# benchmarks/prompt_api_listing.py
+# Listing the questioner prompts through middleware/prompt_api.py, served by uvicorn on a seeded
+# SQLite database. There are --prompts rows, each carrying a copy of Bot_prompt.txt (~95 KB). The
+# variants are:
+#   /all, with prompt_text  - every page of 1000 with every column (close to the old unpaged /all)
+#   /all, default fields    - every page of 100 without prompt_text
+#   /export                 - the streaming JSON array of every row with prompt_text
+# Each variant runs on a fresh server process, once without and once with Accept-Encoding: gzip. The
+# report gives the bytes on the wire and the growth of the server's peak RSS (VmHWM) over its idle
+# peak. That growth is the memory one listing costs the API.
+#
+#   python benchmarks/prompt_api_listing.py --prompts 500
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from _stubs import ROOT
+from async_vs_flask import _wait_ready
+
+COLUMNS = "id,classifier_prompt_ids,prompt_key,prompt_text,summary_prompt,version,is_active,created_at,updated_at"
+VARIANTS = {
+    "/all, with prompt_text": ("/questioner-prompts/all", {"limit": 1000, "fields": COLUMNS}),
+    "/all, default fields": ("/questioner-prompts/all", {}),
+    "/export": ("/questioner-prompts/export", None),
+}
+
+
+def seed(url: str, prompts: int):
+    os.environ["DATABASE_URL"] = url
+    from middleware.config.db import SessionLocal, create_tables, QuestionerPrompt
+    create_tables()
+    with open(os.path.join(ROOT, "Bot_prompt.txt"), encoding="utf-8") as f:
+        text = f.read()
+    session = SessionLocal()
+    try:
+        session.execute(QuestionerPrompt.__table__.insert(), [
+            dict(classifier_prompt_ids=[1], prompt_key=f"key_{i}", prompt_text=f"{text}\n(prompt {i})", version="1.0",
+                 is_active=True) for i in range(prompts)])
+        session.commit()
+    finally:
+        session.close()
+
+
+def peak_rss(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def fetch(base_url: str, path: str, params, encoding: str) -> tuple:
+    """(requests, wire bytes, rows) for every page of path, or the single export"""
+    calls = wire = rows = 0
+    after_id = 0
+    while True:
+        query = None if params is None else dict(params, after_id=after_id)
+        with requests.get(f"{base_url}{path}", params=query, headers={"Accept-Encoding": encoding}, stream=True, timeout=600) as resp:
+            resp.raise_for_status()
+            raw = b"".join(resp.raw.stream(65536, decode_content=False))
+        calls += 1
+        wire += len(raw)
+        body = json.loads(gzip.decompress(raw) if encoding == "gzip" else raw)
+        if params is None:
+            return calls, wire, len(body)
+        rows += len(body["items"])
+        if body["next_after_id"] is None:
+            return calls, wire, rows
+        after_id = body["next_after_id"]
+
+
+def run(name: str, database_url: str, port: int) -> dict:
+    path, params = VARIANTS[name]
+    env = dict(os.environ, DATABASE_URL=database_url)
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "prompt_api:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=os.path.join(ROOT, "middleware"), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        _wait_ready(base_url)
+        idle = peak_rss(proc.pid)
+        result = {}
+        for encoding in ("identity", "gzip"):
+            started = time.perf_counter()
+            calls, wire, rows = fetch(base_url, path, params, encoding)
+            result[encoding] = (calls, wire, rows, time.perf_counter() - started)
+        result["rss"] = peak_rss(proc.pid) - idle
+        return result
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--prompts", type=int, default=500)
+    parser.add_argument("--port", type=int, default=5151)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="prompt-api-")
+    try:
+        database_url = f"sqlite:///{os.path.join(tmp, 'prompts.db')}"
+        seed(database_url, args.prompts)
+        results = {name: run(name, database_url, args.port) for name in VARIANTS}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"{args.prompts} questioner prompts of ~95 KB")
+    print(f"{'variant':<24} {'requests':>8} {'rows':>6} {'plain MiB':>10} {'gzip MiB':>9} {'gzip s':>7} {'server peak RSS +MiB':>21}")
+    for name, result in results.items():
+        calls, plain, rows, _ = result["identity"]
+        _, gzipped, _, seconds = result["gzip"]
+        print(f"{name:<24} {calls:>8} {rows:>6} {plain / 2**20:>10.2f} {gzipped / 2**20:>9.2f} {seconds:>7.2f} "
+              f"{result['rss'] / 2**20:>21.1f}")
+
+
+if __name__ == "__main__":
+    main()
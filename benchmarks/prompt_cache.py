@@ -0,0 +1,71 @@
+# benchmarks/prompt_cache.py
+# Prompt lookups (utils/prompt_db.py) with the in-process snapshot vs a query per lookup
+# (PROMPT_CACHE=off), on SQLite seeded like benchmarks/e2e_suite.py. SQLite runs in-process, so the
+# per-query numbers leave out the network round-trip a Postgres query also pays. The script then
+# updates a prompt through the ORM and reports how long the cache takes to serve the new text
+# (bounded by --poll seconds).
+#
+#   python benchmarks/prompt_cache.py --lookups 20000 --poll 1
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from _stubs import ROOT  # noqa: F401  (puts the repo on sys.path)
+from e2e_suite import seed_database
+
+
+def per_lookup_us(lookups: int) -> float:
+    from utils.prompt_db import get_questioner_prompt, get_followup_questioner_prompt, get_classifier_prompt
+    started = time.perf_counter()
+    for i in range(lookups):
+        if i % 3 == 0:
+            get_questioner_prompt("general_child")
+        elif i % 3 == 1:
+            get_followup_questioner_prompt("child_consultation")
+        else:
+            get_classifier_prompt("paediatrics", 1)
+    return (time.perf_counter() - started) / lookups * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--poll", type=float, default=1.0, help="PROMPT_CACHE_POLL_SECONDS")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="prompt-cache-")
+    os.environ["PROMPT_CACHE_POLL_SECONDS"] = str(args.poll)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    seed_database(f"sqlite:///{os.path.join(tmp, 'prompts.db')}")
+    from middleware.config.db import SessionLocal, QuestionerPrompt
+    from utils import prompt_db
+
+    prompt_db.PROMPT_CACHE = "off"
+    uncached = per_lookup_us(max(1, args.lookups // 10))
+    prompt_db.PROMPT_CACHE = "on"
+    per_lookup_us(1)
+    cached = per_lookup_us(args.lookups)
+    print(f"query per lookup: {uncached:10.2f} us")
+    print(f"snapshot:         {cached:10.2f} us  ({uncached / cached:.0f}x)")
+
+    session = SessionLocal()
+    try:
+        row = session.query(QuestionerPrompt).filter(QuestionerPrompt.prompt_key == "general_child").first()
+        row.prompt_text = "edited"  # through the ORM, so updated_at moves
+        session.commit()
+    finally:
+        session.close()
+    edited = time.perf_counter()
+    while prompt_db.get_questioner_prompt("general_child") != "edited":
+        if time.perf_counter() - edited > args.poll * 5 + 5:
+            print("edit not picked up")
+            sys.exit(1)
+        time.sleep(0.01)
+    print(f"edit served after {time.perf_counter() - edited:.2f} s (poll {args.poll} s), "
+          f"reloads={prompt_db.prompt_cache.reloads}")
+
+
+if __name__ == "__main__":
+    main()
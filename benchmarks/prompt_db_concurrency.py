@@ -0,0 +1,105 @@
+# benchmarks/prompt_db_concurrency.py
+# Latency of prompt lookups (utils/prompt_db.py) at --concurrency concurrent callers, against
+# SQLite seeded like benchmarks/e2e_suite.py (or any DATABASE_URL, e.g. a local Postgres). Each
+# caller makes --rounds lookups. The variants:
+#   threads, default pool   - a thread per caller on an engine with SQLAlchemy's default pool (5 + 10)
+#   threads, tuned pool     - the same on engine_options() (DB_POOL_SIZE, DB_MAX_OVERFLOW, pre-ping)
+#   asyncio, to_thread      - tasks that run the sync lookup in the default executor (the old ASGI path)
+#   asyncio, async engine   - tasks awaiting aget_questioner_prompt with PROMPT_CACHE=off
+#   asyncio, snapshot       - tasks awaiting aget_questioner_prompt with the in-process snapshot
+# The async engine uses aiosqlite for SQLite and asyncpg for Postgres (both in requirements.txt).
+#
+#   python benchmarks/prompt_db_concurrency.py --concurrency 200 --rounds 20
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from _stubs import ROOT  # noqa: F401  (puts the repo on sys.path)
+from e2e_suite import percentile, seed_database
+
+KEYS = ("general_child", "less_than_6_months", "male_child", "female_child")
+
+
+def run_threads(engine, concurrency: int, rounds: int) -> tuple:
+    from sqlalchemy.orm import sessionmaker
+    from utils.prompt_db import _questioner_query
+    factory = sessionmaker(bind=engine)
+    latencies, lock = [], threading.Lock()
+
+    def caller(i):
+        mine = []
+        for r in range(rounds):
+            started = time.perf_counter()
+            with factory() as session:
+                session.execute(_questioner_query(KEYS[(i + r) % len(KEYS)])).scalar()
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - started
+
+
+async def run_tasks(lookup, concurrency: int, rounds: int) -> tuple:
+    from middleware.config.db import dispose_async_engine
+    latencies = []
+    await lookup(KEYS[0])  # warm: opens the first connection, or loads the snapshot
+
+    async def caller(i):
+        for r in range(rounds):
+            started = time.perf_counter()
+            await lookup(KEYS[(i + r) % len(KEYS)])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller(i) for i in range(concurrency)))
+    wall = time.perf_counter() - started
+    await dispose_async_engine()
+    return latencies, wall
+
+
+def report(name: str, result: tuple):
+    latencies, wall = result
+    ms = [x * 1000 for x in latencies]
+    print(f"{name:<26} {len(ms) / wall:>9.0f} {statistics.median(ms):>8.2f} {percentile(ms, 0.95):>8.2f} "
+          f"{percentile(ms, 0.99):>8.2f} {max(ms):>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20, help="lookups per caller")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not os.getenv("DATABASE_URL"):
+        seed_database(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='prompt-db-'), 'prompts.db')}")
+    from sqlalchemy import create_engine
+    from middleware.config.db import engine_options, get_database_url
+    from utils import prompt_db
+
+    url = get_database_url()
+    print(f"{url.split('://')[0]}, {args.concurrency} concurrent callers x {args.rounds} lookups")
+    print(f"{'variant':<26} {'lookups/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    report("threads, default pool", run_threads(create_engine(url), args.concurrency, args.rounds))
+    report("threads, tuned pool", run_threads(create_engine(url, **engine_options(url)), args.concurrency, args.rounds))
+
+    prompt_db.PROMPT_CACHE = "off"
+    report("asyncio, to_thread", asyncio.run(run_tasks(
+        lambda key: asyncio.to_thread(prompt_db.get_questioner_prompt, key), args.concurrency, args.rounds)))
+    report("asyncio, async engine", asyncio.run(run_tasks(prompt_db.aget_questioner_prompt, args.concurrency, args.rounds)))
+    prompt_db.PROMPT_CACHE = "on"
+    report("asyncio, snapshot", asyncio.run(run_tasks(prompt_db.aget_questioner_prompt, args.concurrency, args.rounds)))
+
+
+if __name__ == "__main__":
+    main()
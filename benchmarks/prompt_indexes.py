@@ -0,0 +1,140 @@
+# benchmarks/prompt_indexes.py
+# Query plans and latency of the per-key prompt lookups (utils/prompt_db.py, PROMPT_CACHE=off) with
+# and without the indexes of migrations/versions/0002_prompt_indexes.py. The script migrates an
+# empty database (SQLite, or DATABASE_URL, e.g. a local Postgres) to head with Alembic. It then seeds
+# --keys prompt keys and --doctors doctors with --versions versions each. In every group the
+# second-newest version and an old one are active and the newest is an inactive draft. Each lookup
+# is EXPLAINed and timed at head, and again after downgrading to 0001 (no indexes). The script
+# exits 1 if a lookup at head does not probe its ix_*_active index without a sort, or if a lookup
+# or the snapshot serves anything but the newest active version.
+#
+#   python benchmarks/prompt_indexes.py --keys 300 --doctors 300 --versions 20
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from _stubs import ROOT
+
+
+def seed(args) -> int:
+    from middleware.config.db import (SessionLocal, ClassifierPrompt, QuestionerPrompt, followUpClassifierPrompt,
+                                      followUpQuestionerPrompt)
+    active = {args.versions - 2, args.versions // 2}
+    rows = []
+    for v in range(args.versions):
+        common = dict(version=f"{v + 1}.0", is_active=v in active)
+        for key in range(args.keys):
+            rows.append(dict(classifier_prompt_ids=[1], prompt_key=f"key_{key}", prompt_text=f"key_{key} v{v + 1}", **common))
+        for doctor_id in range(1, args.doctors + 1):
+            rows.append(dict(specialty_name="paediatrics", doctor_id=doctor_id, prompt_text=f"doctor_{doctor_id} v{v + 1}", **common))
+    session = SessionLocal()
+    try:
+        for model in (QuestionerPrompt, followUpQuestionerPrompt):
+            session.execute(model.__table__.insert(), [r for r in rows if "prompt_key" in r])
+        for model in (ClassifierPrompt, followUpClassifierPrompt):
+            session.execute(model.__table__.insert(), [r for r in rows if "doctor_id" in r])
+        session.commit()
+    finally:
+        session.close()
+    return len(rows) * 2
+
+
+def lookups(args) -> dict:
+    """table -> (statement for a key, keys)"""
+    from middleware.config.db import ClassifierPrompt, QuestionerPrompt, followUpClassifierPrompt, followUpQuestionerPrompt
+    from utils.prompt_db import _prompt_text
+    doctors = [("paediatrics", d) for d in range(1, args.doctors + 1)]
+    keys = [f"key_{k}" for k in range(args.keys)]
+    return {
+        model.__tablename__: ((lambda key, m=model: _prompt_text(m, m.specialty_name == key[0], m.doctor_id == key[1])), doctors)
+        for model in (ClassifierPrompt, followUpClassifierPrompt)
+    } | {
+        model.__tablename__: ((lambda key, m=model: _prompt_text(m, m.prompt_key == key)), keys)
+        for model in (QuestionerPrompt, followUpQuestionerPrompt)
+    }
+
+
+def to_sql(statement) -> str:
+    from middleware.config.db import engine
+    return str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def measure(args) -> dict:
+    """table -> (plan, us per query); the SQL is compiled up front, so the time is the database's"""
+    from middleware.config.db import engine
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    results = {}
+    with engine.connect() as connection:
+        for table, (statement, keys) in lookups(args).items():
+            plan = "; ".join(str(row[-1]) for row in connection.exec_driver_sql(prefix + to_sql(statement(keys[0]))))
+            sample = [to_sql(statement(key)) for key in random.Random(0).choices(keys, k=args.lookups)]
+            started = time.perf_counter()
+            for sql in sample:
+                connection.exec_driver_sql(sql).scalar()
+            results[table] = (plan, (time.perf_counter() - started) / args.lookups * 1e6)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=300, help="prompt keys per questioner table")
+    parser.add_argument("--doctors", type=int, default=300, help="doctors per classifier table")
+    parser.add_argument("--versions", type=int, default=20, help="versions per key and per doctor")
+    parser.add_argument("--lookups", type=int, default=3000, help="timed lookups per table")
+    args = parser.parse_args()
+    if args.versions < 4:
+        # Fewer leave one active row per key, which SQLite may just as well sort
+        parser.error("--versions must be at least 4")
+
+    if not os.getenv("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='prompt-indexes-'), 'prompts.db')}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from alembic import command
+    from alembic.config import Config
+    from middleware.config.db import SessionLocal, engine
+    from utils import prompt_db
+
+    alembic = Config(os.path.join(ROOT, "alembic.ini"))
+    command.upgrade(alembic, "head")
+    rows = seed(args)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+    indexed = measure(args)
+    command.downgrade(alembic, "0001_prompt_tables")
+    # SQLite connections that prepared statements before the migration can keep planning with the old schema
+    engine.dispose()
+    plain = measure(args)
+    command.upgrade(alembic, "head")
+
+    print(f"{engine.dialect.name}, {rows} prompt rows, {args.versions} versions per key")
+    failures = []
+    for table, (plan, us) in indexed.items():
+        print(f"{table}\n  without indexes: {plain[table][1]:8.1f} us  {plain[table][0]}\n"
+              f"  with indexes:    {us:8.1f} us  {plan}")
+        if f"ix_{table.lower()}_active" not in plan or "TEMP B-TREE" in plan or "Sort" in plan:
+            failures.append(f"{table}: lookup does not probe ix_{table.lower()}_active without a sort")
+
+    served = f"v{args.versions - 1}"
+    prompt_db.PROMPT_CACHE = "off"
+    if not prompt_db.get_questioner_prompt("key_0").endswith(served):
+        failures.append(f"query served {prompt_db.get_questioner_prompt('key_0')!r}, expected {served}")
+    session = SessionLocal()
+    try:
+        snapshot = prompt_db.load_snapshot(session)
+    finally:
+        session.close()
+    if not snapshot.classifier[("paediatrics", 1)].endswith(served) or not snapshot.questioner["key_0"].endswith(served):
+        failures.append(f"snapshot served {snapshot.questioner['key_0']!r}, expected {served}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: every lookup is an index probe and serves the newest active version ({served})")
+
+
+if __name__ == "__main__":
+    main()
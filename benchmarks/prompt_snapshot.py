@@ -0,0 +1,123 @@
+# benchmarks/prompt_snapshot.py
+# Load time and memory of the immutable prompt snapshot (PROMPT_CACHE=snapshot, utils/prompt_db.py)
+# for a full prompt set on SQLite:
+# - one questioner prompt per SYMPTOM_CLASSIFIER_PROMPT key and per followup key, cut from the
+#   repo's prompt files (Allergy_prompt.txt, prompt_updated.txt, Bot_prompt.txt);
+# - classifier and followup classifier prompts for --doctors doctors;
+# - --versions rows per key, of which only the newest is active.
+# It reports the time of the bulk load (best of --repeat), the memory the snapshot holds
+# (tracemalloc), the lookup time, and then deletes the database file to show that lookups keep
+# being answered while a reload fails.
+#
+#   python benchmarks/prompt_snapshot.py --doctors 200 --versions 3
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from _stubs import ROOT
+
+
+def seed(url: str, doctors: int, versions: int) -> int:
+    os.environ["DATABASE_URL"] = url
+    from middleware.config.db import (SessionLocal, create_tables, ClassifierPrompt, QuestionerPrompt,
+                                      followUpClassifierPrompt, followUpQuestionerPrompt)
+    from models.chains import SYMPTOM_CLASSIFIER_PROMPT
+    from models.classifier_rules import SYMPTOM_PROMPT_KEYS, FOLLOWUP_PROMPT_KEYS
+    create_tables()
+    sources = []
+    for name in ("Allergy_prompt.txt", "prompt_updated.txt", "Bot_prompt.txt"):
+        with open(os.path.join(ROOT, name), encoding="utf-8") as f:
+            sources.append(f.read())
+    rows = []
+    for version in range(versions):
+        active = version == versions - 1
+        tag = f"{version + 1}.0"
+        for i, key in enumerate(sorted(SYMPTOM_PROMPT_KEYS)):
+            text = f"Questions for {key}:\n" + sources[i % len(sources)][:20000] + f"\n(v{version})"
+            rows.append(QuestionerPrompt(classifier_prompt_ids=[1], prompt_key=key, prompt_text=text, version=tag, is_active=active))
+        for key in sorted(FOLLOWUP_PROMPT_KEYS):
+            rows.append(followUpQuestionerPrompt(classifier_prompt_ids=[1], prompt_key=key, version=tag, is_active=active,
+                                                 prompt_text=sources[0] + f"\nPrescription: {{prescription}}\n(v{version})"))
+        for doctor_id in range(1, doctors + 1):
+            # Most doctors keep the default classifier text: the snapshot stores it once
+            rows.append(ClassifierPrompt(specialty_name="paediatrics", doctor_id=doctor_id, version=tag, is_active=active,
+                                         prompt_text=SYMPTOM_CLASSIFIER_PROMPT))
+            rows.append(followUpClassifierPrompt(specialty_name="paediatrics", doctor_id=doctor_id, version=tag, is_active=active,
+                                                 prompt_text=f"Classify the followup of doctor {doctor_id % 10}: {{symptom_summary}}"))
+    session = SessionLocal()
+    try:
+        session.add_all(rows)
+        session.commit()
+    finally:
+        session.close()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--versions", type=int, default=3, help="rows per key; only the newest is active")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="prompt-snapshot-")
+    db_path = os.path.join(tmp, "prompts.db")
+    os.environ["PROMPT_CACHE"] = "snapshot"
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    rows = seed(f"sqlite:///{db_path}", args.doctors, args.versions)
+    from middleware.config.db import SessionLocal, engine
+    from utils import prompt_db
+
+    times = []
+    for _ in range(args.repeat):
+        session = SessionLocal()
+        try:
+            started = time.perf_counter()
+            prompt_db.load_snapshot(session)
+            times.append(time.perf_counter() - started)
+        finally:
+            session.close()
+
+    tracemalloc.start()
+    session = SessionLocal()
+    try:
+        before = tracemalloc.take_snapshot()
+        snapshot = prompt_db.load_snapshot(session)
+        held = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    finally:
+        session.close()
+    tracemalloc.stop()
+    maps = {field: getattr(snapshot, field) for field in ("classifier", "followup_classifier", "questioner", "followup_questioner")}
+    entries = sum(len(m) for m in maps.values())
+    text_bytes = sum(len(text.encode("utf-8")) for m in maps.values() for text in m.values())
+    unique_bytes = sum(len(text.encode("utf-8")) for text in {id(t): t for m in maps.values() for t in m.values()}.values())
+
+    print(f"{rows} prompt rows ({entries} active keys), {args.doctors} doctors, {args.versions} versions per key")
+    print(f"bulk load:        {min(times) * 1000:8.1f} ms (best of {args.repeat})")
+    print(f"snapshot memory:  {held / 1024:8.1f} KiB held (prompt text {text_bytes / 1024:.1f} KiB, "
+          f"{unique_bytes / 1024:.1f} KiB after sharing equal texts)")
+
+    prompt_db.load_at_startup()
+    lookups = 100000
+    started = time.perf_counter()
+    for i in range(lookups):
+        prompt_db.get_classifier_prompt("paediatrics", i % args.doctors + 1)
+    print(f"lookup:           {(time.perf_counter() - started) / lookups * 1e9:8.0f} ns")
+
+    expected = prompt_db.get_questioner_prompt("general_child")
+    engine.dispose()
+    os.remove(db_path)
+    try:
+        prompt_db.reload_prompts("admin")
+        print("reload unexpectedly succeeded without the database")
+        sys.exit(1)
+    except Exception as e:
+        print(f"database gone:    reload failed ({type(e).__name__}), lookups still served: "
+              f"{prompt_db.get_questioner_prompt('general_child') == expected}")
+
+
+if __name__ == "__main__":
+    main()
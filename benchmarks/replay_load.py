@@ -0,0 +1,160 @@
+# benchmarks/replay_load.py
+# Replays the conversations of a recorded LLM cassette (LLM_CASSETTE_MODE=record, see
+# models/cassette.py) against a build, keeping each thread's order and the pacing between requests,
+# and compares the replayed latency profile with the recorded one.
+#
+# Record a cassette on a live deployment (use "{pid}" in the path with several workers):
+#   LLM_CASSETTE_MODE=record LLM_CASSETTE_PATH=day-{pid}.jsonl.gz gunicorn -c gunicorn.conf.py application:application
+# Replay it fully offline. --serve starts the build in replay mode, with fake embeddings and a seeded
+# SQLite prompt DB, as in benchmarks/e2e_suite.py. --speedup 24 plays a day in an hour:
+#   python benchmarks/replay_load.py --cassette 'day-{pid}.jsonl.gz' --serve flask --speedup 24
+# Or point it at a build already running with LLM_CASSETTE_MODE=replay:
+#   python benchmarks/replay_load.py --cassette day.jsonl.gz --url http://127.0.0.1:8000
+#
+# Appointment times in the payloads are shifted by the time elapsed since recording, so every turn
+# takes the route it took when it was recorded.
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+from _stubs import ROOT
+from async_vs_flask import _wait_ready
+from e2e_suite import build_index, percentile, seed_database
+from models.cassette import read_cassette
+
+
+def _shift_appointments(body: dict, seconds: float) -> dict:
+    appointments = ((body.get("appointment_data") or {}).get("appointments")) or []
+    if not appointments:
+        return body
+    shifted = []
+    for appt in appointments:
+        appt = dict(appt)
+        if appt.get("appt_datetime"):
+            when = datetime.fromisoformat(appt["appt_datetime"]) + timedelta(seconds=seconds)
+            appt["appt_datetime"] = when.isoformat(timespec="seconds")
+        shifted.append(appt)
+    return {**body, "appointment_data": {**body["appointment_data"], "appointments": shifted}}
+
+
+def load_conversations(pattern: str, run_id: str) -> tuple:
+    """(first recorded timestamp, {thread_id: [request records in order]}) from the cassette."""
+    recorded = sorted((r for r in read_cassette(pattern)
+                       if r.get("type") == "request" and isinstance(r.get("body"), dict) and r["body"].get("thread_id")),
+                      key=lambda r: r["ts"])
+    if not recorded:
+        sys.exit(f"No recorded requests in {pattern}")
+    conversations = defaultdict(list)
+    for r in recorded:
+        conversations[f"{run_id}-{r['body']['thread_id']}"].append(r)
+    return recorded[0]["ts"], conversations
+
+
+def replay(base_url: str, conversations: dict, first_ts: float, speedup: float, max_gap: float, concurrency: int) -> list:
+    """Sends every conversation's requests in order on its own schedule; returns (record, seconds, status)."""
+    results, lock = [], threading.Lock()
+    started_wall = time.time()
+
+    # Gaps longer than max_gap (nights, lunch breaks) are cut before the speedup, across the whole
+    # cassette rather than per thread, so conversations stay interleaved as recorded
+    timeline = sorted({r["ts"] for requests_ in conversations.values() for r in requests_})
+    schedule, previous, at = {}, first_ts, 0.0
+    for ts in timeline:
+        at += min(ts - previous, max_gap) / speedup
+        schedule[ts] = at
+        previous = ts
+
+    def run(thread_id, records):
+        session = requests.Session()
+        for r in records:
+            delay = started_wall + schedule[r["ts"]] - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            # Move appointments as far forward as this request moved from its recorded time
+            body = _shift_appointments({**r["body"], "thread_id": thread_id}, time.time() - r["ts"])
+            sent = time.perf_counter()
+            stream = r["path"].endswith("/stream")
+            try:
+                resp = session.post(f"{base_url}{r['path']}", json=body, timeout=300, stream=stream)
+                # For /message/stream, like the recorded latency, the time to the first byte
+                seconds = time.perf_counter() - sent
+                resp.content
+                status = resp.status_code
+            except requests.RequestException:
+                seconds, status = time.perf_counter() - sent, 0
+            with lock:
+                results.append((r, seconds, status))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda item: run(*item), conversations.items()))
+    return results
+
+
+def report(results: list, elapsed: float):
+    print(f"{len(results)} requests in {elapsed:.1f}s ({len(results) / elapsed:.1f} req/s)")
+    print(f"{'path':<20} {'count':>6} {'status diff':>11}  {'recorded p50/p95/p99 ms':>25}  {'replayed p50/p95/p99 ms':>25}")
+    for path in sorted({r["path"] for r, _, _ in results}):
+        rows = [(r, s, st) for r, s, st in results if r["path"] == path]
+        recorded = [r["latency"] * 1000 for r, _, _ in rows]
+        replayed = [s * 1000 for _, s, _ in rows]
+        mismatched = sum(1 for r, _, status in rows if status != r["status"])
+        profile = lambda values: "/".join(f"{percentile(values, q):.0f}" for q in (0.5, 0.95, 0.99))
+        print(f"{path:<20} {len(rows):>6} {mismatched:>11}  {profile(recorded):>25}  {profile(replayed):>25}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cassette", required=True, help="cassette path; '{pid}' matches every worker's file")
+    parser.add_argument("--url", help="base URL of a build running with LLM_CASSETTE_MODE=replay")
+    parser.add_argument("--serve", choices=["flask", "asgi"], help="start the build locally in replay mode instead")
+    parser.add_argument("--speedup", type=float, default=1.0, help="play the recording this many times faster")
+    parser.add_argument("--max-gap", type=float, default=60.0, help="cap idle gaps in the recording at this many seconds")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="LLM_REPLAY_SPEED for --serve (recorded LLM latency multiplier)")
+    parser.add_argument("--concurrency", type=int, default=256, help="conversations replayed at once")
+    parser.add_argument("--port", type=int, default=5151)
+    args = parser.parse_args()
+    if not args.url and not args.serve:
+        parser.error("pass --url or --serve")
+
+    run_id = f"replay-{uuid.uuid4().hex[:8]}"
+    first_ts, conversations = load_conversations(args.cassette, run_id)
+    proc, tmp = None, None
+    try:
+        base_url = args.url
+        if args.serve:
+            tmp = tempfile.mkdtemp(prefix="replay-")
+            database_url = f"sqlite:///{os.path.join(tmp, 'prompts.db')}"
+            seed_database(database_url)
+            index_path = os.path.join(tmp, "faiss")
+            build_index(index_path, 2000)
+            env = dict(os.environ, LLM_CASSETTE_MODE="replay", LLM_CASSETTE_PATH=args.cassette, LLM_REPLAY_SPEED=str(args.replay_speed),
+                       EMBEDDING_BACKEND="fake", OPENAI_API_KEY="sk-offline-benchmark", DATABASE_URL=database_url,
+                       FAISS_DB_PATH=index_path, CHECKPOINT_BACKEND="memory", LOG_LEVEL="WARNING", WARM_UP_ON_START="1")
+            proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "benchmarks", "e2e_suite.py"), "--serve", args.serve, "--port", str(args.port)],
+                                    cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            base_url = f"http://127.0.0.1:{args.port}"
+            _wait_ready(base_url, timeout=120)
+        started = time.perf_counter()
+        results = replay(base_url, conversations, first_ts, args.speedup, args.max_gap, args.concurrency)
+        report(results, time.perf_counter() - started)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/session_prewarm.py
+# First-/message latency with and without speculative session pre-initialization
+# (conversation/prewarm.py, PREWARM_SESSIONS). The app runs in a subprocess on the offline backends
+# of benchmarks/e2e_suite.py, once per setting. Every simulated patient calls /start_conversation,
+# takes --think seconds to type, and sends the first message of its route; the report is p50/p95
+# of that first /message per route. The classifier rules and cache are off (CLASSIFIER_RULES=off,
+# CLASSIFIER_CACHE_BACKEND=off) so every session pays a classifier LLM call, as inputs the rules
+# cannot resolve do.
+#
+#   python benchmarks/session_prewarm.py --server flask --conversations 120 --latency 0.4 --think 1.0
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from _stubs import ROOT
+from async_vs_flask import _wait_ready
+from e2e_suite import MESSAGES, build_index, percentile, seed_database, serve, start_payload
+
+ROUTES = ("get_info", "symptom", "followup")
+
+
+def first_message(base_url: str, route: str, think: float) -> tuple:
+    thread_id = f"prewarm-{route}-{uuid.uuid4().hex}"
+    requests.post(f"{base_url}/start_conversation", json=start_payload(route, thread_id), timeout=300)
+    time.sleep(think)
+    started = time.perf_counter()
+    resp = requests.post(f"{base_url}/message", json={"thread_id": thread_id, "message": MESSAGES[route][0]}, timeout=300)
+    return route, time.perf_counter() - started, resp.status_code
+
+
+def run(args, prewarm: str, database_url: str, index_path: str) -> list:
+    env = dict(os.environ, LLM_BACKEND="fake", EMBEDDING_BACKEND="fake", OPENAI_API_KEY="sk-offline-benchmark",
+               FAKE_LLM_LATENCY_SECONDS=str(args.latency), FAKE_LLM_OUTPUT_TOKENS="60",
+               DATABASE_URL=database_url, FAISS_DB_PATH=index_path, CHECKPOINT_BACKEND="memory",
+               CLASSIFIER_RULES="off", CLASSIFIER_CACHE_BACKEND="off", PREWARM_SESSIONS=prewarm,
+               LOG_LEVEL="WARNING", WARM_UP_ON_START="1")
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", args.server, "--port", str(args.port)],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        _wait_ready(base_url, timeout=120)
+        for route in ROUTES:
+            first_message(base_url, route, args.think)
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            return list(pool.map(lambda i: first_message(base_url, ROUTES[i % len(ROUTES)], args.think), range(args.conversations)))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--serve", choices=["flask", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--latency", type=float, default=0.4, help="fake LLM latency in seconds")
+    parser.add_argument("--think", type=float, default=1.0, help="seconds between /start_conversation and the first /message")
+    parser.add_argument("--conversations", type=int, default=120, help="spread evenly over the routes")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--index-docs", type=int, default=2000, help="chunks in the synthetic FAISS index")
+    parser.add_argument("--port", type=int, default=5143)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="prewarm-")
+    try:
+        database_url = f"sqlite:///{os.path.join(tmp, 'prompts.db')}"
+        seed_database(database_url)
+        index_path = os.path.join(tmp, "faiss")
+        build_index(index_path, args.index_docs)
+        results = {setting: run(args, setting, database_url, index_path) for setting in ("0", "1")}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"server={args.server} fake LLM latency={args.latency}s think={args.think}s "
+          f"conversations={args.conversations} concurrency={args.concurrency}")
+    print(f"{'route':<10} {'PREWARM_SESSIONS':>17} {'ok':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for route in ROUTES + ("all",):
+        for setting, rows in results.items():
+            rows = [r for r in rows if route in ("all", r[0])]
+            latencies = [r[1] * 1000 for r in rows]
+            ok = sum(1 for r in rows if r[2] == 200)
+            print(f"{route:<10} {setting:>17} {f'{ok}/{len(rows)}':>7} {statistics.median(latencies):>8.1f} "
+                  f"{percentile(latencies, 0.95):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/session_soak.py
+# Compressed-time soak test for conversation/session_store.SessionStore: keeps opening sessions that
+# are abandoned after a few turns and reports RSS, live sessions and eviction/expiry counters.
+# With a bounded store RSS levels off once the first TTL window has passed.
+#
+#   python benchmarks/session_soak.py --minutes 10 --ttl 5 --rate 2000
+import argparse
+import gc
+import time
+import uuid
+from datetime import datetime, timezone
+
+import psutil
+from langchain_core.messages import AIMessage, HumanMessage
+
+from _stubs import ROOT  # noqa: F401  (puts the repo root on sys.path)
+from conversation.session_store import SessionStore
+
+
+def _session(turns: int) -> dict:
+    history = []
+    for i in range(turns):
+        history.append(HumanMessage(content=f"My child has had a cough for {i + 2} days " * 4))
+        history.append(AIMessage(content="Is the cough worse at night or after playing? " * 4))
+    return {
+        'last_activity': datetime.now(timezone.utc),
+        'configurable': {'thread_id': uuid.uuid4().hex, 'current_thread_history': history, 'messages': history},
+        'appointment_data': {'appointments': [{'doctor_name': 'Dr. Soak', 'appt_datetime': '2030-01-01T10:00:00'}] * 5},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=2.0)
+    parser.add_argument("--ttl", type=float, default=5.0, help="compressed SESSION_TIMEOUT in seconds")
+    parser.add_argument("--rate", type=int, default=2000, help="new sessions per second")
+    parser.add_argument("--capacity", type=int, default=5000)
+    parser.add_argument("--turns", type=int, default=6)
+    args = parser.parse_args()
+
+    store = SessionStore(capacity=args.capacity, ttl_seconds=args.ttl)
+    store.start_reaper(interval_seconds=max(args.ttl / 5, 0.2))
+    process = psutil.Process()
+    deadline = time.time() + args.minutes * 60
+    next_report = time.time()
+    print(f"{'elapsed s':>9} {'rss MB':>8} {'live':>6} {'evicted':>8} {'expired':>8}")
+    started = time.time()
+    while time.time() < deadline:
+        tick = time.time()
+        for _ in range(args.rate // 10):
+            conv = _session(args.turns)
+            store.save(conv['configurable']['thread_id'], conv)
+        time.sleep(max(0.0, 0.1 - (time.time() - tick)))
+        if time.time() >= next_report:
+            gc.collect()
+            stats = store.stats()
+            print(f"{time.time() - started:>9.0f} {process.memory_info().rss / 1024 / 1024:>8.1f} {stats['live_sessions']:>6} {stats['evictions']:>8} {stats['expirations']:>8}")
+            next_report += max(args.ttl, 5.0)
+    store.stop_reaper()
+
+
+if __name__ == "__main__":
+    main()
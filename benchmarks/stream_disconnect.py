@@ -0,0 +1,93 @@
+# benchmarks/stream_disconnect.py
+# Regression check for /message/stream in asgi_application.py when the client goes away during the
+# response. The ASGI app runs in-process against the in-memory session store with a stubbed
+# LLM. Each stream gets a `send` that raises on http.response.start, so the body generator never
+# runs, or on the first body chunk, so it stops mid-stream. After that stream no admission slot may
+# still be held, the thread's next /message must not get 409, and a retry with the same message_id
+# must finish instead of joining the dead flight. Exits 1 if any check fails.
+#
+#   python benchmarks/stream_disconnect.py --streams 6
+import argparse
+import asyncio
+import json
+import os
+import sys
+import uuid
+
+from _stubs import install_stub_llm
+
+DOCTOR_NAME = "Dr. Bench"
+# Before the headers (the body generator never starts), and after them (it stops after the first chunk)
+FAIL_ON = ("http.response.start", "http.response.body")
+
+
+async def broken_stream(app, body: dict, fail_on: str):
+    """Runs /message/stream with a client that disconnects when the app sends a fail_on message."""
+    payload = json.dumps(body).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/message/stream", "raw_path": b"/message/stream", "query_string": b"",
+             "root_path": "", "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 1),
+             "server": ("127.0.0.1", 80)}
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()
+        received = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == fail_on:
+            raise OSError("client disconnected")
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        pass
+
+
+async def check(streams: int) -> list:
+    import httpx
+    import asgi_application
+    failures = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_application.app), base_url="http://bench") as client:
+        for i in range(streams):
+            thread_id = f"disconnect-{uuid.uuid4().hex}"
+            await client.post("/start_conversation", json={"thread_id": thread_id, "doctor_name": DOCTOR_NAME})
+            body = {"thread_id": thread_id, "message": f"Hello {DOCTOR_NAME}, when are you open?", "message_id": f"m{i}"}
+            await broken_stream(asgi_application.app, body, FAIL_ON[i % len(FAIL_ON)])
+            in_flight = asgi_application.admission.stats()["in_flight"]
+            if in_flight:
+                failures.append(f"{thread_id}: {in_flight} admission slot(s) still held after the broken stream")
+            try:
+                retry = await asyncio.wait_for(client.post("/message", json=body), 10)
+            except asyncio.TimeoutError:
+                failures.append(f"{thread_id}: retry with the same message_id hung")
+                continue
+            if retry.status_code == 409:
+                failures.append(f"{thread_id}: thread still locked after the broken stream")
+            nxt = await client.post("/message", json=dict(body, message="Thanks", message_id=f"n{i}"))
+            if nxt.status_code == 409:
+                failures.append(f"{thread_id}: next /message got 409")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=6, help="streams dropped by the client")
+    args = parser.parse_args()
+
+    # The app logs every dropped stream as an unhandled exception
+    os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+    install_stub_llm(0.01)
+    failures = asyncio.run(check(args.streams))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: {args.streams} dropped streams released their thread locks, admission slots and flights")
+
+
+if __name__ == "__main__":
+    main()
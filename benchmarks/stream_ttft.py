@@ -0,0 +1,80 @@
+# benchmarks/stream_ttft.py
+# Time-to-first-token of /message/stream against the full-reply latency of /message, with a
+# stubbed LLM that streams its reply word by word over --latency seconds.
+#
+#   python benchmarks/stream_ttft.py --latency 2.0 --turns 20 --server asgi
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import requests
+
+from _stubs import ROOT
+from async_vs_flask import _wait_ready
+
+DOCTOR_NAME = "Dr. Bench"
+
+
+def _message_body(base_url):
+    thread_id = f"ttft-{uuid.uuid4().hex}"
+    requests.post(f"{base_url}/start_conversation", json={"thread_id": thread_id, "doctor_name": DOCTOR_NAME})
+    return {"thread_id": thread_id, "message": f"Hello {DOCTOR_NAME}, which vaccines do you stock?"}
+
+
+def measure_blocking(base_url, turns):
+    latencies = []
+    for _ in range(turns):
+        body = _message_body(base_url)
+        started = time.perf_counter()
+        requests.post(f"{base_url}/message", json=body)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def measure_stream(base_url, turns):
+    first_tokens, totals = [], []
+    for _ in range(turns):
+        body = _message_body(base_url)
+        started = time.perf_counter()
+        first_token = None
+        with requests.post(f"{base_url}/message/stream", json=body, stream=True) as resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if line == "event: token" and first_token is None:
+                    first_token = time.perf_counter() - started
+        totals.append(time.perf_counter() - started)
+        first_tokens.append(first_token if first_token is not None else totals[-1])
+    return first_tokens, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=2.0, help="stubbed LLM generation time in seconds")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--server", choices=["flask", "asgi"], default="asgi")
+    parser.add_argument("--port", type=int, default=5111)
+    args = parser.parse_args()
+
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "async_vs_flask.py"), "--serve", args.server, "--port", str(args.port), "--latency", str(args.latency)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        _wait_ready(base_url)
+        blocking = measure_blocking(base_url, args.turns)
+        first_tokens, totals = measure_stream(base_url, args.turns)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(f"server={args.server} stub LLM generation time={args.latency}s turns={args.turns}")
+    print(f"/message         full reply  p50={statistics.median(blocking):.3f}s")
+    print(f"/message/stream  first token p50={statistics.median(first_tokens):.3f}s  full reply p50={statistics.median(totals):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
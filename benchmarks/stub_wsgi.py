@@ -0,0 +1,14 @@
+# benchmarks/stub_wsgi.py
+# application.py with the stubbed LLM and embeddings, as a WSGI entry point for gunicorn:
+#
+#   gunicorn -c gunicorn.conf.py --pythonpath benchmarks stub_wsgi:application
+#
+# STUB_LLM_LATENCY sets the stubbed LLM latency in seconds (default 0.05).
+import os
+
+from _stubs import install_stub_embeddings, install_stub_llm
+
+install_stub_llm(float(os.getenv("STUB_LLM_LATENCY", "0.05")))
+install_stub_embeddings()
+
+from application import application  # noqa: E402
@@ -3,6 +3,8 @@
 # This would typically be a config.py file or a package with __init__.py and other config-related modules.
 
 # config/constants.py
+from datetime import timedelta
+
 BATCH_SIZE = 100
 EMBEDDING_MODEL = "text-embedding-3-small"
 DOCTOR_WEBSITE_URL = "https://www.linqmd.com/doctor/p-v-n-sravanthi"
@@ -23,3 +25,5 @@ SAMPLE_PRESCRIPTION = """Prescribed Medications:
 - Follow-up in 2 weeks"""
 
 
+
+SESSION_TIMEOUT = timedelta(minutes=15) # Session expires after 15 minutes of inactivity
@@ -1,11 +1,71 @@
 # config/llm_config.py
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
 import os
+import threading
+from dotenv import load_dotenv
+from langchain_core.runnables import Runnable
+from config.settings import LLM_BACKEND, FAKE_LLM_LATENCY_SECONDS, FAKE_LLM_OUTPUT_TOKENS, LLM_CASSETTE_MODE
+from utils.metrics import token_usage
 
 
 load_dotenv()
 
 api_key = os.getenv("OPENAI_API_KEY")
 
-llm = ChatOpenAI(model="gpt-4.1-mini")
\ No newline at end of file
+
+class LazyChatModel(Runnable):
+    """
+    Stands in for the shared chat model so chains can be composed at import time without importing
+    the OpenAI SDK or creating its HTTP clients (most of a cold start). The model is built on first
+    call, or by load() from a warm-up hook; every call is forwarded with its config unchanged, so
+    callbacks, token streaming and tracing see the real model.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.load().invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.load().ainvoke(input, config, **kwargs)
+
+    def batch(self, inputs, config=None, **kwargs):
+        return self.load().batch(inputs, config, **kwargs)
+
+    async def abatch(self, inputs, config=None, **kwargs):
+        return await self.load().abatch(inputs, config, **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.load().stream(input, config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in self.load().astream(input, config, **kwargs):
+            yield chunk
+
+
+def _backend_chat_model(callbacks):
+    if LLM_BACKEND == "fake":
+        from models.fake_llm import FakeChatModel
+        return FakeChatModel(latency=FAKE_LLM_LATENCY_SECONDS, output_tokens=FAKE_LLM_OUTPUT_TOKENS or None, callbacks=callbacks)
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model="gpt-4.1-mini", callbacks=callbacks)
+
+
+def _chat_model():
+    # token_usage counts calls, latency and tokens per bot for /metrics
+    if LLM_CASSETTE_MODE in ("record", "replay"):
+        from models.cassette import cassette_chat_model
+        return cassette_chat_model(_backend_chat_model, callbacks=[token_usage])
+    return _backend_chat_model(callbacks=[token_usage])
+
+
+llm = LazyChatModel(_chat_model)
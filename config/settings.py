@@ -5,3 +5,42 @@ import os
 load_dotenv()
 
 api_key = os.getenv("OPENAI_API_KEY")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Graphs, the checkpointer and the OpenAI clients are built on first use. Set WARM_UP_ON_START=1 to
+# build them in the background as soon as the app starts, so the first request does not wait.
+WARM_UP_ON_START = os.getenv("WARM_UP_ON_START", "0") == "1"
+
+# "openai" (default) or "fake": deterministic offline chat model / embeddings (models/fake_llm.py) for
+# load tests and benchmarks. The fake chat model answers after FAKE_LLM_LATENCY_SECONDS with
+# FAKE_LLM_OUTPUT_TOKENS words (0 keeps its one-sentence reply).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.5"))
+FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "0"))
+# Dimension of the fake embeddings; 1536 matches OpenAI's text-embedding-3-small
+FAKE_EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "1536"))
+
+# LLM cassettes (models/cassette.py): "record" writes every LLM call, and every /start_conversation
+# and /message request, to LLM_CASSETTE_PATH (gzip JSON lines; "{pid}" in the path gives each
+# worker its own file); "replay" answers from that cassette instead of calling the configured model,
+# with the recorded latencies multiplied by LLM_REPLAY_SPEED (0 = no delay). Prompts are stored as
+# hashes unless LLM_CASSETTE_PROMPTS=1.
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl.gz")
+LLM_CASSETTE_PROMPTS = os.getenv("LLM_CASSETTE_PROMPTS", "0") == "1"
+LLM_REPLAY_SPEED = float(os.getenv("LLM_REPLAY_SPEED", "1.0"))
+# Requests the apps add to the cassette in record mode
+CASSETTE_RECORDED_PATHS = ("/start_conversation", "/message", "/message/stream")
+
+# Prompt classifiers (models/classifier_rules.py): "on" resolves the deterministic cases with local
+# rules and calls the LLM only for the rest; "off" always calls the LLM; "shadow" always calls the
+# LLM but also runs the rules and counts agreement in chatbot_classifier_shadow_total.
+CLASSIFIER_RULES = os.getenv("CLASSIFIER_RULES", "on").lower()
+
+# Admin endpoints (POST /admin/reload_prompts) require it in the X-Admin-Token header; unset, they answer 403
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Directory of the saved FAISS index used by get-info retrieval (written by /embed_website)
+FAISS_DB_PATH = os.getenv("FAISS_DB_PATH", "faiss_main")
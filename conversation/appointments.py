@@ -0,0 +1,109 @@
+# conversation/appointments.py
+# Parsed, per-doctor index of a session's appointment_data, used by the router and the same-episode
+# lookup instead of rescanning (and re-parsing the datetimes of) the raw appointment list on every
+# turn. Clients resend the whole appointment_data with each /message, so indexes are cached per
+# process by a content hash of the payload: an unchanged payload is never parsed again, and the
+# hash is kept in the session record so a Redis-backed session finds its index on any worker.
+import bisect
+import hashlib
+import json
+import os
+from datetime import datetime, timezone, timedelta
+from typing import List, NamedTuple, Optional
+from utils import metrics
+from utils.ttl_cache import TTLCache
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Indexes kept per process; one per distinct appointment payload seen recently
+APPOINTMENT_INDEX_CAPACITY = int(os.getenv("APPOINTMENT_INDEX_CAPACITY", "5000"))
+APPOINTMENT_INDEX_TTL_SECONDS = float(os.getenv("APPOINTMENT_INDEX_TTL_SECONDS", "3600"))
+
+# Routing Rule 2: pre-consultations starting less than this far from now
+PRE_CONSULTATION_WINDOW = timedelta(hours=48)
+
+
+class Appointment(NamedTuple):
+    """One entry of appointment_data['appointments'], with its time parsed."""
+    starts_at: Optional[datetime]  # UTC; None if appt_datetime is missing or malformed
+    procedure_keyword: Optional[str]
+    appt_status: Optional[str]
+    raw: dict
+
+
+class DoctorAppointments(NamedTuple):
+    """One doctor's appointments, with what routing needs precomputed."""
+    appointments: List[Appointment]  # by time, undated ones last
+    pre_consultation_starts: List[datetime]  # sorted
+    post_consultation_count: int
+    first_completed: Optional[dict]  # first completed appointment in payload order (same-episode lookup)
+
+
+_NO_APPOINTMENTS = DoctorAppointments([], [], 0, None)
+
+
+def parse_appointment_time(value) -> Optional[datetime]:
+    """appt_datetime as the router reads it: ISO 8601, taken as UTC. None if missing or malformed."""
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+class AppointmentIndex:
+    """Appointments of one appointment_data payload, parsed once and grouped by doctor."""
+
+    def __init__(self, appointment_data: dict):
+        grouped = {}
+        for appt in (appointment_data or {}).get("appointments", []) or []:
+            grouped.setdefault(appt.get("doctor_name"), []).append(appt)
+        self._by_doctor = {doctor: self._index(doctor, appts) for doctor, appts in grouped.items()}
+
+    @staticmethod
+    def _index(doctor, appts) -> DoctorAppointments:
+        records = [Appointment(parse_appointment_time(appt.get("appt_datetime")), appt.get("procedure_keyword"),
+                               appt.get("appt_status"), appt) for appt in appts]
+        pre_consultations = [r for r in records if r.procedure_keyword == "pre-consultation"]
+        if any(r.starts_at is None for r in pre_consultations):
+            log.warning("Ignoring pre-consultations with an invalid appt_datetime", doctor_name=doctor,
+                        invalid_count=sum(1 for r in pre_consultations if r.starts_at is None))
+        return DoctorAppointments(
+            appointments=sorted(records, key=lambda r: (r.starts_at is None, r.starts_at or datetime.min.replace(tzinfo=timezone.utc))),
+            pre_consultation_starts=sorted(r.starts_at for r in pre_consultations if r.starts_at is not None),
+            post_consultation_count=sum(1 for r in records if r.procedure_keyword == "post-consultation"),
+            first_completed=next((r.raw for r in records if r.appt_status == "completed"), None),
+        )
+
+    def for_doctor(self, doctor_name) -> DoctorAppointments:
+        return self._by_doctor.get(doctor_name, _NO_APPOINTMENTS)
+
+    def pre_consultations_within(self, doctor_name, now: datetime, window: timedelta = PRE_CONSULTATION_WINDOW) -> int:
+        """How many of the doctor's pre-consultations start less than `window` after now (or already started)."""
+        return bisect.bisect_left(self.for_doctor(doctor_name).pre_consultation_starts, now + window)
+
+    def has_post_consultation(self, doctor_name) -> bool:
+        return self.for_doctor(doctor_name).post_consultation_count > 0
+
+    def completed_appointment(self, doctor_name) -> Optional[dict]:
+        return self.for_doctor(doctor_name).first_completed
+
+
+def content_hash(appointment_data) -> str:
+    """Stable digest of an appointment_data payload (key order does not matter)."""
+    encoded = json.dumps(appointment_data or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+_indexes = TTLCache(APPOINTMENT_INDEX_CAPACITY, APPOINTMENT_INDEX_TTL_SECONDS)
+metrics.register_cache("appointment_index", _indexes.stats)
+
+
+def get_index(appointment_data, key: str = None) -> AppointmentIndex:
+    """The index for appointment_data; key is its content_hash() if the caller already has it."""
+    key = key or content_hash(appointment_data)
+    index = _indexes.get(key)
+    if index is None:
+        index = AppointmentIndex(appointment_data)
+        _indexes.set(key, index)
+    return index
@@ -0,0 +1,127 @@
+# conversation/bulk_routing.py
+# decide_bot_route (conversation/router.py) for a whole batch of threads at once, for nightly
+# triage jobs over tens of thousands of appointments. The batch is columnar: one list per field.
+#
+#   threads:      thread_id, doctor_name, first_message (optional)
+#   appointments: thread_id, doctor_name, procedure_keyword, appt_datetime
+#
+# The 48-hour window and the past/future masks are computed on NumPy datetime64 arrays, and the
+# per-thread counts with bincount, so the cost is a few passes over the columns instead of one
+# Python-level scan per thread. Decisions are the scalar router's, rule for rule, including the
+# handling of times: appt_datetime is ISO 8601 and read as UTC (any offset in it is ignored, as
+# datetime.fromisoformat(...).replace(tzinfo=utc) does), and a pre-consultation whose time does
+# not parse is ignored (conversation/appointments.py).
+import warnings
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from conversation.appointments import PRE_CONSULTATION_WINDOW, parse_appointment_time
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+APPOINTMENT_COLUMNS = ("thread_id", "doctor_name", "procedure_keyword", "appt_datetime")
+_NAT = np.datetime64("NaT", "us")
+
+
+def _column(batch: dict, name: str, rows: int = None) -> list:
+    values = batch.get(name)
+    if not isinstance(values, list):
+        raise ValueError(f"column '{name}' must be a list")
+    if rows is not None and len(values) != rows:
+        raise ValueError(f"column '{name}' has {len(values)} rows, expected {rows}")
+    return values
+
+
+def _strings(values: list) -> np.ndarray:
+    """A fixed-width unicode array (None becomes ''), so comparisons run in NumPy."""
+    if None in values:
+        values = ["" if v is None else v for v in values]
+    return np.array(values, dtype=np.str_)
+
+
+def parse_times(values: list) -> np.ndarray:
+    """
+    appt_datetime strings as datetime64[us] in UTC, NaT where parse_appointment_time() gives None.
+    Plain naive ISO timestamps are parsed by NumPy in one call. Values with an offset (which NumPy
+    would convert instead of dropping), values NumPy reads differently from fromisoformat (a bare
+    year, "NaT") and anything NumPy rejects are parsed one by one like the scalar router does.
+    """
+    strings = _strings(values)
+    parsed = np.full(len(strings), _NAT)
+    if not len(strings) or strings.itemsize // 4 < 10:
+        return np.array([_scalar_time(v) for v in values], dtype="datetime64[us]")
+    # Starts with YYYY-MM-DD and has no offset after the date
+    chars = strings.view("U1").reshape(len(strings), -1)
+    date = np.char.isdigit(chars[:, [0, 1, 2, 3, 5, 6, 8, 9]]).all(axis=1) & (chars[:, 4] == "-") & (chars[:, 7] == "-")
+    offset = np.isin(chars[:, 10:], ["+", "-", "Z", "z"]).any(axis=1)
+    plain = date & ~offset
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            parsed[plain] = strings[plain].astype("datetime64[us]")
+        slow = ~plain | np.isnat(parsed)
+    except (ValueError, Warning):
+        slow = np.ones(len(strings), dtype=bool)
+    for i in np.flatnonzero(slow):
+        parsed[i] = _scalar_time(values[i])
+    return parsed
+
+
+def _scalar_time(value) -> np.datetime64:
+    started = parse_appointment_time(value)
+    return _NAT if started is None else np.datetime64(started.replace(tzinfo=None), "us")
+
+
+def route_batch(threads: dict, appointments: dict, now: Optional[datetime] = None) -> Dict[str, List[str]]:
+    """
+    Routes every thread of a columnar batch as decide_bot_route would at `now` (default: the
+    current time). Returns {"thread_id": [...], "route": [...]} in the order of threads.
+    Raises ValueError for missing or ragged columns and repeated thread ids.
+    """
+    thread_ids = _column(threads, "thread_id")
+    rows = len(thread_ids)
+    doctor_names = _column(threads, "doctor_name", rows)
+    first_messages = threads.get("first_message") or [""] * rows
+    if len(first_messages) != rows:
+        raise ValueError(f"column 'first_message' has {len(first_messages)} rows, expected {rows}")
+    appt_rows = len(_column(appointments, "thread_id"))
+    appt_threads, appt_doctors, keywords = (_strings(_column(appointments, name, appt_rows)) for name in APPOINTMENT_COLUMNS[:3])
+    appt_times = _column(appointments, "appt_datetime", appt_rows)
+    if not rows:
+        return {"thread_id": [], "route": []}
+
+    now = now or datetime.now(timezone.utc)
+    now = (now.astimezone(timezone.utc) if now.tzinfo else now).replace(tzinfo=None)
+    window_end = np.datetime64(now, "us") + np.timedelta64(PRE_CONSULTATION_WINDOW)
+
+    # Appointment -> thread row; appointments of unknown threads or of another doctor do not count
+    keys = _strings(thread_ids)
+    order = np.argsort(keys, kind="stable")
+    if len(np.unique(keys)) != rows:
+        raise ValueError("thread_id values must be unique")
+    owner = order[np.minimum(np.searchsorted(keys[order], appt_threads), rows - 1)]
+    known = keys[owner] == appt_threads
+    mine = known & (appt_doctors == _strings(doctor_names)[owner])
+
+    pre = mine & (keywords == "pre-consultation")
+    post = mine & (keywords == "post-consultation")
+    starts = np.full(appt_rows, _NAT)
+    starts[pre] = parse_times([appt_times[i] for i in np.flatnonzero(pre)])
+    # NaT compares False, so unparseable times drop out here
+    future = pre & (starts < window_end)
+
+    future_count = np.bincount(owner[future], minlength=rows)
+    past_count = np.bincount(owner[post], minlength=rows)
+    has_future, has_past = future_count > 0, past_count > 0
+    greets = np.char.startswith(_strings(first_messages), np.array([f"Hello {d}" for d in doctor_names], dtype=np.str_))
+
+    routes = np.select(
+        [greets & ~has_past, has_future & ~has_past, has_future & has_past, has_past & ~has_future],
+        ["get_info", "symptom", "same_episode_check", "followup"],
+        default="get_info",
+    )
+    log.info("Routed batch", thread_count=rows, appointment_count=appt_rows, unmatched_count=int((~known).sum()))
+    return {"thread_id": list(thread_ids), "route": routes.tolist()}
@@ -4,9 +4,22 @@
 # conversation/chat_state.py
 from typing import TypedDict, Annotated, Sequence, Literal, Optional, List, Dict, Any
 from langchain_core.messages import BaseMessage
-from utils.prompt_db import get_questioner_prompt, get_followup_questioner_prompt
+from utils.prompt_db import (get_questioner_prompt, get_followup_questioner_prompt,
+                             aget_questioner_prompt, aget_followup_questioner_prompt)
 import re
-from models.chains import classifier_chain, followup_classifier_chain
+from models.chains import classifier_chain, followup_classifier_chain, SYMPTOM_CLASSIFIER_PROMPT, FOLLOWUP_CLASSIFIER_PROMPT
+from models.classifier_rules import (classify_symptom_prompt, classify_followup_prompt, parse_age_months,
+                                     SYMPTOM_PROMPT_KEYS, FOLLOWUP_PROMPT_KEYS)
+from models.classifier_cache import ClassifierCache
+from config.settings import CLASSIFIER_RULES
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# LLM classifier answers for repeated inputs (CLASSIFIER_CACHE_BACKEND, models/classifier_cache.py)
+symptom_classifier_cache = ClassifierCache("symptom", lambda: SYMPTOM_CLASSIFIER_PROMPT, SYMPTOM_PROMPT_KEYS)
+followup_classifier_cache = ClassifierCache("followup", lambda: FOLLOWUP_CLASSIFIER_PROMPT, FOLLOWUP_PROMPT_KEYS)
 
 AppointmentData = Dict[str, any]
 
@@ -35,8 +48,8 @@ class ChatState(TypedDict):
     symptom_prompt: Optional[str]            # Stores the selected prompt for the session
     followup_prompt: Optional[str]           # Stores the selected followup prompt for the session
 
-def initialize_symptom_session(state: ChatState):
-    """Initializes the symptom session by running the classifier and storing the selected prompt in state."""
+def _symptom_classifier_input(state: ChatState):
+    """Applies the age/gender/vaccine fallbacks to state and returns the symptom classifier input."""
     age = state.get("age", "") or state.get("age_group", "")
     gender = state.get("gender", "")
     consultation_type = state.get("consultation_type", "")
@@ -50,13 +63,13 @@ def initialize_symptom_session(state: ChatState):
 
     # Fallback: If age is not a number, try to extract from other fields or set to a default
     if not age or not re.search(r"\d+", str(age)):
-        print(f"[WARNING] Invalid or missing age: '{age}'. Defaulting to '9 months'.")
+        log.warning("Invalid or missing age, defaulting to '9 months'", age=age)
         age = "9 months"
         state["age"] = "9 months"
 
     # Fallback: If gender is missing, log a warning and set to 'unknown'
     if not gender:
-        print(f"[WARNING] Gender not provided in state. Defaulting to 'unknown'.")
+        log.warning("Gender not provided, defaulting to 'unknown'")
         gender = "unknown"
         state["gender"] = "unknown"
 
@@ -80,49 +93,121 @@ def initialize_symptom_session(state: ChatState):
         "consultation_type": consultation_type,
         "symptom": symptom
     }
-    print("[DEBUG] Classifier input:", classifier_input)
-    classifier_output = classifier_chain.invoke(classifier_input).strip()
-    print("[DEBUG] Classifier output:", classifier_output)
+    log.debug("Symptom classifier input", classifier_input=classifier_input)
+    return classifier_input
+
+def _symptom_fallback_key(age) -> str:
+    """The questioner prompt key to fall back to by age when the classifier's key has no prompt."""
+    age_str = str(age).lower().strip()
+    months = parse_age_months(age_str)
+    if months is None:
+        # No unit: a small number is taken as months, anything else as years
+        try:
+            val = float(re.findall(r"[\d.]+", age_str)[0])
+            if val < 6:
+                months = val
+            else:
+                months = val * 12
+        except Exception:
+            months = None
+    return "less_than_6_months" if months is not None and months < 6 else "general_child"
+
+@metrics.timed("prompt_fetch")
+def _store_symptom_prompt(state: ChatState, classifier_output: str, age):
+    """Fetches the questioner prompt for the classifier output (with age fallback) and stores it in state."""
+    log.debug("Symptom classifier output", prompt_key=classifier_output)
 
     # Always fetch prompt dynamically
     selected_prompt = get_questioner_prompt(classifier_output)
     if not selected_prompt:
-        print(f"[WARNING] Could not fetch prompt for key '{classifier_output}'. Trying vaccine/age fallback.")
-        age_str = str(age).lower().strip()
-        month_match = re.match(r"([\d.]+)\s*(m|mo|mos|month|months)", age_str)
-        year_match = re.match(r"([\d.]+)\s*(y|yr|yrs|year|years)", age_str)
-        months = None
-        if month_match:
-            try:
-                months = float(month_match.group(1))
-            except Exception:
-                months = None
-        elif year_match:
-            try:
-                years = float(year_match.group(1))
-                months = years * 12
-            except Exception:
-                months = None
-        else:
-            try:
-                val = float(re.findall(r"[\d.]+", age_str)[0])
-                if val < 6:
-                    months = val
-                else:
-                    months = val * 12
-            except Exception:
-                months = None
-        fallback_key = "less_than_6_months" if months is not None and months < 6 else "general_child"
+        log.warning("No questioner prompt for key %r, trying the age fallback", classifier_output)
+        fallback_key = _symptom_fallback_key(age)
         selected_prompt = get_questioner_prompt(fallback_key)
         if not selected_prompt:
-            print(f"[ERROR] Could not fetch fallback prompt for key '{fallback_key}'. Using default message.")
+            log.error("No fallback questioner prompt for key %r, using the default message", fallback_key)
             selected_prompt = "I'm sorry, I couldn't load the right questions. Please try again later."
-    print("[DEBUG] Final selected prompt:\n", selected_prompt)
+    log.debug("Selected symptom prompt", prompt=selected_prompt)
     state["symptom_prompt"] = selected_prompt
     return state
 
-def initialize_followup_session(state: ChatState):
-    """Initializes the followup session by running the followup classifier and storing the selected prompt in state."""
+@metrics.timed("prompt_fetch")
+async def _astore_symptom_prompt(state: ChatState, classifier_output: str, age):
+    """Async variant of _store_symptom_prompt."""
+    selected_prompt = await aget_questioner_prompt(classifier_output)
+    if not selected_prompt:
+        log.warning("No questioner prompt for key %r, trying the age fallback", classifier_output)
+        fallback_key = _symptom_fallback_key(age)
+        selected_prompt = await aget_questioner_prompt(fallback_key)
+        if not selected_prompt:
+            log.error("No fallback questioner prompt for key %r, using the default message", fallback_key)
+            selected_prompt = "I'm sorry, I couldn't load the right questions. Please try again later."
+    state["symptom_prompt"] = selected_prompt
+    return state
+
+def _rules_decision(classifier: str, rules_key):
+    """
+    The prompt key to use without calling the LLM (CLASSIFIER_RULES=on and the rules were
+    certain), else None. rules_key is the rule engine's answer, None when it could not tell.
+    """
+    if CLASSIFIER_RULES == "on" and rules_key is not None:
+        metrics.CLASSIFIER_DECISIONS.inc(classifier=classifier, source="rules")
+        log.debug("Prompt key resolved by rules", classifier=classifier, prompt_key=rules_key)
+        return rules_key
+    return None
+
+def _llm_decision(classifier: str, rules_key, llm_key, source: str = "llm"):
+    """
+    Counts an LLM classification (source "cache" for a memoized one) and, in shadow mode, whether
+    the rules agreed with it. Returns llm_key; None (a cache miss) is passed through uncounted.
+    """
+    if llm_key is None:
+        return None
+    metrics.CLASSIFIER_DECISIONS.inc(classifier=classifier, source=source)
+    if CLASSIFIER_RULES == "shadow" and rules_key is not None:
+        agreement = "agree" if rules_key == llm_key else "disagree"
+        metrics.CLASSIFIER_SHADOW.inc(classifier=classifier, agreement=agreement)
+        if agreement == "disagree":
+            log.info("Classifier rules disagree with the LLM", classifier=classifier, rules_key=rules_key, llm_key=llm_key)
+    return llm_key
+
+def _symptom_rules_key(classifier_input):
+    return classify_symptom_prompt(classifier_input) if CLASSIFIER_RULES != "off" else None
+
+def initialize_symptom_session(state: ChatState, llm: bool = True):
+    """
+    Initializes the symptom session by running the classifier and storing the selected prompt in state.
+    With llm=False it returns None instead when neither the rules nor the cache resolve the prompt key.
+    """
+    classifier_input = _symptom_classifier_input(state)
+    rules_key = _symptom_rules_key(classifier_input)
+    classifier_output = _rules_decision("symptom", rules_key)
+    if classifier_output is None:
+        classifier_output = _llm_decision("symptom", rules_key, symptom_classifier_cache.get(classifier_input), "cache")
+    if classifier_output is None:
+        if not llm:
+            return None
+        with metrics.stage("classifier"):
+            classifier_output = _llm_decision("symptom", rules_key, classifier_chain.invoke(classifier_input).strip())
+        symptom_classifier_cache.put(classifier_input, classifier_output)
+    return _store_symptom_prompt(state, classifier_output, classifier_input["age"])
+
+async def ainitialize_symptom_session(state: ChatState, llm: bool = True):
+    """Async variant of initialize_symptom_session: awaits the classifier and the prompt fetch."""
+    classifier_input = _symptom_classifier_input(state)
+    rules_key = _symptom_rules_key(classifier_input)
+    classifier_output = _rules_decision("symptom", rules_key)
+    if classifier_output is None:
+        classifier_output = _llm_decision("symptom", rules_key, await symptom_classifier_cache.aget(classifier_input), "cache")
+    if classifier_output is None:
+        if not llm:
+            return None
+        with metrics.stage("classifier"):
+            classifier_output = _llm_decision("symptom", rules_key, (await classifier_chain.ainvoke(classifier_input)).strip())
+        await symptom_classifier_cache.aput(classifier_input, classifier_output)
+    return await _astore_symptom_prompt(state, classifier_output, classifier_input["age"])
+
+def _followup_classifier_input(state: ChatState):
+    """Applies the age/gender/consultation fallbacks to state and returns the followup classifier input."""
     age = state.get("age", "") or state.get("age_group", "")
     gender = state.get("gender", "")
     consultation_type = state.get("consultation_type", "")
@@ -131,15 +216,15 @@ def initialize_followup_session(state: ChatState):
 
     # Fallbacks for missing data
     if not age or not re.search(r"\d+", str(age)):
-        print(f"[WARNING] Invalid or missing age: '{age}'. Defaulting to '9 years'.")
+        log.warning("Invalid or missing age, defaulting to '9 years'", age=age)
         age = "9 years"
         state["age"] = "9 years"
     if not gender:
-        print(f"[WARNING] Gender not provided in state. Defaulting to 'unknown'.")
+        log.warning("Gender not provided, defaulting to 'unknown'")
         gender = "unknown"
         state["gender"] = "unknown"
     if not consultation_type:
-        print(f"[WARNING] Consultation type not provided. Defaulting to 'child consultation'.")
+        log.warning("Consultation type not provided, defaulting to 'child consultation'")
         consultation_type = "child consultation"
         state["consultation_type"] = "child consultation"
 
@@ -150,19 +235,72 @@ def initialize_followup_session(state: ChatState):
         "symptom_summary": symptom_summary,
         "prescription": prescription
     }
-    print("[DEBUG] Followup Classifier input:", classifier_input)
-    # Use the followup classifier chain to get the prompt key
-    prompt_key = followup_classifier_chain.invoke(classifier_input).strip()
-    print("[DEBUG] Followup Classifier output (prompt_key):", prompt_key)
+    log.debug("Followup classifier input", classifier_input=classifier_input)
+    return classifier_input
+
+@metrics.timed("prompt_fetch")
+def _store_followup_prompt(state: ChatState, prompt_key: str):
+    """Fetches the followup questioner prompt for the classifier output (with fallback) and stores it in state."""
+    log.debug("Followup classifier output", prompt_key=prompt_key)
 
     # Fetch the followup questioner prompt using the prompt_key
     selected_prompt = get_followup_questioner_prompt(prompt_key)
     if not selected_prompt:
-        print(f"[WARNING] Could not fetch followup prompt for key '{prompt_key}'. Using 'child_consultation' as fallback.")
+        log.warning("No followup prompt for key %r, falling back to 'child_consultation'", prompt_key)
         selected_prompt = get_followup_questioner_prompt("child_consultation")
         if not selected_prompt:
-            print(f"[ERROR] Could not fetch fallback followup prompt for key 'child_consultation'. Using default message.")
+            log.error("No fallback followup prompt for key 'child_consultation', using the default message")
+            selected_prompt = "I'm sorry, I couldn't load the right followup questions. Please try again later."
+    log.debug("Selected followup prompt", prompt=selected_prompt)
+    state["followup_prompt"] = selected_prompt
+    return state
+
+@metrics.timed("prompt_fetch")
+async def _astore_followup_prompt(state: ChatState, prompt_key: str):
+    """Async variant of _store_followup_prompt."""
+    selected_prompt = await aget_followup_questioner_prompt(prompt_key)
+    if not selected_prompt:
+        log.warning("No followup prompt for key %r, falling back to 'child_consultation'", prompt_key)
+        selected_prompt = await aget_followup_questioner_prompt("child_consultation")
+        if not selected_prompt:
+            log.error("No fallback followup prompt for key 'child_consultation', using the default message")
             selected_prompt = "I'm sorry, I couldn't load the right followup questions. Please try again later."
-    print("[DEBUG] Final selected followup prompt:\n", selected_prompt)
     state["followup_prompt"] = selected_prompt
     return state
+
+def _followup_rules_key(classifier_input):
+    return classify_followup_prompt(classifier_input) if CLASSIFIER_RULES != "off" else None
+
+def initialize_followup_session(state: ChatState, llm: bool = True):
+    """
+    Initializes the followup session by running the followup classifier and storing the selected prompt in state.
+    With llm=False it returns None instead when neither the rules nor the cache resolve the prompt key.
+    """
+    classifier_input = _followup_classifier_input(state)
+    rules_key = _followup_rules_key(classifier_input)
+    prompt_key = _rules_decision("followup", rules_key)
+    if prompt_key is None:
+        prompt_key = _llm_decision("followup", rules_key, followup_classifier_cache.get(classifier_input), "cache")
+    if prompt_key is None:
+        if not llm:
+            return None
+        # Use the followup classifier chain to get the prompt key
+        with metrics.stage("classifier"):
+            prompt_key = _llm_decision("followup", rules_key, followup_classifier_chain.invoke(classifier_input).strip())
+        followup_classifier_cache.put(classifier_input, prompt_key)
+    return _store_followup_prompt(state, prompt_key)
+
+async def ainitialize_followup_session(state: ChatState, llm: bool = True):
+    """Async variant of initialize_followup_session for the ASGI serving path."""
+    classifier_input = _followup_classifier_input(state)
+    rules_key = _followup_rules_key(classifier_input)
+    prompt_key = _rules_decision("followup", rules_key)
+    if prompt_key is None:
+        prompt_key = _llm_decision("followup", rules_key, await followup_classifier_cache.aget(classifier_input), "cache")
+    if prompt_key is None:
+        if not llm:
+            return None
+        with metrics.stage("classifier"):
+            prompt_key = _llm_decision("followup", rules_key, (await followup_classifier_chain.ainvoke(classifier_input)).strip())
+        await followup_classifier_cache.aput(classifier_input, prompt_key)
+    return await _astore_followup_prompt(state, prompt_key)
@@ -1,48 +1,149 @@
 # conversation/graph_builder.py (Revised)
 import os
+import inspect
+import threading
+import contextvars
 from langgraph.graph import StateGraph, END, START # START might not be strictly needed here anymore, but no harm in keeping it for now
-from langgraph.checkpoint.redis import RedisSaver
+from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableLambda
+from config.settings import REDIS_URL
 from conversation.chat_state import ChatState
 from conversation.nodes import get_info_node, symptom_node, followup_node # No need for same_episode_check_node, process_episode_response_node here as they are only used in the main graph if it existed
+from conversation.nodes import aget_info_node, asymptom_node, afollowup_node
+from utils import metrics
+from utils.log import get_logger
 # from conversation.router import decide_bot_route # No need to import router here as it's not used in individual graph builders
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# "redis" (default) persists checkpoints in Redis; "memory" keeps them in-process (local runs and benchmarks)
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "redis").lower()
 
-print("[DEBUG] RedisSaver:", RedisSaver)
-print("[DEBUG] RedisSaver.from_conn_string:", RedisSaver.from_conn_string)
+log = get_logger(__name__)
 
 
-def build_get_info_graph():
-    """Builds and compiles the graph for the Get Info bot."""
+def _get_info_workflow():
     get_info_workflow = StateGraph(ChatState)
-    get_info_workflow.add_node("get_info", get_info_node)
+    # Nodes carry both a sync and an async implementation so the same graph works with invoke and ainvoke
+    get_info_workflow.add_node("get_info", RunnableLambda(get_info_node, afunc=aget_info_node))
     get_info_workflow.set_entry_point("get_info")
     get_info_workflow.add_edge("get_info", END)
-    with RedisSaver.from_conn_string(REDIS_URL) as checkpointer:
-        print(f"[DEBUG] Using checkpointer for get_info_workflow: {checkpointer}")
-        return get_info_workflow.compile(checkpointer=checkpointer)
+    return get_info_workflow
 
 
-def build_symptom_graph():
-    """Builds and compiles the graph for the Symptom Collector bot."""
+def _symptom_workflow():
     symptom_workflow = StateGraph(ChatState)
-    symptom_workflow.add_node("symptom", symptom_node)
+    symptom_workflow.add_node("symptom", RunnableLambda(symptom_node, afunc=asymptom_node))
     symptom_workflow.set_entry_point("symptom")
     symptom_workflow.add_edge("symptom", END)
-    with RedisSaver.from_conn_string(REDIS_URL) as checkpointer:
-        print(f"[DEBUG] Using checkpointer for symptom_workflow: {checkpointer}")
-        return symptom_workflow.compile(checkpointer=checkpointer)
+    return symptom_workflow
 
 
-def build_followup_graph():
-    """Builds and compiles the graph for the Follow-up bot."""
+def _followup_workflow():
     followup_workflow = StateGraph(ChatState)
-    followup_workflow.add_node("followup", followup_node)
+    followup_workflow.add_node("followup", RunnableLambda(followup_node, afunc=afollowup_node))
     followup_workflow.set_entry_point("followup")
     followup_workflow.add_edge("followup", END)
-    with RedisSaver.from_conn_string(REDIS_URL) as checkpointer:
-        print(f"[DEBUG] Using checkpointer for followup_workflow: {checkpointer}")
-        return followup_workflow.compile(checkpointer=checkpointer)
+    return followup_workflow
+
+
+_in_checkpointer = contextvars.ContextVar("in_checkpointer", default=False)
+
+
+def _timed_method(stage, original):
+    # Savers implement aput() by calling put() (or the reverse); only the outermost call is timed
+    if inspect.iscoroutinefunction(original):
+        async def timed(*args, **kwargs):
+            if _in_checkpointer.get():
+                return await original(*args, **kwargs)
+            token = _in_checkpointer.set(True)
+            try:
+                with metrics.stage(stage):
+                    return await original(*args, **kwargs)
+            finally:
+                _in_checkpointer.reset(token)
+        return timed
+
+    def timed(*args, **kwargs):
+        if _in_checkpointer.get():
+            return original(*args, **kwargs)
+        token = _in_checkpointer.set(True)
+        try:
+            with metrics.stage(stage):
+                return original(*args, **kwargs)
+        finally:
+            _in_checkpointer.reset(token)
+    return timed
+
+
+def _timed_checkpointer(checkpointer):
+    """Times checkpoint reads and writes into the checkpoint_read / checkpoint_write stages of /metrics."""
+    for stage, methods in (("checkpoint_read", ("get_tuple", "aget_tuple")),
+                           ("checkpoint_write", ("put", "aput", "put_writes", "aput_writes"))):
+        for method in methods:
+            original = getattr(checkpointer, method, None)
+            if original is not None:
+                setattr(checkpointer, method, _timed_method(stage, original))
+    return checkpointer
+
+
+_redis_checkpointer = None
+_redis_checkpointer_lock = threading.Lock()
+
+
+def redis_checkpointer():
+    """The RedisSaver shared by the sync graphs (one connection pool), created when the first graph is compiled."""
+    global _redis_checkpointer
+    if _redis_checkpointer is None:
+        with _redis_checkpointer_lock:
+            if _redis_checkpointer is None:
+                from langgraph.checkpoint.redis import RedisSaver
+                _redis_checkpointer = _timed_checkpointer(RedisSaver(redis_url=REDIS_URL))
+    return _redis_checkpointer
+
+
+def reset_after_fork():
+    """Drops the shared RedisSaver's pooled connections in a forked worker, so it opens its own instead of sharing the parent's sockets."""
+    pool = getattr(getattr(_redis_checkpointer, "_redis", None), "connection_pool", None)
+    if pool is not None:
+        pool.reset()
+
+
+def _compile(workflow, name):
+    if CHECKPOINT_BACKEND == "memory":
+        return workflow.compile(checkpointer=_timed_checkpointer(MemorySaver()))
+    checkpointer = redis_checkpointer()
+    log.debug("Using checkpointer", workflow=name, checkpointer=type(checkpointer).__name__)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def build_get_info_graph():
+    """Builds and compiles the graph for the Get Info bot."""
+    return _compile(_get_info_workflow(), "get_info_workflow")
+
+
+def build_symptom_graph():
+    """Builds and compiles the graph for the Symptom Collector bot."""
+    return _compile(_symptom_workflow(), "symptom_workflow")
+
+
+def build_followup_graph():
+    """Builds and compiles the graph for the Follow-up bot."""
+    return _compile(_followup_workflow(), "followup_workflow")
+
+
+async def abuild_bot_apps():
+    """Compiles all three bot graphs against an async checkpointer, keyed by bot key, for the ASGI app."""
+    if CHECKPOINT_BACKEND == "memory":
+        checkpointer = MemorySaver()
+    else:
+        from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+        checkpointer = AsyncRedisSaver(redis_url=REDIS_URL)
+        await checkpointer.asetup()
+    checkpointer = _timed_checkpointer(checkpointer)
+    return {
+        "get_info": _get_info_workflow().compile(checkpointer=checkpointer),
+        "symptom": _symptom_workflow().compile(checkpointer=checkpointer),
+        "followup": _followup_workflow().compile(checkpointer=checkpointer),
+    }
 
 def debug_print_thread_state(graph, thread_id):
     """Prints the latest state and full state history for a given thread_id."""
@@ -57,4 +158,4 @@ def debug_print_thread_state(graph, thread_id):
     for i, snapshot in enumerate(state_history):
         print(f"Checkpoint {i}: {snapshot}\n")
 
-# Remove build_main_graph() from this file.
\ No newline at end of file
+# Remove build_main_graph() from this file.
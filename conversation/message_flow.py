@@ -0,0 +1,320 @@
+# conversation/message_flow.py
+# Turn handling shared by the Flask app (application.py) and the ASGI app (asgi_application.py).
+# Everything here is transport-agnostic: it works on the per-thread session record and leaves
+# graph invocation (invoke vs ainvoke) to the caller.
+import json
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from langchain_core.runnables import RunnableConfig
+from config.constants import CLINIC_INFO, SAMPLE_PRESCRIPTION
+from datetime import datetime, timezone
+from conversation.appointments import AppointmentIndex, content_hash, get_index
+from conversation.router import decide_bot_route
+from conversation import prewarm
+from conversation.chat_state import (
+    initialize_symptom_session, initialize_followup_session,
+    ainitialize_symptom_session, ainitialize_followup_session
+)
+from utils.general_utils import extract_specialty_and_age
+from utils.admission import SYMPTOM_IMMINENT
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+BOT_KEYS = ("get_info", "symptom", "followup")
+
+# LangGraph stream modes used by /message/stream: LLM tokens as they arrive, plus the final state
+STREAM_MODES = ["messages", "values"]
+
+BOT_SELECTION_MESSAGES = {
+    "get_info": "Get Info Bot selected.",
+    "symptom": "Symptom Bot selected.",
+    "followup": "Follow-up Bot selected.",
+}
+
+
+def build_conversation(data: dict, now) -> dict:
+    """Builds the session record stored for a thread by /start_conversation."""
+    thread_id = data.get('thread_id')
+    consultation_type = data.get('consultation_type')
+    specialty = data.get('specialty')
+    age_group = data.get('age_group')
+
+    # If consultation_type is provided, extract specialty and age_group from it
+    if consultation_type:
+        specialty, age_group = extract_specialty_and_age(consultation_type)
+    else:
+        # fallback to provided values or defaults
+        specialty = specialty or 'paediatrics'
+        age_group = age_group or None
+
+    return {
+        'last_activity': now, # Timestamp for session timeout
+        'configurable': {
+            'thread_id': thread_id,
+            'doctor_name': data.get('doctor_name'),
+            'clinic_name': data.get('clinic_name', CLINIC_INFO["name"]),
+            'specialty': specialty,
+            'age_group': age_group,
+            'age': data.get('age'),
+            'gender': data.get('gender'),
+            'consultation_type': consultation_type,
+            'vaccine_visit': data.get('vaccine_visit'),
+            'current_thread_history': [],
+            'is_initial_message': True,
+            'current_bot_key': None,
+            'ask_same_episode': False,
+            'prescription': data.get('prescription', SAMPLE_PRESCRIPTION),
+            'symptom_summary': None,
+            'doctor_info_url': data.get('doctor_info_url', None),
+            'services': data.get('services', ""),
+            'symptoms': data.get('symptoms'),
+        },
+        'appointment_data': data.get('appointment_data', {}) # Store appointment details
+    }
+
+
+def appointment_index(conv: dict) -> AppointmentIndex:
+    """
+    The parsed index of the session's appointment_data. The payload's content hash is kept in the
+    session record, so the index is found again without rehashing on any worker.
+    """
+    appointment_data = conv.get('appointment_data') or {}
+    if not conv.get('appointment_hash'):
+        conv['appointment_hash'] = content_hash(appointment_data)
+    return get_index(appointment_data, conv['appointment_hash'])
+
+
+def apply_message_updates(conv: dict, data: dict):
+    """Copies the dynamic fields of a /message payload into the session record."""
+    # Clients resend the whole appointment_data with every message; only a changed one needs a new index
+    if data.get('appointment_data') and data['appointment_data'] != conv.get('appointment_data'):
+        conv['appointment_data'] = data['appointment_data']
+        conv.pop('appointment_hash', None)
+    if data.get('prescription'):
+        conv['configurable']['prescription'] = data['prescription']
+    if data.get('doctor_info_url'):
+        conv['configurable']['doctor_info_url'] = data['doctor_info_url']
+    if data.get('clinic_name'):
+        conv['configurable']['clinic_name'] = data['clinic_name']
+    if data.get('doctor_name'):
+        conv['configurable']['doctor_name'] = data['doctor_name']
+    if data.get('services'):
+        conv['configurable']['services'] = data['services']
+    for key in ['age_group', 'age', 'gender', 'specialty', 'vaccine_visit', 'symptoms']:
+        if data.get(key) is not None:
+            conv['configurable'][key] = data[key]
+
+
+def plan_turn(conv: dict, thread_id: str, user_message: str, route: str = None) -> dict:
+    """
+    Appends the user message to the thread history and applies the prioritized routing rules.
+    route is the initial-message route from priority_class(); it is decided here when None.
+
+    Returns a turn plan. If plan['bot_key'] is None the turn is answered directly with
+    plan['reply']; otherwise the caller invokes the graph for plan['bot_key'] with plan['config'].
+    """
+    # Append the new user message to the thread's cumulative history
+    conv['configurable']['current_thread_history'].append(HumanMessage(content=user_message))
+
+    # RunnableConfig for LangGraph's checkpointer (memory) and other configurable parameters
+    runnable_config_obj = RunnableConfig(configurable={
+        "thread_id": thread_id, # CRITICAL: This links to the checkpointer for each bot
+        "doctor_name": conv['configurable']['doctor_name'],
+        "clinic_name": conv['configurable']['clinic_name'],
+        "specialty": conv['configurable']['specialty']
+    })
+
+    # Ensure appointment_data is present in the configurable state for routing
+    conv['appointment_data'] = conv.get('appointment_data') or {}
+    conv['configurable']['appointment_data'] = conv['appointment_data']
+
+    # --- Routing Logic: Prioritized If-Else Structure ---
+    log.debug("Planning turn", thread_id=thread_id,
+              appointment_count=len(conv['appointment_data'].get('appointments', [])),
+              ask_same_episode=conv['configurable']['ask_same_episode'],
+              is_initial_message=conv['configurable']['is_initial_message'],
+              current_bot_key=conv['configurable']['current_bot_key'])
+
+    # Priority 1: Handling "Same Episode" follow-up question (Rule 3's second step)
+    if conv['configurable']['ask_same_episode']:
+        user_response = user_message.lower().strip()
+        conv['configurable']['ask_same_episode'] = False # Reset the flag after processing the response
+        conv['configurable']['current_bot_key'] = 'symptom' # Set symptom bot as active
+
+        if user_response == 'yes':
+            # User confirmed it's the same episode, retrieve previous details
+            previous_appointment = appointment_index(conv).completed_appointment(conv['configurable']['doctor_name'])
+            if previous_appointment:
+                # Update current state with previous prescription and symptom summary
+                conv['configurable']['prescription'] = previous_appointment.get("prescription", None)
+                conv['configurable']['symptom_summary'] = previous_appointment.get("symptom-summary", None)
+                log.info("Same episode confirmed, continuing with previous context", thread_id=thread_id)
+            else:
+                log.info("Same episode confirmed but no completed appointment found, starting fresh", thread_id=thread_id)
+            return {'bot_key': None, 'reply': 'Continuing with previous episode. Please describe any new symptoms or concerns.'}
+        # user_response is 'no' or anything else
+        log.info("New episode, routing to symptom bot for fresh collection", thread_id=thread_id)
+        return {'bot_key': None, 'reply': 'Starting a new episode. Please describe your current symptoms.'}
+
+    # Priority 2: Initial routing (first message in a new conversation thread)
+    if conv['configurable']['is_initial_message']:
+        conv['configurable']['is_initial_message'] = False # Mark as not initial anymore
+
+        # Ensure 'messages' key is present for routing
+        conv['configurable']['messages'] = conv['configurable']['current_thread_history']
+        route_decision = route
+        if route_decision is None:
+            with metrics.stage("decide_bot_route"):
+                route_decision = decide_bot_route(conv['configurable'], runnable_config_obj, appointment_index(conv))
+        log.debug("Router decision", thread_id=thread_id, route=route_decision)
+
+        if route_decision == "same_episode_check":
+            conv['configurable']['ask_same_episode'] = True # Set flag to ask "same episode?" next
+            # Immediately return the question to the user, no bot invoked yet
+            return {
+                'bot_key': None,
+                'reply': f"Is this related to your previous visit with Dr. {conv['configurable']['doctor_name']}? Please answer 'yes' or 'no'.",
+                'bot_selection': "Same Episode Check initiated."
+            }
+
+        conv['configurable']['current_bot_key'] = route_decision # Store the key of the selected bot
+        if route_decision in BOT_SELECTION_MESSAGES:
+            return {'bot_key': route_decision, 'bot_selection': BOT_SELECTION_MESSAGES[route_decision], 'config': runnable_config_obj}
+        # Fallback for unexpected route_decision (should ideally not happen)
+        return {'bot_key': 'get_info', 'bot_selection': "Defaulting to Get Info Bot.", 'config': runnable_config_obj}
+
+    # Priority 3: Continue with the last selected bot for ongoing conversation
+    bot_key = conv['configurable']['current_bot_key']
+    if bot_key not in BOT_KEYS:
+        # Fallback if current_bot_key is somehow invalid or missing
+        log.warning("Unknown current_bot_key %r, defaulting to get_info", bot_key, thread_id=thread_id)
+    return {
+        'bot_key': bot_key if bot_key in BOT_KEYS else 'get_info',
+        'bot_selection': f"Continuing with previously selected bot: {bot_key}.",
+        'config': runnable_config_obj
+    }
+
+
+def priority_class(conv: dict, user_message: str) -> tuple:
+    """
+    (priority class, route) of the next turn, decided before plan_turn() so a shed request leaves
+    the session untouched. The class is the bot the turn will reach, with symptom turns for a
+    pre-consultation less than 48h away promoted to 'symptom_imminent'. route is the router's
+    decision for an initial message (None otherwise), for plan_turn() to reuse.
+    """
+    cfg = conv['configurable']
+    index = appointment_index(conv)
+    route = None
+    if cfg.get('ask_same_episode'):
+        bot_key = 'symptom'
+    elif cfg.get('is_initial_message'):
+        # The router reads only the first message, which the history has once plan_turn() appends this one
+        messages = cfg['current_thread_history'] or [HumanMessage(content=user_message)]
+        with metrics.stage("decide_bot_route"):
+            route = decide_bot_route({'appointment_data': conv.get('appointment_data') or {}, 'messages': messages},
+                                     RunnableConfig(configurable={'doctor_name': cfg['doctor_name']}), index)
+        bot_key = 'symptom' if route == 'same_episode_check' else route
+    else:
+        bot_key = cfg.get('current_bot_key') if cfg.get('current_bot_key') in BOT_KEYS else 'get_info'
+    if bot_key == 'symptom':
+        if index.pre_consultations_within(cfg['doctor_name'], datetime.now(timezone.utc)):
+            return SYMPTOM_IMMINENT, route
+    return bot_key, route
+
+
+def bot_for_class(priority: str) -> str:
+    """The bot key a priority class belongs to, used to label the turn's metrics before plan_turn() runs."""
+    return 'symptom' if priority == SYMPTOM_IMMINENT else priority
+
+
+def _symptom_session_started(conv: dict):
+    conv['configurable']['symptom_prompt'] = conv['configurable'].get('symptom_prompt')
+    log.debug("Symptom session initialized", symptom_prompt=conv['configurable'].get('symptom_prompt'))
+    conv['configurable']['messages'] = conv['configurable']['current_thread_history']
+    conv['configurable']['messages'].append(HumanMessage(content='start'))
+    conv['configurable']['messages'].append(HumanMessage(content='Which bot are you or what can you assist me with?'))
+
+
+def _followup_session_started(conv: dict):
+    conv['configurable']['followup_prompt'] = conv['configurable'].get('followup_prompt')
+    log.debug("Followup session initialized", followup_prompt=conv['configurable'].get('followup_prompt'))
+
+
+def _needs_session(conv: dict, bot_key: str, prompt_field: str) -> bool:
+    return conv['configurable'].get('current_bot_key') == bot_key and not conv['configurable'].get(prompt_field)
+
+
+def initialize_bot_session(conv: dict):
+    """
+    Runs the classifier/prompt fetch for the symptom or followup bot on its first turn, or takes
+    the result of the speculation /start_conversation launched (conversation/prewarm.py).
+    """
+    speculation = prewarm.pop(conv['configurable']['thread_id'])
+    if _needs_session(conv, 'symptom', 'symptom_prompt'):
+        with metrics.stage("initialize_symptom_session"):
+            if not prewarm.apply(conv['configurable'], 'symptom', speculation):
+                conv['configurable'] = initialize_symptom_session(conv['configurable'])
+        _symptom_session_started(conv)
+    if _needs_session(conv, 'followup', 'followup_prompt'):
+        with metrics.stage("initialize_followup_session"):
+            if not prewarm.apply(conv['configurable'], 'followup', speculation):
+                conv['configurable'] = initialize_followup_session(conv['configurable'])
+        _followup_session_started(conv)
+    prewarm.discard(speculation, conv['configurable'].get('current_bot_key'))
+    # Ensure 'messages' key is present for the bot state (set after any session initialization)
+    conv['configurable']['messages'] = conv['configurable']['current_thread_history']
+
+
+async def ainitialize_bot_session(conv: dict):
+    """Async variant of initialize_bot_session for the ASGI serving path."""
+    speculation = prewarm.pop(conv['configurable']['thread_id'])
+    if _needs_session(conv, 'symptom', 'symptom_prompt'):
+        with metrics.stage("initialize_symptom_session"):
+            if not await prewarm.aapply(conv['configurable'], 'symptom', speculation):
+                conv['configurable'] = await ainitialize_symptom_session(conv['configurable'])
+        _symptom_session_started(conv)
+    if _needs_session(conv, 'followup', 'followup_prompt'):
+        with metrics.stage("initialize_followup_session"):
+            if not await prewarm.aapply(conv['configurable'], 'followup', speculation):
+                conv['configurable'] = await ainitialize_followup_session(conv['configurable'])
+        _followup_session_started(conv)
+    prewarm.discard(speculation, conv['configurable'].get('current_bot_key'))
+    conv['configurable']['messages'] = conv['configurable']['current_thread_history']
+
+
+def record_reply(conv: dict, state_after_invoke) -> str:
+    """Extracts the bot's reply from the graph result and appends it to the thread history."""
+    if not state_after_invoke or not state_after_invoke.get('messages'):
+        return "I'm sorry, I couldn't get a valid response from the bot's processing."
+    # Extract the last AI message from the bot's full response history
+    ai_reply_message = next((msg for msg in reversed(state_after_invoke['messages']) if isinstance(msg, AIMessage)), None)
+    if not ai_reply_message:
+        return "I'm sorry, I couldn't generate a clear response from the bot."
+    # Append the bot's AI message to the thread's cumulative history
+    conv['configurable']['current_thread_history'].append(ai_reply_message)
+    return ai_reply_message.content
+
+
+def build_response(plan: dict, reply: str) -> dict:
+    """Shapes the JSON body returned by /message."""
+    response_data = {'reply': reply}
+    if plan.get('bot_selection'):
+        response_data['bot_selection'] = plan['bot_selection']
+    return response_data
+
+
+def stream_token(mode: str, payload, bot_key: str):
+    """Returns the text of an LLM token emitted by the bot's node during graph.stream(), or None."""
+    if mode != "messages":
+        return None
+    chunk, metadata = payload
+    # Only token chunks from the bot node; full messages re-emitted from the node output are skipped
+    if isinstance(chunk, AIMessageChunk) and chunk.content and metadata.get("langgraph_node") == bot_key:
+        return chunk.content
+    return None
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Formats one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
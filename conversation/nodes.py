@@ -4,44 +4,63 @@ from models.chains import get_info_chain, followup_chain, episode_check_chain, m
 from langchain_core.messages import AIMessage
 from typing import Dict, Any
 from config.constants import SAMPLE_PRESCRIPTION
-from utils.general_utils import retrieve_relevant_chunks
-from langchain.prompts import ChatPromptTemplate
+from utils.general_utils import retrieve_relevant_chunks, aretrieve_relevant_chunks
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+def _join_context(context_chunks):
+    context = "\n\n".join(context_chunks)
+    log.debug("Context passed to LLM", chunks=context_chunks, context_chars=len(context))
+    return context
+
+def _get_info_input(state: ChatState, context: str):
+    return {
+        "messages": state["messages"],
+        "context": context,
+        "clinic_name": state.get("clinic_name", ""),
+        "doctor_name": state.get("doctor_name", ""),
+        "services": state.get("services", "")
+    }
+
 def get_info_node(state: ChatState):
     """Node to handle general information requests."""
-    print("--- Executing Get Info Node ---")
     query = str(state["messages"][-1].content)
     
     # Get doctor_info_url from state if available
     doctor_info_url = state.get("doctor_info_url")
-    print(f"[DEBUG] doctor_info_url from state: {doctor_info_url}")
+    log.debug("Executing get_info node", doctor_info_url=doctor_info_url)
     
     # Only retrieve context if we have a valid URL
     if doctor_info_url:
-        context_chunks = retrieve_relevant_chunks(doctor_info_url, query, k=4)
-        print(f"Retrieved {len(context_chunks)} context chunks")
-        for i, chunk in enumerate(context_chunks):
-            print(f"Chunk {i}: {chunk[:200]}...")
-        context = "\n\n".join(context_chunks)
-        print(f"Final context passed to LLM: {context[:500]}...")
+        context = _join_context(retrieve_relevant_chunks(doctor_info_url, query, k=4))
     else:
-        print("[DEBUG] No doctor_info_url provided, using empty context")
         context = ""
     
-    response_content = get_info_chain.invoke({
-        "messages": state["messages"],
-        "context": context,
-        "clinic_name": state.get("clinic_name", ""),
-        "doctor_name": state.get("doctor_name", ""),
-        "services": state.get("services", "")
-    })
+    with metrics.stage("chain"):
+        response_content = get_info_chain.invoke(_get_info_input(state, context))
     return {"messages": state["messages"] + [AIMessage(content=response_content)]}
 
-def symptom_node(state: ChatState):
-    print("--- Executing Symptom Node (Chain Externalized, Serializable State) ---")
+async def aget_info_node(state: ChatState):
+    """Async variant of get_info_node used when the graph is driven with ainvoke."""
+    query = str(state["messages"][-1].content)
+    doctor_info_url = state.get("doctor_info_url")
+    log.debug("Executing get_info node (async)", doctor_info_url=doctor_info_url)
+    if doctor_info_url:
+        context = _join_context(await aretrieve_relevant_chunks(doctor_info_url, query, k=4))
+    else:
+        context = ""
+    with metrics.stage("chain"):
+        response_content = await get_info_chain.ainvoke(_get_info_input(state, context))
+    return {"messages": state["messages"] + [AIMessage(content=response_content)]}
+
+def _symptom_turn(state: ChatState):
+    """Builds the symptom chain, its input and the 'end' flag for the current turn."""
     if "symptom_prompt" not in state or not state["symptom_prompt"]:
         raise ValueError("Hi we are initializing the Bot. Please start by saying Hi :)")
-    from models.chains import make_symptom_chain
     age = state.get("age_group", "")
     gender = state.get("gender", "")
     consultation_type = state.get("consultation_type", "")
@@ -49,34 +68,35 @@ def symptom_node(state: ChatState):
     # Check for user stop/summary triggers
     user_message = str(state["messages"][-1].content).strip().lower() if state["messages"] else ""
     stop_triggers = ["stop", "no more", "that's all", "no more information", "done", "end", "finish", "nothing else"]
-    if any(trigger in user_message for trigger in stop_triggers) or not user_message:
-        # Generate summary and add 'end' flag True
-        chain = make_symptom_chain(age, gender, consultation_type, symptom, prompt_override=state["symptom_prompt"])
-        summary_content = chain.invoke({
-            "age": age,
-            "gender": gender,
-            "vaccine_visit": consultation_type,
-            "symptom": symptom,
-            "messages": state["messages"]
-        })
-        return {
-            "messages": state["messages"] + [AIMessage(content=summary_content)],
-            "end": True
-        }
-    # Normal Q&A flow, end is False
+    # Stop trigger generates the summary and adds 'end' flag True; otherwise normal Q&A flow, end is False
+    end = any(trigger in user_message for trigger in stop_triggers) or not user_message
     chain = make_symptom_chain(age, gender, consultation_type, symptom, prompt_override=state["symptom_prompt"])
-    response_content = chain.invoke({
+    chain_input = {
         "age": age,
         "gender": gender,
         "vaccine_visit": consultation_type,
         "symptom": symptom,
         "messages": state["messages"]
-    })
-    return {"messages": state["messages"] + [AIMessage(content=response_content)], "end": False}
+    }
+    return chain, chain_input, end
 
-def followup_node(state: ChatState):
-    """Node to handle post-appointment follow-up."""
-    print("--- Executing Follow-up Node ---")
+def symptom_node(state: ChatState):
+    log.debug("Executing symptom node")
+    chain, chain_input, end = _symptom_turn(state)
+    with metrics.stage("chain"):
+        response_content = chain.invoke(chain_input)
+    return {"messages": state["messages"] + [AIMessage(content=response_content)], "end": end}
+
+async def asymptom_node(state: ChatState):
+    """Async variant of symptom_node used when the graph is driven with ainvoke."""
+    log.debug("Executing symptom node (async)")
+    chain, chain_input, end = _symptom_turn(state)
+    with metrics.stage("chain"):
+        response_content = await chain.ainvoke(chain_input)
+    return {"messages": state["messages"] + [AIMessage(content=response_content)], "end": end}
+
+def _followup_turn(state: ChatState):
+    """Builds the followup chain from the session's selected prompt and its input."""
     if "followup_prompt" not in state or not state["followup_prompt"]:
         raise ValueError("Hi, we are initializing the Followup Bot. Please start by saying Hi or ensure the session is initialized.")
     from models.chains import llm
@@ -89,12 +109,27 @@ def followup_node(state: ChatState):
         "prescription": state.get("prescription", ""),
         "clinic_name": state.get("clinic_name", "")
     }
-    response_content = (followup_prompt_template | llm | StrOutputParser()).invoke(input_dict)
+    return followup_prompt_template | llm | StrOutputParser(), input_dict
+
+def followup_node(state: ChatState):
+    """Node to handle post-appointment follow-up."""
+    log.debug("Executing followup node")
+    chain, input_dict = _followup_turn(state)
+    with metrics.stage("chain"):
+        response_content = chain.invoke(input_dict)
+    return {"messages": state["messages"] + [AIMessage(content=response_content)]}
+
+async def afollowup_node(state: ChatState):
+    """Async variant of followup_node used when the graph is driven with ainvoke."""
+    log.debug("Executing followup node (async)")
+    chain, input_dict = _followup_turn(state)
+    with metrics.stage("chain"):
+        response_content = await chain.ainvoke(input_dict)
     return {"messages": state["messages"] + [AIMessage(content=response_content)]}
 
 def same_episode_check_node(state: ChatState):
     """Node to ask the user if the current issue is the same episode."""
-    print("--- Executing Same Episode Check Node ---")
+    log.debug("Executing same episode check node")
     
     # Ensure configurable is accessed correctly and safe
     doctor_name_from_config = state.get("configurable", {}).get("doctor_name")
@@ -125,7 +160,7 @@ def same_episode_check_node(state: ChatState):
 
 def process_episode_response_node(state: ChatState):
     """Node to process the user's response to the same episode question."""
-    print("--- Executing Process Episode Response Node ---")
+    log.debug("Executing process episode response node")
     if state.get("same_episode_response") == "yes":
         doctor_name_from_config = state.get("configurable", {}).get("doctor_name")
         
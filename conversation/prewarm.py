@@ -0,0 +1,223 @@
+# conversation/prewarm.py
+# Speculative session pre-initialization. /start_conversation already carries everything the first
+# bot turn's expensive work depends on (appointments, age, gender, consultation type, symptoms),
+# so that work starts in the background as soon as the session exists:
+#   - the appointment index and the predicted route (decide_bot_route before any message)
+#   - symptom/followup: the prompt classification and the questioner prompt fetch
+#   - get_info: loading the FAISS index
+# The turn that initializes the bot session then waits for the running speculation instead of
+# starting over. A result is only used if the classifier inputs it was computed from are still the
+# session's (a /message may change age, gender, symptoms or the prescription); otherwise, or when
+# it failed or is not ready within PREWARM_WAIT_SECONDS, the session initializes as before.
+#
+# A classifier LLM call the rules and the cache cannot spare waits for a slot in the lowest
+# admission class (utils/admission.py, PREWARM), behind every turn a client is waiting for. The
+# prediction cannot see the first message, so a session that opens by greeting the doctor (routing
+# Rule 1) discards its symptom speculation; discarded ones are counted in
+# chatbot_session_prewarm_wasted_total.
+#
+# Speculations live in the process that served /start_conversation. With SESSION_STORE=redis and
+# round-robin balancing, a first /message on another worker initializes normally.
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+from langchain_core.runnables import RunnableConfig
+from config.constants import SESSION_TIMEOUT
+from conversation.router import decide_bot_route
+from conversation.chat_state import (
+    initialize_symptom_session, initialize_followup_session,
+    ainitialize_symptom_session, ainitialize_followup_session
+)
+from utils.admission import AdmissionRejected, PREWARM
+from utils.general_utils import load_faiss
+from utils.ttl_cache import TTLCache
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+PREWARM_SESSIONS = os.getenv("PREWARM_SESSIONS", "1") == "1"
+# Concurrent speculations per process (threads in Flask, tasks in the ASGI app)
+PREWARM_WORKERS = int(os.getenv("PREWARM_WORKERS", "4"))
+# How long a bot turn waits for an unfinished speculation before initializing on its own
+PREWARM_WAIT_SECONDS = float(os.getenv("PREWARM_WAIT_SECONDS", "10"))
+MAX_PREWARMED = int(os.getenv("MAX_PREWARMED", "5000"))
+
+# Session fields each bot's classifier input is built from (chat_state._*_classifier_input)
+SESSION_INPUTS = {
+    "symptom": ("age", "age_group", "gender", "consultation_type", "vaccine_visit", "symptoms"),
+    "followup": ("age", "age_group", "gender", "consultation_type", "symptom_summary", "prescription"),
+}
+
+_pending = TTLCache(MAX_PREWARMED, SESSION_TIMEOUT.total_seconds())
+_pool = ThreadPoolExecutor(max_workers=PREWARM_WORKERS, thread_name_prefix="prewarm")
+_semaphore = None
+
+
+class Speculation:
+    """
+    One thread's background initialization. bot_key is set as soon as the route is predicted;
+    result (a Future or an asyncio.Task) yields (inputs, session updates), or None for get_info and
+    for a classifier call the admission controller shed. llm is set once it calls the classifier LLM,
+    used once a bot turn takes its result.
+    """
+
+    def __init__(self):
+        self.bot_key = None
+        self.result = None
+        self.llm = False
+        self.used = False
+
+
+def predict_bot(cfg: dict, appointment_data: dict) -> str:
+    """The bot the first turns will reach, judged from the appointments alone."""
+    route = decide_bot_route({'appointment_data': appointment_data, 'messages': []},
+                             RunnableConfig(configurable={'doctor_name': cfg.get('doctor_name')}))
+    # A same-episode check is answered directly and then continues with the symptom bot
+    return 'symptom' if route == 'same_episode_check' else route
+
+
+def session_inputs(cfg: dict, bot_key: str) -> tuple:
+    return tuple(cfg.get(field) for field in SESSION_INPUTS[bot_key])
+
+
+def _updates(cfg: dict, state: dict) -> dict:
+    """What initializing the session wrote into its copy of cfg: the prompt and any input fallbacks."""
+    return {key: value for key, value in state.items() if key not in cfg or cfg[key] != value}
+
+
+def _initialize(speculation: Speculation, cfg: dict, appointment_data: dict, admission):
+    speculation.bot_key = predict_bot(cfg, appointment_data)
+    if speculation.bot_key not in SESSION_INPUTS:
+        load_faiss()
+        return None
+    initialize = initialize_symptom_session if speculation.bot_key == 'symptom' else initialize_followup_session
+    state = initialize(dict(cfg), llm=False)
+    if state is None:
+        try:
+            with admission.admit(PREWARM):
+                speculation.llm = True
+                state = initialize(dict(cfg))
+        except AdmissionRejected:
+            return None
+    return session_inputs(cfg, speculation.bot_key), _updates(cfg, state)
+
+
+async def _ainitialize(speculation: Speculation, cfg: dict, appointment_data: dict, admission):
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PREWARM_WORKERS)
+    async with _semaphore:
+        speculation.bot_key = await asyncio.to_thread(predict_bot, cfg, appointment_data)
+        if speculation.bot_key not in SESSION_INPUTS:
+            await asyncio.to_thread(load_faiss)
+            return None
+        initialize = ainitialize_symptom_session if speculation.bot_key == 'symptom' else ainitialize_followup_session
+        state = await initialize(dict(cfg), llm=False)
+        if state is None:
+            try:
+                async with admission.admit(PREWARM):
+                    speculation.llm = True
+                    state = await initialize(dict(cfg))
+            except AdmissionRejected:
+                return None
+        return session_inputs(cfg, speculation.bot_key), _updates(cfg, state)
+
+
+def start(conv: dict, admission):
+    """Starts initializing a new session's bot in the background (Flask); admission is the app's AdmissionController."""
+    if not PREWARM_SESSIONS:
+        return
+    speculation = Speculation()
+    cfg = dict(conv['configurable'])
+    speculation.result = _pool.submit(_initialize, speculation, cfg, conv.get('appointment_data') or {}, admission)
+    _pending.set(cfg['thread_id'], speculation)
+
+
+async def astart(conv: dict, admission):
+    """Async variant of start: the speculation runs as a task on the event loop, admitted by an AsyncAdmissionController."""
+    if not PREWARM_SESSIONS:
+        return
+    speculation = Speculation()
+    cfg = dict(conv['configurable'])
+    speculation.result = asyncio.create_task(_ainitialize(speculation, cfg, conv.get('appointment_data') or {}, admission))
+    _pending.set(cfg['thread_id'], speculation)
+
+
+def pop(thread_id) -> Optional[Speculation]:
+    """Takes the thread's speculation; called once, on the turn that initializes the bot session."""
+    return _pending.pop(thread_id)
+
+
+def _apply(cfg: dict, bot_key: str, speculation: Speculation, result) -> bool:
+    if speculation.bot_key != bot_key:
+        metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="mispredicted")
+        return False
+    if result is None:
+        metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="shed")
+        return False
+    inputs, updates = result
+    if inputs != session_inputs(cfg, bot_key):
+        metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="stale")
+        return False
+    cfg.update(updates)
+    speculation.used = True
+    metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="used")
+    return True
+
+
+def _wasted(speculation: Optional[Speculation], bot_key: str) -> bool:
+    """True if there is nothing worth waiting for: no speculation, or one for another bot."""
+    if speculation is None:
+        return True
+    if speculation.bot_key is not None and speculation.bot_key != bot_key:
+        metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="mispredicted")
+        return True
+    return False
+
+
+def apply(cfg: dict, bot_key: str, speculation: Optional[Speculation]) -> bool:
+    """
+    Waits for the speculation and, if it initialized bot_key's session from the inputs cfg still
+    has, copies its prompt (and input fallbacks) into cfg. False means the caller initializes.
+    """
+    if _wasted(speculation, bot_key):
+        return False
+    try:
+        result = speculation.result.result(timeout=PREWARM_WAIT_SECONDS)
+    except FutureTimeout:
+        metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="late")
+        return False
+    except Exception as e:
+        metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="failed")
+        log.warning("Session pre-initialization failed", bot=bot_key, error=str(e))
+        return False
+    return _apply(cfg, bot_key, speculation, result)
+
+
+async def aapply(cfg: dict, bot_key: str, speculation: Optional[Speculation]) -> bool:
+    """Async variant of apply."""
+    if _wasted(speculation, bot_key):
+        return False
+    try:
+        # shield: a late speculation keeps running and still fills the classifier cache
+        result = await asyncio.wait_for(asyncio.shield(speculation.result), PREWARM_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="late")
+        return False
+    except Exception as e:
+        metrics.SESSION_PREWARM.inc(bot=bot_key, outcome="failed")
+        log.warning("Session pre-initialization failed", bot=bot_key, error=str(e))
+        return False
+    return _apply(cfg, bot_key, speculation, result)
+
+
+def discard(speculation: Optional[Speculation], bot_key: str):
+    """
+    Counts the speculation as wasted unless the first bot turn used it: its prompt was applied, or
+    it preloaded get_info for a get_info turn. Called after apply()/aapply().
+    """
+    if speculation is None or speculation.used or (speculation.bot_key == bot_key and bot_key not in SESSION_INPUTS):
+        return
+    metrics.SESSION_PREWARM_WASTED.inc(bot=speculation.bot_key or "unknown", llm="yes" if speculation.llm else "no")
@@ -2,58 +2,50 @@
 from typing import Literal
 from datetime import datetime, timezone
 from langchain_core.runnables import RunnableConfig
+from conversation.appointments import AppointmentIndex, get_index
 from conversation.chat_state import ChatState
+from utils.log import get_logger
 
-def decide_bot_route(state: ChatState, config: RunnableConfig) -> Literal["get_info", "symptom", "followup", "same_episode_check"]:
-    """ Determines which bot to use based on business rules. """
-    print(f"--- Routing Logic for Bot Selection ---")
+log = get_logger(__name__)
 
+def decide_bot_route(state: ChatState, config: RunnableConfig, index: AppointmentIndex = None,
+                     current_time: datetime = None) -> Literal["get_info", "symptom", "followup", "same_episode_check"]:
+    """
+    Determines which bot to use based on business rules. index is the session's parsed
+    appointment_data (conversation/appointments.py); it is looked up from the state if not given.
+    current_time defaults to now. conversation/bulk_routing.py applies the same rules to batches.
+    """
     doctor_name = config.get('configurable', {}).get('doctor_name')
-    appointment_data = state.get('appointment_data', {})
-    
-    print(f"[DEBUG] doctor_name: {doctor_name}")
-    print(f"[DEBUG] appointment_data: {appointment_data}")
-
-    current_time = datetime.now(timezone.utc)
-
-    doctor_appointments = [
-        appt for appt in appointment_data.get("appointments", [])
-        if appt.get("doctor_name") == doctor_name
-    ]
-    
-    print(f"[DEBUG] doctor_appointments: {doctor_appointments}")
-
-    future_appointments = [
-        appt for appt in doctor_appointments
-        if appt.get("procedure_keyword") == "pre-consultation" and
-           (datetime.fromisoformat(appt.get("appt_datetime")).replace(tzinfo=timezone.utc) - current_time).total_seconds() < 48 * 3600
-    ]
-    past_appointments = [
-        appt for appt in doctor_appointments
-        if appt.get("procedure_keyword") == "post-consultation"
-    ]
-    
-    print(f"[DEBUG] future_appointments: {future_appointments}")
-    print(f"[DEBUG] past_appointments: {past_appointments}")
+    if index is None:
+        index = get_index(state.get('appointment_data') or {})
+
+    current_time = current_time or datetime.now(timezone.utc)
+
+    doctor_appointments = index.for_doctor(doctor_name)
+    future_count = index.pre_consultations_within(doctor_name, current_time)
+    past_count = doctor_appointments.post_consultation_count
+    future_appointments, past_appointments = future_count > 0, past_count > 0
 
     first_message = state["messages"][0].content if state["messages"] else ""
-    print(f"[DEBUG] first_message: '{first_message}'")
+    # Counts only: the appointments themselves are patient data
+    log.debug("Routing", doctor_name=doctor_name, doctor_appointment_count=len(doctor_appointments.appointments),
+              future_count=future_count, past_count=past_count)
 
     if first_message.startswith(f"Hello {doctor_name}") and not past_appointments:
-        print("Bot Router -> get_info (Rule 1)")
+        log.debug("Bot Router -> get_info (Rule 1)")
         return "get_info"
 
     if future_appointments and not past_appointments:
-        print("Bot Router -> symptom (Rule 2)")
+        log.debug("Bot Router -> symptom (Rule 2)")
         return "symptom"
 
     if future_appointments and past_appointments:
-        print("Bot Router -> same_episode_check (Rule 3)")
+        log.debug("Bot Router -> same_episode_check (Rule 3)")
         return "same_episode_check"
 
     if past_appointments and not future_appointments:
-        print("Bot Router -> followup (Rule 4)")
+        log.debug("Bot Router -> followup (Rule 4)")
         return "followup"
 
-    print("Bot Router -> get_info (Default)")
+    log.debug("Bot Router -> get_info (Default)")
     return "get_info"
\ No newline at end of file
@@ -0,0 +1,360 @@
+# conversation/session_store.py
+# Per-thread session records ('configurable' + 'appointment_data') used by /start_conversation and /message.
+#
+# SESSION_STORE selects the backend:
+#   "memory" (default) - per-process SessionStore; /message must reach the worker that served /start_conversation
+#   "redis"            - RedisSessionStore shared by every worker, so requests can be balanced round-robin
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager, asynccontextmanager
+from redis.exceptions import WatchError
+from config.constants import SESSION_TIMEOUT
+from config.settings import REDIS_URL
+from utils.ttl_cache import TTLCache, MISSING, EXPIRED, FOUND
+from utils.concurrency import KeyedLock, AsyncKeyedLock, LockTimeout
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", REDIS_URL)
+SESSION_KEY_PREFIX = os.getenv("SESSION_KEY_PREFIX", "chatbot:session:")
+# Hard cap on live sessions per process; the least recently used session is evicted beyond it
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "5000"))
+# How often the background reaper drops sessions idle for longer than SESSION_TIMEOUT
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+# How long Redis remembers that a thread existed, so a lookup after expiry still answers 440 rather than 404
+SESSION_EXPIRED_MARKER_SECONDS = int(os.getenv("SESSION_EXPIRED_MARKER_SECONDS", str(24 * 3600)))
+# Replies kept for idempotent retries of /message, keyed by (thread_id, message_id)
+MAX_REPLAYS = int(os.getenv("MAX_REPLAYS", "20000"))
+REPLAY_TTL_SECONDS = float(os.getenv("REPLAY_TTL_SECONDS", str(SESSION_TIMEOUT.total_seconds())))
+# How long a /message waits for an earlier turn on the same thread before giving up with 409
+SESSION_LOCK_WAIT_SECONDS = float(os.getenv("SESSION_LOCK_WAIT_SECONDS", "30"))
+# Redis turn locks expire after this long, so a crashed worker cannot block a thread forever
+SESSION_LOCK_TTL_SECONDS = float(os.getenv("SESSION_LOCK_TTL_SECONDS", "120"))
+LOCK_POLL_SECONDS = 0.02
+
+
+class _Reaper:
+    """Daemon thread calling store.sweep() every interval (threads do not survive fork, so start it per worker)."""
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, store, interval_seconds: float):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(store, interval_seconds), name="session-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, store, interval_seconds: float):
+        while not self._stop.wait(interval_seconds):
+            removed = store.sweep()
+            if removed:
+                log.info("Reaped expired sessions", reaped=removed, live=len(store))
+
+
+class SessionStore:
+    """
+    In-memory session store with a capacity limit, LRU eviction and TTL expiry.
+
+    Sessions expire SESSION_TIMEOUT after their last save(). Expired sessions are dropped either when
+    they are looked up (reported as EXPIRED so the API can answer 440) or by the background reaper,
+    so abandoned threads do not keep their history alive.
+    """
+
+    def __init__(self, capacity: int = MAX_SESSIONS, ttl_seconds: float = SESSION_TIMEOUT.total_seconds()):
+        self._cache = TTLCache(capacity, ttl_seconds)
+        self._replies = TTLCache(MAX_REPLAYS, REPLAY_TTL_SECONDS)
+        self._reaper = _Reaper()
+        self._locks = KeyedLock()
+        self._alocks = AsyncKeyedLock()
+        self.reaped = 0
+
+    def lookup(self, thread_id):
+        """Returns (conv, FOUND), (None, EXPIRED) or (None, MISSING)."""
+        return self._cache.lookup(thread_id)
+
+    def save(self, thread_id, conv, message_id=None, response=None):
+        """Stores the session record and restarts its inactivity timer; with message_id, also keeps the response for replay."""
+        self._cache.set(thread_id, conv)
+        if message_id:
+            self._replies.set((thread_id, message_id), response)
+
+    def lookup_reply(self, thread_id, message_id):
+        """Returns the response already sent for (thread_id, message_id), or None."""
+        return self._replies.get((thread_id, message_id))
+
+    def delete(self, thread_id):
+        self._cache.pop(thread_id)
+
+    def lock(self, thread_id, wait_seconds: float = SESSION_LOCK_WAIT_SECONDS):
+        """Serializes turns on one thread (lookup through save). Raises LockTimeout after wait_seconds."""
+        return self._locks.hold(thread_id, wait_seconds)
+
+    def alock(self, thread_id, wait_seconds: float = SESSION_LOCK_WAIT_SECONDS):
+        return self._alocks.hold(thread_id, wait_seconds)
+
+    async def alookup(self, thread_id):
+        return self.lookup(thread_id)
+
+    async def asave(self, thread_id, conv, message_id=None, response=None):
+        self.save(thread_id, conv, message_id, response)
+
+    async def alookup_reply(self, thread_id, message_id):
+        return self.lookup_reply(thread_id, message_id)
+
+    def sweep(self) -> int:
+        self._replies.sweep()
+        removed = self._cache.sweep()
+        self.reaped += removed
+        return removed
+
+    def start_reaper(self, interval_seconds: float = SESSION_SWEEP_INTERVAL_SECONDS):
+        """Starts the background sweep of expired sessions (no-op if already running)."""
+        self._reaper.start(self, interval_seconds)
+
+    def stop_reaper(self):
+        self._reaper.stop()
+
+    def after_fork(self):
+        """Restarts the reaper in a forked worker (the parent's thread does not exist there)."""
+        self._reaper = _Reaper()
+        self.start_reaper()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        replies = self._replies.stats()
+        return {
+            "backend": "memory",
+            "live_sessions": stats["size"],
+            "max_sessions": stats["capacity"],
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
+            "reaped": self.reaped,
+            "replay": {"size": replies["size"], "hits": replies["hits"], "misses": replies["misses"], "hit_ratio": replies["hit_ratio"]},
+        }
+
+
+class RedisSessionStore:
+    """
+    Session store shared by all workers through Redis.
+
+    Each record is one key holding the msgpack encoding of the session (LangGraph's JsonPlusSerializer,
+    the same one the RedisSaver checkpoints use), zlib-compressed, with a TTL equal to SESSION_TIMEOUT.
+    A sorted set indexes live sessions by expiry so /health can count them without a SCAN.
+    Records are copies: callers must save() after mutating a session.
+    """
+
+    def __init__(self, redis_url: str = SESSION_REDIS_URL, ttl_seconds: float = SESSION_TIMEOUT.total_seconds(), key_prefix: str = SESSION_KEY_PREFIX):
+        import redis
+        import redis.asyncio
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+        self._redis_url = redis_url
+        self._redis = redis.Redis.from_url(redis_url)
+        self._aredis = redis.asyncio.Redis.from_url(redis_url)
+        self._serde = JsonPlusSerializer()
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self._prefix = key_prefix
+        self._index_key = f"{key_prefix}index"
+        self._reaper = _Reaper()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.reaped = 0
+        self.replay_hits = 0
+        self.replay_misses = 0
+
+    def _key(self, thread_id):
+        return f"{self._prefix}{thread_id}"
+
+    def _marker_key(self, thread_id):
+        return f"{self._prefix}seen:{thread_id}"
+
+    def _reply_key(self, thread_id, message_id):
+        return f"{self._prefix}reply:{thread_id}:{message_id}"
+
+    def _encode(self, conv: dict) -> bytes:
+        # 'messages' and configurable['appointment_data'] alias other fields; drop them and re-link on load
+        configurable = {k: v for k, v in conv['configurable'].items() if k not in ('messages', 'appointment_data')}
+        type_, data = self._serde.dumps_typed({**conv, 'configurable': configurable})
+        return zlib.compress(type_.encode() + b"\0" + data, 1)
+
+    def _decode(self, raw: bytes) -> dict:
+        type_, _, data = zlib.decompress(raw).partition(b"\0")
+        conv = self._serde.loads_typed((type_.decode(), data))
+        conv['configurable']['messages'] = conv['configurable'].get('current_thread_history', [])
+        conv['configurable']['appointment_data'] = conv.get('appointment_data') or {}
+        return conv
+
+    def _resolve(self, raw, seen):
+        if raw is not None:
+            self.hits += 1
+            return self._decode(raw), FOUND
+        self.misses += 1
+        if seen:
+            self.expirations += 1
+            return None, EXPIRED
+        return None, MISSING
+
+    def _save_pipeline(self, pipe, thread_id, conv, message_id, response):
+        pipe.set(self._key(thread_id), self._encode(conv), ex=self.ttl_seconds)
+        pipe.set(self._marker_key(thread_id), b"1", ex=SESSION_EXPIRED_MARKER_SECONDS)
+        pipe.zadd(self._index_key, {thread_id: time.time() + self.ttl_seconds})
+        if message_id:
+            # Written with the session so a saved turn always has its replay
+            pipe.set(self._reply_key(thread_id, message_id), json.dumps(response), ex=max(1, int(REPLAY_TTL_SECONDS)))
+
+    def _resolve_reply(self, raw):
+        if raw is None:
+            self.replay_misses += 1
+            return None
+        self.replay_hits += 1
+        return json.loads(raw)
+
+    def lookup(self, thread_id):
+        """Returns (conv, FOUND), (None, EXPIRED) or (None, MISSING)."""
+        raw, seen = self._redis.mget(self._key(thread_id), self._marker_key(thread_id))
+        if raw is None and seen:
+            # Report the expiry once, like the in-memory store does
+            self._redis.delete(self._marker_key(thread_id))
+        return self._resolve(raw, seen)
+
+    def save(self, thread_id, conv, message_id=None, response=None):
+        """Writes the session record and restarts its TTL; with message_id, also keeps the response for replay."""
+        pipe = self._redis.pipeline(transaction=True)
+        self._save_pipeline(pipe, thread_id, conv, message_id, response)
+        pipe.execute()
+
+    def lookup_reply(self, thread_id, message_id):
+        return self._resolve_reply(self._redis.get(self._reply_key(thread_id, message_id)))
+
+    def delete(self, thread_id):
+        self._redis.delete(self._key(thread_id), self._marker_key(thread_id))
+        self._redis.zrem(self._index_key, thread_id)
+
+    def _lock_key(self, thread_id):
+        return f"{self._prefix}lock:{thread_id}"
+
+    # Turn locks are plain SET NX PX keys released with WATCH/MULTI rather than redis-py's Lua-based
+    # Lock, so they also work where EVAL is disabled.
+    def _lock_px(self):
+        return int(SESSION_LOCK_TTL_SECONDS * 1000)
+
+    @contextmanager
+    def lock(self, thread_id, wait_seconds: float = SESSION_LOCK_WAIT_SECONDS):
+        """Redis lock serializing turns on one thread across all workers. Raises LockTimeout after wait_seconds."""
+        key, token = self._lock_key(thread_id), uuid.uuid4().hex
+        deadline = time.monotonic() + wait_seconds
+        while not self._redis.set(key, token, nx=True, px=self._lock_px()):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(thread_id)
+            time.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            with self._redis.pipeline() as pipe:
+                try:
+                    pipe.watch(key)
+                    if pipe.get(key) == token.encode():
+                        pipe.multi()
+                        pipe.delete(key)
+                        pipe.execute()
+                except WatchError:
+                    # The lock outlived SESSION_LOCK_TTL_SECONDS and another turn already holds it
+                    pass
+
+    @asynccontextmanager
+    async def alock(self, thread_id, wait_seconds: float = SESSION_LOCK_WAIT_SECONDS):
+        key, token = self._lock_key(thread_id), uuid.uuid4().hex
+        deadline = time.monotonic() + wait_seconds
+        while not await self._aredis.set(key, token, nx=True, px=self._lock_px()):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(thread_id)
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            async with self._aredis.pipeline() as pipe:
+                try:
+                    await pipe.watch(key)
+                    if await pipe.get(key) == token.encode():
+                        pipe.multi()
+                        pipe.delete(key)
+                        await pipe.execute()
+                except WatchError:
+                    pass
+
+    async def alookup(self, thread_id):
+        """Async lookup for the ASGI app."""
+        raw, seen = await self._aredis.mget(self._key(thread_id), self._marker_key(thread_id))
+        if raw is None and seen:
+            await self._aredis.delete(self._marker_key(thread_id))
+        return self._resolve(raw, seen)
+
+    async def asave(self, thread_id, conv, message_id=None, response=None):
+        pipe = self._aredis.pipeline(transaction=True)
+        self._save_pipeline(pipe, thread_id, conv, message_id, response)
+        await pipe.execute()
+
+    async def alookup_reply(self, thread_id, message_id):
+        return self._resolve_reply(await self._aredis.get(self._reply_key(thread_id, message_id)))
+
+    def sweep(self) -> int:
+        """Trims expired entries from the live-session index (Redis expires the records themselves)."""
+        removed = self._redis.zremrangebyscore(self._index_key, "-inf", time.time())
+        self.reaped += removed
+        return removed
+
+    def start_reaper(self, interval_seconds: float = SESSION_SWEEP_INTERVAL_SECONDS):
+        self._reaper.start(self, interval_seconds)
+
+    def stop_reaper(self):
+        self._reaper.stop()
+
+    def after_fork(self):
+        """Gives a forked worker its own Redis connections and reaper thread instead of the parent's."""
+        import redis.asyncio
+        self._redis.connection_pool.reset()
+        self._aredis = redis.asyncio.Redis.from_url(self._redis_url)
+        self._reaper = _Reaper()
+        self.start_reaper()
+
+    def __len__(self):
+        return self._redis.zcount(self._index_key, time.time(), "+inf")
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "live_sessions": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "reaped": self.reaped,
+            "replay": {"hits": self.replay_hits, "misses": self.replay_misses},
+        }
+
+
+def make_session_store():
+    """Builds the session store selected by SESSION_STORE."""
+    if SESSION_STORE == "redis":
+        return RedisSessionStore()
+    return SessionStore()
+
+
+__all__ = ["SessionStore", "RedisSessionStore", "make_session_store", "LockTimeout", "MISSING", "EXPIRED", "FOUND"]
@@ -0,0 +1,62 @@
+# gunicorn.conf.py
+# Pre-fork serving for the Flask app:
+#
+#   gunicorn -c gunicorn.conf.py application:application
+#
+# With preload_app the master imports the app and builds what workers only read (lance_main.preload():
+# compiled graphs, OpenAI clients, the FAISS index) once; workers forked from it share those pages
+# copy-on-write. Garbage collection is disabled in the master and everything it allocated is frozen
+# right before each fork, so collections in a worker do not touch the inherited objects and copy
+# their pages (see the gc.freeze() docs). After the fork each worker re-creates what cannot be
+# shared with the master (application.after_fork()): the log writer and session reaper threads,
+# the SQLAlchemy pool and the Redis connection pools.
+#
+# Settings: WEB_CONCURRENCY (workers, default: CPU count), GUNICORN_THREADS (threads per worker, 4),
+# GUNICORN_TIMEOUT (120), GUNICORN_PRELOAD (1; 0 loads the app separately in every worker), PORT (8000).
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# Turns spend most of their time waiting on the LLM, so each worker serves several at once
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+if preload_app:
+    # The master warms up synchronously in when_ready; a background warm-up thread (application.py)
+    # could still be holding a lock when a worker is forked
+    os.environ["WARM_UP_ON_START"] = "0"
+    gc.disable()
+
+
+def when_ready(server):
+    if preload_app:
+        import lance_main
+        lance_main.preload()
+        server.log.info("Preloaded graphs, clients and FAISS index in the master")
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        gc.freeze()
+
+
+def on_reload(server):
+    # SIGHUP to the master restarts the workers; preloaded, they fork from the master's prompt snapshot
+    if preload_app:
+        from utils import prompt_db
+        prompt_db.reload_quietly("sighup")
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
+        import application
+        application.after_fork()
+
+
+def post_worker_init(worker):
+    # gunicorn resets a worker's signal handlers; SIGHUP to a worker reloads just its prompt snapshot
+    from utils import prompt_db
+    prompt_db.install_reload_signal()
@@ -1,20 +1,66 @@
 # lance_main.py (Revised)
 
 # Import necessary modules from the new structure
-from config.llm_config import llm
+import threading
+from config.llm_config import llm, LazyChatModel
 from config.constants import CLINIC_INFO, CLINIC_CONFIG, SAMPLE_PRESCRIPTION
 from conversation.graph_builder import build_get_info_graph, build_symptom_graph, build_followup_graph
 from conversation.router import decide_bot_route
 from conversation.chat_state import ChatState
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 # ====================
 # LangGraph Setup (Individual Bots)
 # ====================
 
-# Build individual bot graphs
-get_info_app = build_get_info_graph()
-symptom_app = build_symptom_graph()
-followup_app = build_followup_graph()
+# The bot graphs (and their checkpointer) are compiled on first access, e.g. lance_main.symptom_app,
+# so importing the app does not pay for them; warm_up() builds everything ahead of the first request.
+_GRAPH_BUILDERS = {
+    "get_info_app": build_get_info_graph,
+    "symptom_app": build_symptom_graph,
+    "followup_app": build_followup_graph,
+}
+_build_lock = threading.Lock()
+
+
+def __getattr__(name):
+    builder = _GRAPH_BUILDERS.get(name)
+    if builder is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _build_lock:
+        if name not in globals():
+            globals()[name] = builder()
+            log.info("Compiled bot graph", graph=name)
+    return globals()[name]
+
+
+def warm_up_clients():
+    """Creates the chat model and embeddings clients (and imports the OpenAI SDK) ahead of the first request."""
+    from utils.general_utils import get_embeddings
+    if isinstance(llm, LazyChatModel):
+        llm.load()
+    get_embeddings()
+
+
+def warm_up():
+    """Builds the bot graphs and the OpenAI clients now instead of on the first request."""
+    for name in _GRAPH_BUILDERS:
+        __getattr__(name)
+    warm_up_clients()
+    log.info("Warm-up complete")
+
+
+def preload():
+    """
+    Loads everything workers only read, for a pre-fork server to do once in its master process
+    (gunicorn.conf.py): the compiled graphs, the OpenAI clients and the saved FAISS index.
+    """
+    from utils.general_utils import load_faiss
+    warm_up()
+    load_faiss()
+
 
 # Expose for app.py
 __all__ = [
@@ -25,7 +71,7 @@ __all__ = [
     "ChatState",
     "CLINIC_INFO",
     "CLINIC_CONFIG",
-    "SAMPLE_PRESCRIPTION"
+    "SAMPLE_PRESCRIPTION",
+    "warm_up",
+    "preload",
 ]
-
-print("Individual Bot Graphs compiled.")
\ No newline at end of file
@@ -1,82 +1,201 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, DateTime, ARRAY
-from sqlalchemy.orm import declarative_base, sessionmaker
-from datetime import datetime
-
-load_dotenv()
-
-Base = declarative_base()
-
-class ClassifierPrompt(Base):
-    __tablename__ = 'classifier_prompts'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    specialty_name = Column(String(100), nullable=False)
-    doctor_id = Column(Integer, nullable=False)
-    prompt_text = Column(Text, nullable=False)
-    version = Column(String(20), default='1.0')
-    is_active = Column(Boolean, default=True)
-    is_default = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-class QuestionerPrompt(Base):
-    __tablename__ = 'questioner_prompts'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    classifier_prompt_ids = Column(ARRAY(Integer), nullable=False)
-    prompt_key = Column(String(100), nullable=False)
-    prompt_text = Column(Text, nullable=False)
-    summary_prompt = Column(Text)
-    version = Column(String(20), default='1.0')
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-class followUpClassifierPrompt(Base):
-    __tablename__ = 'followUp_classifier_prompts'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    specialty_name = Column(String(100), nullable=False)
-    doctor_id = Column(Integer, nullable=False)
-    prompt_text = Column(Text, nullable=False)
-    version = Column(String(20), default='1.0')
-    is_active = Column(Boolean, default=True)
-    is_default = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-class followUpQuestionerPrompt(Base):
-    __tablename__ = 'followUp_questioner_prompts'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    classifier_prompt_ids = Column(ARRAY(Integer), nullable=False)
-    prompt_key = Column(String(100), nullable=False)
-    prompt_text = Column(Text, nullable=False)
-    summary_prompt = Column(Text)
-    version = Column(String(20), default='1.0')
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-def get_database_url():
-    db_host = os.getenv('DB_HOST', 'localhost')
-    db_port = os.getenv('DB_PORT', '5432')
-    db_user = os.getenv('DB_USER', 'postgres')
-    db_password = os.getenv('DB_PASSWORD', 'password')
-    db_name = os.getenv('DB_NAME', 'medical_bot_db')
-    return f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
-
-engine = create_engine(get_database_url(), echo=False)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def create_tables():
+import os
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, text, Column, Index, Integer, String, Text, Boolean, DateTime, ARRAY, JSON
+from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from datetime import datetime
+
+load_dotenv()
+
+Base = declarative_base()
+
+# Postgres integer arrays; stored as JSON on SQLite, which stands in for Postgres in offline benchmarks
+IntegerArray = ARRAY(Integer).with_variant(JSON(), "sqlite")
+
+def prompt_indexes(table: str, *key_columns: str) -> tuple:
+    """
+    Indexes of a prompt table (created by the migrations/ revisions on existing databases): one row per
+    key and version, and a partial index on the active rows by key and id, so serving the newest active
+    version (utils/prompt_db.py) is one index probe with no sort. Its WHERE clause is the one
+    `is_active.is_(True)` renders, which the planner needs to match it.
+    """
+    name = table.lower()
+    return (
+        Index(f'uq_{name}_version', *key_columns, 'version', unique=True),
+        Index(f'ix_{name}_active', *key_columns, 'id',
+              postgresql_where=text('is_active IS true'), sqlite_where=text('is_active IS 1')),
+    )
+
+class ClassifierPrompt(Base):
+    __tablename__ = 'classifier_prompts'
+    __table_args__ = prompt_indexes(__tablename__, 'specialty_name', 'doctor_id')
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    specialty_name = Column(String(100), nullable=False)
+    doctor_id = Column(Integer, nullable=False)
+    prompt_text = Column(Text, nullable=False)
+    version = Column(String(20), default='1.0')
+    is_active = Column(Boolean, default=True)
+    is_default = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class QuestionerPrompt(Base):
+    __tablename__ = 'questioner_prompts'
+    __table_args__ = prompt_indexes(__tablename__, 'prompt_key')
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    classifier_prompt_ids = Column(IntegerArray, nullable=False)
+    prompt_key = Column(String(100), nullable=False)
+    prompt_text = Column(Text, nullable=False)
+    summary_prompt = Column(Text)
+    version = Column(String(20), default='1.0')
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class followUpClassifierPrompt(Base):
+    __tablename__ = 'followUp_classifier_prompts'
+    __table_args__ = prompt_indexes(__tablename__, 'specialty_name', 'doctor_id')
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    specialty_name = Column(String(100), nullable=False)
+    doctor_id = Column(Integer, nullable=False)
+    prompt_text = Column(Text, nullable=False)
+    version = Column(String(20), default='1.0')
+    is_active = Column(Boolean, default=True)
+    is_default = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class followUpQuestionerPrompt(Base):
+    __tablename__ = 'followUp_questioner_prompts'
+    __table_args__ = prompt_indexes(__tablename__, 'prompt_key')
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    classifier_prompt_ids = Column(IntegerArray, nullable=False)
+    prompt_key = Column(String(100), nullable=False)
+    prompt_text = Column(Text, nullable=False)
+    summary_prompt = Column(Text)
+    version = Column(String(20), default='1.0')
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def get_database_url():
+    # DATABASE_URL (any SQLAlchemy URL, e.g. sqlite:///bench.db) overrides the DB_* settings
+    if os.getenv('DATABASE_URL'):
+        return os.getenv('DATABASE_URL')
+    db_host = os.getenv('DB_HOST', 'localhost')
+    db_port = os.getenv('DB_PORT', '5432')
+    db_user = os.getenv('DB_USER', 'postgres')
+    db_password = os.getenv('DB_PASSWORD', 'password')
+    db_name = os.getenv('DB_NAME', 'medical_bot_db')
+    return f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+
+# Connection pool, per process (dispose_engine_after_fork gives every gunicorn worker its own).
+# Pre-ping replaces connections the server or a proxy dropped while idle; DB_POOL_TIMEOUT bounds the
+# wait for a free connection, DB_CONNECT_TIMEOUT a new connection and DB_STATEMENT_TIMEOUT_MS
+# (Postgres) every statement, so a slow database fails requests quickly instead of piling them up.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000'))
+
+def engine_options(url: str, for_async: bool = False) -> dict:
+    """create_engine / create_async_engine keyword arguments for url."""
+    if url.startswith('sqlite') and (':memory:' in url or url.rstrip('/').endswith('sqlite:')):
+        # In-memory SQLite lives in a single connection; there is nothing to pool
+        return {}
+    options = {
+        'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW, 'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE, 'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+    if url.startswith('postgresql'):
+        if for_async:
+            # asyncpg
+            options['connect_args'] = {'timeout': DB_CONNECT_TIMEOUT,
+                                       'server_settings': {'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options['connect_args'] = {'connect_timeout': DB_CONNECT_TIMEOUT,
+                                       'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'}
+    elif url.startswith('sqlite'):
+        # How long SQLite waits on a locked database file
+        options['connect_args'] = {'timeout': DB_CONNECT_TIMEOUT}
+        if for_async:
+            # aiosqlite defaults to NullPool for files on SQLAlchemy < 2.0.38, which takes no sizing
+            options['poolclass'] = AsyncAdaptedQueuePool
+    return options
+
+def async_database_url(url: str) -> str:
+    """The async driver's URL for the same database: asyncpg for Postgres, aiosqlite for SQLite."""
+    scheme, rest = url.split('://', 1)
+    if scheme.startswith('postgresql'):
+        return f'postgresql+asyncpg://{rest}'
+    if scheme.startswith('sqlite'):
+        return f'sqlite+aiosqlite://{rest}'
+    return url
+
+engine = create_engine(get_database_url(), echo=False, **engine_options(get_database_url()))
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine for the ASGI serving path, created on first use: its connections belong to the event
+# loop that opened them, and the driver (asyncpg, or aiosqlite for SQLite) is only needed then
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        url = async_database_url(get_database_url())
+        _async_engine = create_async_engine(url, echo=False, **engine_options(url, for_async=True))
+    return _async_engine
+
+def AsyncSessionLocal():
+    """A new AsyncSession on the async engine (use as `async with AsyncSessionLocal() as session`)."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_sessionmaker = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker()
+
+async def dispose_async_engine():
+    """Close the async engine's connections (aiosqlite's connection threads would keep the process alive)."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _async_sessionmaker = None
+
+# Postgres channel NOTIFY'd by every transaction that writes prompts; the bot's prompt cache
+# (utils/prompt_db.py, PROMPT_CACHE_LISTEN=1) reloads on it
+PROMPT_CHANNEL = os.getenv('PROMPT_CHANNEL', 'prompts_changed')
+PROMPT_MODELS = (ClassifierPrompt, QuestionerPrompt, followUpClassifierPrompt, followUpQuestionerPrompt)
+
+@event.listens_for(Session, "after_flush")
+def _notify_prompt_changes(session, flush_context):
+    # NOTIFY is transactional: listeners hear it only if the transaction commits
+    if session.bind is None or session.bind.dialect.name != "postgresql":
+        return
+    if any(isinstance(obj, PROMPT_MODELS) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.connection().exec_driver_sql(f"NOTIFY {PROMPT_CHANNEL}")
+
+def dispose_engine_after_fork():
+    # A forked worker must not reuse the parent's pooled connections; drop the pool without closing
+    # them, so the parent's sockets stay usable, and let the worker open its own on first use.
+    engine.dispose(close=False)
+    global _async_engine, _async_sessionmaker
+    _async_engine = _async_sessionmaker = None
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def create_tables():
     Base.metadata.create_all(bind=engine)
\ No newline at end of file
@@ -1,13 +1,79 @@
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Form
+import json
+from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Form, Query
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional, List
-from config.db import get_db, ClassifierPrompt, QuestionerPrompt, followUpClassifierPrompt, followUpQuestionerPrompt, create_tables
+from config.db import get_db, SessionLocal, ClassifierPrompt, QuestionerPrompt, followUpClassifierPrompt, followUpQuestionerPrompt, create_tables
 
 app = FastAPI(title="Prompt Management API")
+# Prompt texts are plain prose and compress well
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# /all pages; /export streams every row in batches of EXPORT_BATCH_ROWS
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_ROWS = 50
 
 create_tables()
 
+def commit_unique(db: Session, detail: str):
+    # The tables' unique (key, version) indexes decide duplicates, so concurrent inserts cannot both pass
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=detail)
+
+def selected_columns(model, fields: Optional[str], with_text: bool) -> list:
+    # fields is a comma-separated list of column names; without it every column is returned,
+    # prompt_text only when with_text. The id is always included, it is the page cursor.
+    names = [column.name for column in model.__table__.columns]
+    if fields is None:
+        chosen = [name for name in names if with_text or name != 'prompt_text']
+    else:
+        chosen = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = sorted(set(chosen) - set(names))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        chosen = ['id'] + [name for name in chosen if name != 'id']
+    return [model.__table__.c[name] for name in chosen]
+
+def list_page(db: Session, model, after_id: int, limit: int, fields: Optional[str]) -> dict:
+    # Keyset pagination on the primary key: every page is an index range scan, however deep
+    columns = selected_columns(model, fields, with_text=False)
+    rows = db.execute(select(*columns).where(model.id > after_id).order_by(model.id).limit(limit + 1)).mappings().all()
+    items = [dict(row) for row in rows[:limit]]
+    return {"items": items, "next_after_id": items[-1]["id"] if len(rows) > limit else None}
+
+def _json_default(value):
+    return value.isoformat()
+
+def export_rows(model, fields: Optional[str]) -> StreamingResponse:
+    # A JSON array written row by row, so neither side holds the whole table; each batch is its own
+    # short read, not one transaction open for the length of the download
+    columns = selected_columns(model, fields, with_text=True)
+
+    def generate():
+        yield '['
+        after_id, separator = 0, ''
+        while True:
+            with SessionLocal() as session:
+                rows = session.execute(select(*columns).where(model.id > after_id).order_by(model.id)
+                                       .limit(EXPORT_BATCH_ROWS)).mappings().all()
+            if not rows:
+                break
+            for row in rows:
+                yield separator + json.dumps(dict(row), default=_json_default, ensure_ascii=False, separators=(',', ':'))
+                separator = ','
+            after_id = rows[-1]['id']
+        yield ']'
+
+    return StreamingResponse(generate(), media_type="application/json")
+
 @app.get("/")
 def root():
     return {"message": "Prompt Management API is running"}
@@ -15,27 +81,31 @@ def root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "endpoints": [
-        "GET /classifier-prompts/all",
+        "GET /classifier-prompts/all?after_id=&limit=&fields=",
+        "GET /classifier-prompts/export?fields=",
         "GET /classifier-prompts/doctor/{doctor_id}",
         "GET /classifier-prompts/{specialty_name}/{doctor_id}",
         "POST /classifier-prompts",
         "POST /classifier-prompts/upload",
         "PUT /classifier-prompts/{id}",
         "PATCH /classifier-prompts/upload/{id}",
-        "GET /questioner-prompts/all",
+        "GET /questioner-prompts/all?after_id=&limit=&fields=",
+        "GET /questioner-prompts/export?fields=",
         "GET /questioner-prompts/classifier/{classifier_id}",
         "POST /questioner-prompts",
         "POST /questioner-prompts/upload",
         "PUT /questioner-prompts/{id}",
         "PUT /questioner-prompts/upload/{id}",
-        "GET /followup-classifier-prompts/all",
+        "GET /followup-classifier-prompts/all?after_id=&limit=&fields=",
+        "GET /followup-classifier-prompts/export?fields=",
         "GET /followup-classifier-prompts/doctor/{doctor_id}",
         "GET /followup-classifier-prompts/{specialty_name}/{doctor_id}",
         "POST /followup-classifier-prompts",
         "POST /followup-classifier-prompts/upload",
         "PUT /followup-classifier-prompts/{id}",
         "PATCH /followup-classifier-prompts/upload/{id}",
-        "GET /followup-questioner-prompts/all",
+        "GET /followup-questioner-prompts/all?after_id=&limit=&fields=",
+        "GET /followup-questioner-prompts/export?fields=",
         "GET /followup-questioner-prompts/classifier/{classifier_id}",
         "POST /followup-questioner-prompts",
         "POST /followup-questioner-prompts/upload",
@@ -80,8 +150,17 @@ class FollowUpQuestionerPromptCreate(BaseModel):
     is_active: bool = True
 
 @app.get("/classifier-prompts/all")
-def get_all_classifier_prompts(db: Session = Depends(get_db)):
-    return db.query(ClassifierPrompt).all()
+def get_all_classifier_prompts(
+    after_id: int = 0,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return list_page(db, ClassifierPrompt, after_id, limit, fields)
+
+@app.get("/classifier-prompts/export")
+def export_classifier_prompts(fields: Optional[str] = None):
+    return export_rows(ClassifierPrompt, fields)
 
 @app.get("/classifier-prompts/doctor/{doctor_id}")
 def get_classifier_prompts_by_doctor(doctor_id: int, db: Session = Depends(get_db)):
@@ -108,17 +187,9 @@ def get_classifier_prompt(specialty_name: str, doctor_id: int, db: Session = Dep
 
 @app.post("/classifier-prompts")
 def create_classifier_prompt(prompt: ClassifierPromptCreate, db: Session = Depends(get_db)):
-    existing = db.query(ClassifierPrompt).filter(
-        ClassifierPrompt.specialty_name == prompt.specialty_name,
-        ClassifierPrompt.doctor_id == prompt.doctor_id
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Classifier prompt already exists for this specialty and doctor")
-    
     db_prompt = ClassifierPrompt(**prompt.model_dump())
     db.add(db_prompt)
-    db.commit()
+    commit_unique(db, "Classifier prompt already exists for this specialty, doctor and version")
     db.refresh(db_prompt)
     return db_prompt
 
@@ -135,14 +206,6 @@ async def upload_classifier_prompt(
     if not file.filename or not file.filename.endswith('.txt'):
         raise HTTPException(status_code=400, detail="Only .txt files are allowed")
     
-    existing = db.query(ClassifierPrompt).filter(
-        ClassifierPrompt.specialty_name == specialty_name,
-        ClassifierPrompt.doctor_id == doctor_id
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Classifier prompt already exists for this specialty and doctor")
-    
     content = await file.read()
     prompt_text = content.decode('utf-8')
     
@@ -156,7 +219,7 @@ async def upload_classifier_prompt(
     )
     
     db.add(db_prompt)
-    db.commit()
+    commit_unique(db, "Classifier prompt already exists for this specialty, doctor and version")
     db.refresh(db_prompt)
     
     return {
@@ -178,7 +241,7 @@ def update_classifier_prompt(prompt_id: int, prompt: ClassifierPromptCreate, db:
     for key, value in prompt.model_dump().items():
         setattr(db_prompt, key, value)
     
-    db.commit()
+    commit_unique(db, "Classifier prompt already exists for this specialty, doctor and version")
     db.refresh(db_prompt)
     return db_prompt
 
@@ -211,7 +274,7 @@ async def patch_classifier_prompt_upload(
     db_prompt.is_active = is_active
     db_prompt.is_default = is_default
     
-    db.commit()
+    commit_unique(db, "Classifier prompt already exists for this specialty, doctor and version")
     db.refresh(db_prompt)
     
     return {
@@ -224,8 +287,17 @@ async def patch_classifier_prompt_upload(
     }
 
 @app.get("/questioner-prompts/all")
-def get_all_questioner_prompts(db: Session = Depends(get_db)):
-    return db.query(QuestionerPrompt).all()
+def get_all_questioner_prompts(
+    after_id: int = 0,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return list_page(db, QuestionerPrompt, after_id, limit, fields)
+
+@app.get("/questioner-prompts/export")
+def export_questioner_prompts(fields: Optional[str] = None):
+    return export_rows(QuestionerPrompt, fields)
 
 @app.get("/questioner-prompts/key/{prompt_key}")
 def get_questioner_prompt_by_key(prompt_key: str, db: Session = Depends(get_db)):
@@ -259,16 +331,9 @@ def create_questioner_prompt(prompt: QuestionerPromptCreate, db: Session = Depen
         if not classifier_exists:
             raise HTTPException(status_code=400, detail=f"Classifier prompt ID {classifier_id} does not exist")
     
-    existing = db.query(QuestionerPrompt).filter(
-        QuestionerPrompt.prompt_key == prompt.prompt_key
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Questioner prompt already exists for this key")
-    
     db_prompt = QuestionerPrompt(**prompt.model_dump())
     db.add(db_prompt)
-    db.commit()
+    commit_unique(db, "Questioner prompt already exists for this key and version")
     db.refresh(db_prompt)
     return db_prompt
 
@@ -298,13 +363,6 @@ async def upload_questioner_prompt(
         if not classifier_exists:
             raise HTTPException(status_code=400, detail=f"Classifier prompt ID {classifier_id} does not exist")
     
-    existing = db.query(QuestionerPrompt).filter(
-        QuestionerPrompt.prompt_key == prompt_key
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Questioner prompt already exists for this key")
-    
     content = await file.read()
     prompt_text = content.decode('utf-8')
     
@@ -318,7 +376,7 @@ async def upload_questioner_prompt(
     )
     
     db.add(db_prompt)
-    db.commit()
+    commit_unique(db, "Questioner prompt already exists for this key and version")
     db.refresh(db_prompt)
     
     return {
@@ -339,7 +397,7 @@ def update_questioner_prompt(prompt_id: int, prompt: QuestionerPromptCreate, db:
     for key, value in prompt.model_dump().items():
         setattr(db_prompt, key, value)
     
-    db.commit()
+    commit_unique(db, "Questioner prompt already exists for this key and version")
     db.refresh(db_prompt)
     return db_prompt
 
@@ -377,7 +435,7 @@ async def update_questioner_prompt_upload(
     db_prompt.version = version
     db_prompt.is_active = is_active
     
-    db.commit()
+    commit_unique(db, "Questioner prompt already exists for this key and version")
     db.refresh(db_prompt)
     
     return {
@@ -389,8 +447,17 @@ async def update_questioner_prompt_upload(
     }
 
 @app.get("/followup-classifier-prompts/all")
-def get_all_followup_classifier_prompts(db: Session = Depends(get_db)):
-    return db.query(followUpClassifierPrompt).all()
+def get_all_followup_classifier_prompts(
+    after_id: int = 0,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return list_page(db, followUpClassifierPrompt, after_id, limit, fields)
+
+@app.get("/followup-classifier-prompts/export")
+def export_followup_classifier_prompts(fields: Optional[str] = None):
+    return export_rows(followUpClassifierPrompt, fields)
 
 @app.get("/followup-classifier-prompts/doctor/{doctor_id}")
 def get_followup_classifier_prompts_by_doctor(doctor_id: int, db: Session = Depends(get_db)):
@@ -417,17 +484,9 @@ def get_followup_classifier_prompt(specialty_name: str, doctor_id: int, db: Sess
 
 @app.post("/followup-classifier-prompts")
 def create_followup_classifier_prompt(prompt: FollowUpClassifierPromptCreate, db: Session = Depends(get_db)):
-    existing = db.query(followUpClassifierPrompt).filter(
-        followUpClassifierPrompt.specialty_name == prompt.specialty_name,
-        followUpClassifierPrompt.doctor_id == prompt.doctor_id
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Follow-up classifier prompt already exists for this specialty and doctor")
-    
     db_prompt = followUpClassifierPrompt(**prompt.model_dump())
     db.add(db_prompt)
-    db.commit()
+    commit_unique(db, "Follow-up classifier prompt already exists for this specialty, doctor and version")
     db.refresh(db_prompt)
     return db_prompt
 
@@ -444,14 +503,6 @@ async def upload_followup_classifier_prompt(
     if not file.filename or not file.filename.endswith('.txt'):
         raise HTTPException(status_code=400, detail="Only .txt files are allowed")
     
-    existing = db.query(followUpClassifierPrompt).filter(
-        followUpClassifierPrompt.specialty_name == specialty_name,
-        followUpClassifierPrompt.doctor_id == doctor_id
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Follow-up classifier prompt already exists for this specialty and doctor")
-    
     content = await file.read()
     prompt_text = content.decode('utf-8')
     
@@ -465,7 +516,7 @@ async def upload_followup_classifier_prompt(
     )
     
     db.add(db_prompt)
-    db.commit()
+    commit_unique(db, "Follow-up classifier prompt already exists for this specialty, doctor and version")
     db.refresh(db_prompt)
     
     return {
@@ -487,7 +538,7 @@ def update_followup_classifier_prompt(prompt_id: int, prompt: FollowUpClassifier
     for key, value in prompt.model_dump().items():
         setattr(db_prompt, key, value)
     
-    db.commit()
+    commit_unique(db, "Follow-up classifier prompt already exists for this specialty, doctor and version")
     db.refresh(db_prompt)
     return db_prompt
 
@@ -520,7 +571,7 @@ async def patch_followup_classifier_prompt_upload(
     db_prompt.is_active = is_active
     db_prompt.is_default = is_default
     
-    db.commit()
+    commit_unique(db, "Follow-up classifier prompt already exists for this specialty, doctor and version")
     db.refresh(db_prompt)
     
     return {
@@ -533,8 +584,17 @@ async def patch_followup_classifier_prompt_upload(
     }
 
 @app.get("/followup-questioner-prompts/all")
-def get_all_followup_questioner_prompts(db: Session = Depends(get_db)):
-    return db.query(followUpQuestionerPrompt).all()
+def get_all_followup_questioner_prompts(
+    after_id: int = 0,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return list_page(db, followUpQuestionerPrompt, after_id, limit, fields)
+
+@app.get("/followup-questioner-prompts/export")
+def export_followup_questioner_prompts(fields: Optional[str] = None):
+    return export_rows(followUpQuestionerPrompt, fields)
 
 @app.get("/followup-questioner-prompts/key/{prompt_key}")
 def get_followup_questioner_prompt_by_key(prompt_key: str, db: Session = Depends(get_db)):
@@ -568,16 +628,9 @@ def create_followup_questioner_prompt(prompt: FollowUpQuestionerPromptCreate, db
         if not classifier_exists:
             raise HTTPException(status_code=400, detail=f"Follow-up classifier prompt ID {classifier_id} does not exist")
     
-    existing = db.query(followUpQuestionerPrompt).filter(
-        followUpQuestionerPrompt.prompt_key == prompt.prompt_key
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Follow-up questioner prompt already exists for this key")
-    
     db_prompt = followUpQuestionerPrompt(**prompt.model_dump())
     db.add(db_prompt)
-    db.commit()
+    commit_unique(db, "Follow-up questioner prompt already exists for this key and version")
     db.refresh(db_prompt)
     return db_prompt
 
@@ -607,13 +660,6 @@ async def upload_followup_questioner_prompt(
         if not classifier_exists:
             raise HTTPException(status_code=400, detail=f"Follow-up classifier prompt ID {classifier_id} does not exist")
     
-    existing = db.query(followUpQuestionerPrompt).filter(
-        followUpQuestionerPrompt.prompt_key == prompt_key
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Follow-up questioner prompt already exists for this key")
-    
     content = await file.read()
     prompt_text = content.decode('utf-8')
     
@@ -627,7 +673,7 @@ async def upload_followup_questioner_prompt(
     )
     
     db.add(db_prompt)
-    db.commit()
+    commit_unique(db, "Follow-up questioner prompt already exists for this key and version")
     db.refresh(db_prompt)
     
     return {
@@ -648,7 +694,7 @@ def update_followup_questioner_prompt(prompt_id: int, prompt: FollowUpQuestioner
     for key, value in prompt.model_dump().items():
         setattr(db_prompt, key, value)
     
-    db.commit()
+    commit_unique(db, "Follow-up questioner prompt already exists for this key and version")
     db.refresh(db_prompt)
     return db_prompt
 
@@ -686,7 +732,7 @@ async def update_followup_questioner_prompt_upload(
     db_prompt.version = version
     db_prompt.is_active = is_active
     
-    db.commit()
+    commit_unique(db, "Follow-up questioner prompt already exists for this key and version")
     db.refresh(db_prompt)
     
     return {
@@ -0,0 +1,38 @@
+# migrations/env.py
+# Runs the revisions against the app's database (get_database_url()), online or with --sql.
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from middleware.config.db import Base, get_database_url
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(url=get_database_url(), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(get_database_url())
+    try:
+        with connectable.connect() as connection:
+            # Batch mode lets later revisions alter columns on SQLite, which stands in for Postgres offline
+            context.configure(connection=connection, target_metadata=target_metadata,
+                              render_as_batch=connection.dialect.name == "sqlite")
+            with context.begin_transaction():
+                context.run_migrations()
+    finally:
+        connectable.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
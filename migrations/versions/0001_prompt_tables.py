@@ -0,0 +1,56 @@
+# migrations/versions/0001_prompt_tables.py
+"""The four prompt tables, as create_tables() made them before the migrations existed
+
+Revision ID: 0001_prompt_tables
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001_prompt_tables'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+IntegerArray = sa.ARRAY(sa.Integer).with_variant(sa.JSON(), "sqlite")
+
+
+def _common():
+    return [
+        sa.Column('prompt_text', sa.Text, nullable=False),
+        sa.Column('version', sa.String(20)),
+        sa.Column('is_active', sa.Boolean),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+    ]
+
+
+def _tables():
+    return {
+        'classifier_prompts': [sa.Column('specialty_name', sa.String(100), nullable=False),
+                               sa.Column('doctor_id', sa.Integer, nullable=False), *_common(),
+                               sa.Column('is_default', sa.Boolean)],
+        'questioner_prompts': [sa.Column('classifier_prompt_ids', IntegerArray, nullable=False),
+                               sa.Column('prompt_key', sa.String(100), nullable=False),
+                               sa.Column('summary_prompt', sa.Text), *_common()],
+        'followUp_classifier_prompts': [sa.Column('specialty_name', sa.String(100), nullable=False),
+                                        sa.Column('doctor_id', sa.Integer, nullable=False), *_common(),
+                                        sa.Column('is_default', sa.Boolean)],
+        'followUp_questioner_prompts': [sa.Column('classifier_prompt_ids', IntegerArray, nullable=False),
+                                        sa.Column('prompt_key', sa.String(100), nullable=False),
+                                        sa.Column('summary_prompt', sa.Text), *_common()],
+    }
+
+
+def upgrade():
+    # Databases set up by create_tables() already have them; this revision then only records the baseline
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, columns in _tables().items():
+        if name not in existing:
+            op.create_table(name, sa.Column('id', sa.Integer, primary_key=True, autoincrement=True), *columns)
+
+
+def downgrade():
+    for name in reversed(list(_tables())):
+        op.drop_table(name)
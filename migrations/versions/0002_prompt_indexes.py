@@ -0,0 +1,43 @@
+# migrations/versions/0002_prompt_indexes.py
+"""Unique (key, version) and partial active-row indexes on the prompt tables
+
+Revision ID: 0002_prompt_indexes
+Revises: 0001_prompt_tables
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002_prompt_indexes'
+down_revision = '0001_prompt_tables'
+branch_labels = None
+depends_on = None
+
+# table -> key columns, as in middleware.config.db.prompt_indexes
+TABLES = {
+    'classifier_prompts': ('specialty_name', 'doctor_id'),
+    'questioner_prompts': ('prompt_key',),
+    'followUp_classifier_prompts': ('specialty_name', 'doctor_id'),
+    'followUp_questioner_prompts': ('prompt_key',),
+}
+
+
+def upgrade():
+    for name, keys in TABLES.items():
+        table = sa.table(name, sa.column('id', sa.Integer), sa.column('version', sa.String), *map(sa.column, keys))
+        # The API only checked the key, so rows may repeat a key and version; all but the newest get
+        # their id appended to the version ("1.0-17") so the unique index can be built
+        newest = sa.select(sa.func.max(table.c.id)).group_by(*(table.c[k] for k in keys), table.c.version)
+        op.execute(table.update()
+                   .where(table.c.version.is_not(None), table.c.id.not_in(newest))
+                   .values(version=table.c.version + '-' + sa.cast(table.c.id, sa.String)))
+        op.create_index(f'uq_{name.lower()}_version', name, [*keys, 'version'], unique=True, if_not_exists=True)
+        op.create_index(f'ix_{name.lower()}_active', name, [*keys, 'id'], if_not_exists=True,
+                        postgresql_where=sa.text('is_active IS true'), sqlite_where=sa.text('is_active IS 1'))
+
+
+def downgrade():
+    # Versions renamed by upgrade() keep their new names
+    for name in TABLES:
+        op.drop_index(f'ix_{name.lower()}_active', table_name=name, if_exists=True)
+        op.drop_index(f'uq_{name.lower()}_version', table_name=name, if_exists=True)
@@ -0,0 +1,254 @@
+# models/cassette.py
+# Record/replay of LLM traffic for offline load tests (LLM_CASSETTE_MODE, see config/settings.py).
+#
+# record: RecordingChatModel wraps the configured chat model and appends one line per call to the
+#   cassette: the prompt's hash, the bot, the completion, its token counts, the observed latency
+#   and (for streamed calls) the time to the first token. The apps also record every
+#   /start_conversation and /message request with its status and latency (record_request()), so
+#   benchmarks/replay_load.py can replay the same conversations with the same pacing.
+# replay: ReplayChatModel serves the recorded completions back with the recorded timing. A prompt
+#   seen while recording gets its own completion; any other prompt gets one picked
+#   deterministically from the same bot's calls, so lengths and latencies follow the recorded
+#   distribution.
+#
+# A cassette is gzip-compressed JSON lines. Prompts are stored as a hash only, unless
+# LLM_CASSETTE_PROMPTS=1. Requests and completions are real conversations, so treat cassettes as
+# patient data.
+import asyncio
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from config.settings import LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_PROMPTS, LLM_REPLAY_SPEED
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+def prompt_key(messages: List[BaseMessage]) -> str:
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(message.type.encode())
+        digest.update(b"\0")
+        digest.update(str(message.content).encode("utf-8", "replace"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CassetteWriter:
+    """Appends records to a gzip JSON-lines file, flushed after every record. Safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            if self._file is None:
+                # Opened on first write, so a pre-fork worker gets its own file ({pid} in the path)
+                self._file = gzip.open(self.path.format(pid=os.getpid()), "ab")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_cassette(pattern: str) -> List[dict]:
+    """All records of the cassette files matching pattern ({pid} matches any worker's file)."""
+    records = []
+    for path in sorted(glob.glob(pattern.replace("{pid}", "*"))):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.endswith("\n"):
+                        records.append(json.loads(line))
+            except EOFError:
+                # A recording process that was killed without closing the file: every record up to
+                # the last flush is complete
+                pass
+    return records
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def writer() -> CassetteWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = CassetteWriter(LLM_CASSETTE_PATH)
+                atexit.register(_writer.close)
+    return _writer
+
+
+def record_request(path: str, body, status: int, seconds: float):
+    """Records one HTTP request of the conversation being served (record mode only)."""
+    writer().write({"type": "request", "ts": round(time.time(), 3), "path": path, "body": body,
+                    "status": status, "latency": round(seconds, 4)})
+
+
+def _usage(response) -> tuple:
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+
+class RecordingChatModel(BaseChatModel):
+    """Forwards every call to `inner` (without its callbacks) and writes it to the cassette."""
+    inner: BaseChatModel
+
+    @property
+    def _llm_type(self) -> str:
+        return f"recording-{self.inner._llm_type}"
+
+    def _record(self, messages, text: str, usage: tuple, latency: float, ttft: Optional[float]):
+        record = {"type": "llm", "ts": round(time.time(), 3), "key": prompt_key(messages), "bot": metrics.current_bot(),
+                  "completion": text, "prompt_tokens": usage[0], "completion_tokens": usage[1],
+                  "latency": round(latency, 4), "ttft": round(ttft, 4) if ttft is not None else None}
+        if LLM_CASSETTE_PROMPTS:
+            record["prompt"] = [{"type": m.type, "content": str(m.content)} for m in messages]
+        writer().write(record)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        started = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        message = result.generations[0].message
+        self._record(messages, str(message.content), _usage(message), time.perf_counter() - started, None)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        started = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+        message = result.generations[0].message
+        self._record(messages, str(message.content), _usage(message), time.perf_counter() - started, None)
+        return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        started, ttft, parts, usage = time.perf_counter(), None, [], (0, 0)
+        for chunk in self.inner._stream(messages, stop=stop, **kwargs):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(str(chunk.message.content))
+            usage = _usage(chunk.message) if getattr(chunk.message, "usage_metadata", None) else usage
+            if run_manager:
+                run_manager.on_llm_new_token(str(chunk.message.content), chunk=chunk)
+            yield chunk
+        self._record(messages, "".join(parts), usage, time.perf_counter() - started, ttft)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        started, ttft, parts, usage = time.perf_counter(), None, [], (0, 0)
+        async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(str(chunk.message.content))
+            usage = _usage(chunk.message) if getattr(chunk.message, "usage_metadata", None) else usage
+            if run_manager:
+                await run_manager.on_llm_new_token(str(chunk.message.content), chunk=chunk)
+            yield chunk
+        self._record(messages, "".join(parts), usage, time.perf_counter() - started, ttft)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Serves the completions of a recorded cassette with their recorded latency, scaled by `speed` (0 = no delay)."""
+    cassette_path: str
+    speed: float = 1.0
+    by_key: dict = {}
+    by_bot: dict = {}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        calls = [r for r in read_cassette(self.cassette_path) if r.get("type") == "llm"]
+        if not calls:
+            raise ValueError(f"No recorded LLM calls in {self.cassette_path}")
+        self.by_key = {r["key"]: r for r in calls}
+        self.by_bot = {}
+        for r in calls:
+            self.by_bot.setdefault(r["bot"], []).append(r)
+        self.by_bot.setdefault("none", calls)
+        log.info("Loaded LLM cassette", path=self.cassette_path, call_count=len(calls), prompt_count=len(self.by_key))
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _pick(self, messages: List[BaseMessage]) -> dict:
+        key = prompt_key(messages)
+        record = self.by_key.get(key)
+        if record is None:
+            candidates = self.by_bot.get(metrics.current_bot()) or self.by_bot["none"]
+            record = candidates[int(key[:8], 16) % len(candidates)]
+        return record
+
+    def _message(self, record: dict, chunk: bool = False, content: str = None):
+        usage = {"input_tokens": record["prompt_tokens"], "output_tokens": record["completion_tokens"],
+                 "total_tokens": record["prompt_tokens"] + record["completion_tokens"]}
+        if chunk:
+            return AIMessageChunk(content=content, usage_metadata=usage)
+        return AIMessage(content=record["completion"], usage_metadata=usage)
+
+    def _delays(self, record: dict) -> tuple:
+        """(wait before the first token, wait between tokens, tokens) for streaming the record back."""
+        tokens = re.findall(r"\s*\S+", record["completion"]) or [""]
+        latency = record["latency"] * self.speed
+        first = (record["ttft"] if record.get("ttft") is not None else record["latency"] / len(tokens)) * self.speed
+        return first, max(0.0, latency - first) / max(1, len(tokens) - 1), tokens
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        record = self._pick(messages)
+        time.sleep(record["latency"] * self.speed)
+        return ChatResult(generations=[ChatGeneration(message=self._message(record))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        record = self._pick(messages)
+        await asyncio.sleep(record["latency"] * self.speed)
+        return ChatResult(generations=[ChatGeneration(message=self._message(record))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        record = self._pick(messages)
+        first, between, tokens = self._delays(record)
+        for i, token in enumerate(tokens):
+            time.sleep(first if i == 0 else between)
+            chunk = ChatGenerationChunk(message=self._message(record, chunk=True, content=token) if i == len(tokens) - 1
+                                        else AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        record = self._pick(messages)
+        first, between, tokens = self._delays(record)
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(first if i == 0 else between)
+            chunk = ChatGenerationChunk(message=self._message(record, chunk=True, content=token) if i == len(tokens) - 1
+                                        else AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def cassette_chat_model(factory, callbacks) -> BaseChatModel:
+    """
+    The chat model for LLM_CASSETTE_MODE: factory(callbacks) builds the configured model, which
+    record mode wraps and replay mode does not need at all.
+    """
+    if LLM_CASSETTE_MODE == "replay":
+        return ReplayChatModel(cassette_path=LLM_CASSETTE_PATH, speed=LLM_REPLAY_SPEED, callbacks=callbacks)
+    return RecordingChatModel(inner=factory(None), callbacks=callbacks)
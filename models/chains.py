@@ -6,13 +6,15 @@ from models.prompts import (
     SYMPTOM_SUMMARY_PROMPT, VACCINE_SUMMARY_PROMPTS
 )
 from config.constants import SAMPLE_PRESCRIPTION
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate
 import re
 from utils.prompt_db import get_classifier_prompt, get_questioner_prompt
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 def format_docs(docs):
-    print("[DEBUG] Context passed to get_info prompt:", docs)
+    log.debug("Context passed to get_info prompt", context=docs)
     if isinstance(docs, str):
         return docs
     if isinstance(docs, list):
@@ -82,7 +84,7 @@ def make_symptom_chain(age, gender, vaccine_visit, symptom, prompt_override=None
     if doctor_id is not None and specialty_name is not None:
         classifier_prompt_text = get_classifier_prompt(specialty_name, doctor_id)
         if not classifier_prompt_text:
-            print(f"[WARNING] No classifier prompt found for doctor_id={doctor_id}, specialty={specialty_name}, using built-in default.")
+            log.warning("No classifier prompt found, using the built-in default", doctor_id=doctor_id, specialty=specialty_name)
             classifier_prompt_text = SYMPTOM_CLASSIFIER_PROMPT
     else:
         classifier_prompt_text = SYMPTOM_CLASSIFIER_PROMPT
@@ -101,11 +103,11 @@ def make_symptom_chain(age, gender, vaccine_visit, symptom, prompt_override=None
             "vaccine_visit": vaccine_visit,
             "symptom": symptom
         }).strip()
-        print(f"[DEBUG] Classified prompt category: {category}")
+        log.debug("Classified prompt category", prompt_key=category)
         # Always fetch prompt from database
         prompt_text = get_questioner_prompt(category)
         if not prompt_text:
-            print(f"[WARNING] No prompt found for key '{category}', using general_child fallback.")
+            log.warning("No prompt found for key %r, using the general_child fallback", category)
             prompt_text = get_questioner_prompt("general_child")
             if not prompt_text:
                 prompt_text = "I'm sorry, I couldn't load the right questions. Please try again later."
@@ -0,0 +1,204 @@
+# models/classifier_cache.py
+# Memo cache of LLM prompt-classifier answers (classifier_chain, followup_classifier_chain), for the
+# inputs the local rules (models/classifier_rules.py) leave to the LLM. Classifier inputs repeat
+# heavily (the same age, gender, vaccine flag and a small set of common symptom strings), so an
+# answer is reused for any input that normalizes to the same fields.
+#
+# The key is a digest of the classifier name, the classifier prompt text and the normalized input,
+# so a changed prompt never reuses answers given under the old one. A bounded in-process TTLCache
+# sits in front of an optional persistent tier that survives restarts and is shared by workers:
+#
+# CLASSIFIER_CACHE_BACKEND
+#   "memory" (default) - in-process only
+#   "sqlite"           - also CLASSIFIER_CACHE_SQLITE_PATH (one file per host); rows written under
+#                        an older prompt are deleted when the prompt changes
+#   "redis"            - also Redis (CLASSIFIER_CACHE_REDIS_URL), entries expire after the TTL
+#   "off"              - no caching
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+from config.settings import REDIS_URL
+from models.classifier_rules import YES, NO, parse_age_days, normalize_gender
+from utils import metrics
+from utils.ttl_cache import TTLCache
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+CLASSIFIER_CACHE_BACKEND = os.getenv("CLASSIFIER_CACHE_BACKEND", "memory").lower()
+CLASSIFIER_CACHE_SIZE = int(os.getenv("CLASSIFIER_CACHE_SIZE", "10000"))
+CLASSIFIER_CACHE_TTL_SECONDS = float(os.getenv("CLASSIFIER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CLASSIFIER_CACHE_SQLITE_PATH = os.getenv("CLASSIFIER_CACHE_SQLITE_PATH", "classifier_cache.sqlite3")
+CLASSIFIER_CACHE_REDIS_URL = os.getenv("CLASSIFIER_CACHE_REDIS_URL", REDIS_URL)
+CLASSIFIER_CACHE_KEY_PREFIX = os.getenv("CLASSIFIER_CACHE_KEY_PREFIX", "chatbot:classifier:")
+
+
+def _text(value) -> str:
+    return " ".join(str(value or "").lower().split()).strip(" .!?,;")
+
+
+def normalize_input(classifier_input: dict) -> dict:
+    """Case, whitespace and trailing punctuation folded; ages in days, genders and yes/no flags canonical."""
+    normalized = {}
+    for field, value in sorted(classifier_input.items()):
+        text = _text(value)
+        if field == "age":
+            days = parse_age_days(text)
+            text = f"{round(days)}d" if days is not None else text
+        elif field == "gender":
+            text = normalize_gender(text) or text
+        elif field == "vaccine_visit":
+            text = "yes" if text in YES else "no" if text in NO else text
+        normalized[field] = text
+    return normalized
+
+
+def prompt_hash(prompt_text: str) -> str:
+    return hashlib.sha1(prompt_text.encode("utf-8")).hexdigest()[:16]
+
+
+class _SqliteTier:
+    """One table on local disk. Connections are opened per process (they must not cross a fork)."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self._path = path
+        self._ttl = ttl_seconds
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self._path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS classifier_cache (key TEXT PRIMARY KEY, classifier TEXT NOT NULL, "
+                               "prompt_hash TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM classifier_cache WHERE key = ? AND expires_at > ?",
+                                             (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, classifier: str, prompt: str, value: str):
+        with self._lock, self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO classifier_cache VALUES (?, ?, ?, ?, ?)",
+                         (key, classifier, prompt, value, time.time() + self._ttl))
+
+    def purge(self, classifier: str, prompt: str) -> int:
+        """Deletes the classifier's rows written under any other prompt, and expired rows."""
+        with self._lock, self._connection() as conn:
+            return conn.execute("DELETE FROM classifier_cache WHERE (classifier = ? AND prompt_hash != ?) OR expires_at <= ?",
+                                (classifier, prompt, time.time())).rowcount
+
+
+class _RedisTier:
+    def __init__(self, url: str, ttl_seconds: float):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._ttl = int(ttl_seconds)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._redis.get(CLASSIFIER_CACHE_KEY_PREFIX + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, classifier: str, prompt: str, value: str):
+        self._redis.set(CLASSIFIER_CACHE_KEY_PREFIX + key, value, ex=self._ttl)
+
+    def purge(self, classifier: str, prompt: str) -> int:
+        # Keys embed the prompt hash; entries of an older prompt are never read again and expire on their own
+        return 0
+
+
+class ClassifierCache:
+    """
+    Answers of one classifier, keyed on its current prompt text (prompt_text() is read on every
+    call) and the normalized input. Only answers in valid_keys are stored. A failing persistent
+    tier is logged and skipped, never fatal: the classifier just calls the LLM.
+    """
+
+    def __init__(self, name: str, prompt_text: Callable[[], str], valid_keys=None, backend: str = CLASSIFIER_CACHE_BACKEND):
+        self.name = name
+        self._prompt_text = prompt_text
+        self._valid_keys = valid_keys
+        self.enabled = backend != "off"
+        self._memory = TTLCache(CLASSIFIER_CACHE_SIZE, CLASSIFIER_CACHE_TTL_SECONDS)
+        self._tier = None
+        if backend == "sqlite":
+            self._tier = _SqliteTier(CLASSIFIER_CACHE_SQLITE_PATH, CLASSIFIER_CACHE_TTL_SECONDS)
+        elif backend == "redis":
+            self._tier = _RedisTier(CLASSIFIER_CACHE_REDIS_URL, CLASSIFIER_CACHE_TTL_SECONDS)
+        self._prompt = None
+        self.hits = 0
+        self.misses = 0
+        metrics.register_cache(f"classifier_{name}", self.stats)
+
+    def _key(self, classifier_input: dict) -> tuple:
+        prompt = prompt_hash(self._prompt_text())
+        if prompt != self._prompt:
+            self._prompt_changed(prompt)
+        encoded = json.dumps(normalize_input(classifier_input), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(f"{self.name}\0{prompt}\0{encoded}".encode("utf-8")).hexdigest(), prompt
+
+    def _prompt_changed(self, prompt: str):
+        if self._prompt is not None:
+            log.info("Classifier prompt changed, cached answers dropped", classifier=self.name)
+            self._memory = TTLCache(CLASSIFIER_CACHE_SIZE, CLASSIFIER_CACHE_TTL_SECONDS)
+        self._prompt = prompt
+        if self._tier is not None:
+            try:
+                purged = self._tier.purge(self.name, prompt)
+                if purged:
+                    log.info("Purged classifier answers of older prompts", classifier=self.name, purged_count=purged)
+            except Exception as e:
+                log.warning("Classifier cache purge failed", classifier=self.name, error=str(e))
+
+    def get(self, classifier_input: dict) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key, _ = self._key(classifier_input)
+        value = self._memory.get(key)
+        if value is None and self._tier is not None:
+            try:
+                value = self._tier.get(key)
+            except Exception as e:
+                log.warning("Classifier cache read failed", classifier=self.name, error=str(e))
+            if value is not None:
+                self._memory.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, classifier_input: dict, value: str):
+        if not self.enabled or (self._valid_keys is not None and value not in self._valid_keys):
+            return
+        key, prompt = self._key(classifier_input)
+        self._memory.set(key, value)
+        if self._tier is not None:
+            try:
+                self._tier.set(key, self.name, prompt, value)
+            except Exception as e:
+                log.warning("Classifier cache write failed", classifier=self.name, error=str(e))
+
+    async def aget(self, classifier_input: dict) -> Optional[str]:
+        # Only the persistent tier does I/O; an in-process lookup needs no thread
+        if self._tier is None:
+            return self.get(classifier_input)
+        return await asyncio.to_thread(self.get, classifier_input)
+
+    async def aput(self, classifier_input: dict, value: str):
+        if self._tier is None:
+            return self.put(classifier_input, value)
+        await asyncio.to_thread(self.put, classifier_input, value)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._memory)}
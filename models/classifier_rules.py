@@ -0,0 +1,190 @@
+# models/classifier_rules.py
+# Local rule engines for the prompt classifiers in models/chains.py, so most sessions pick their
+# questioner prompt without an LLM round-trip.
+#
+# SYMPTOM_CLASSIFIER_PROMPT is a decision list over age, gender, vaccine visit and symptom text:
+#
+#   1. vaccine visit: the nearest lower vaccine age bucket, with a _male/_female suffix for 10y/11y/16y
+#   2. younger than 6 months: less_than_6_months
+#   3/4. a gender-specific symptom for the patient's gender: male_child / female_child
+#   5. otherwise general_child
+#
+# FOLLOWUP_CLASSIFIER_PROMPT picks allergy_asthma_consultation when the consultation type, summary
+# or prescription carries an allergy/asthma cue (allergy, asthma, wheezing, sneezing, eczema,
+# hives), and child_consultation otherwise.
+#
+# classify_symptom_prompt() and classify_followup_prompt() return None whenever the rules cannot
+# tell with certainty (an age without a unit, an unknown gender where it matters, symptom text that
+# touches on genital or pubertal complaints without naming them, allergy cues that are both
+# present and negated), and the caller asks the LLM instead (CLASSIFIER_RULES, config/settings.py).
+import re
+from typing import Optional
+
+DAYS_PER_UNIT = {"d": 1.0, "w": 7.0, "m": 365.25 / 12, "y": 365.25}
+_UNITS = (
+    ("d", ("d", "day", "days")),
+    ("w", ("w", "wk", "wks", "week", "weeks")),
+    ("m", ("m", "mo", "mos", "mon", "mth", "mths", "month", "months")),
+    ("y", ("y", "yr", "yrs", "year", "years")),
+)
+_UNIT_BY_WORD = {word: unit for unit, words in _UNITS for word in words}
+_AGE_PART = re.compile(r"(\d+(?:\.\d+)?)\s*([a-z]+)")
+_AGE_FILLER = re.compile(r"\b(?:and|old|of|age|aged)\b|[,&/()+-]|\.(?!\d)")
+
+# SYMPTOM_CLASSIFIER_PROMPT's vaccine buckets, youngest first, as (key, age in days)
+VACCINE_BUCKETS = tuple(
+    (f"{n}{unit}", n * DAYS_PER_UNIT[unit])
+    for n, unit in ((6, "w"), (10, "w"), (12, "w"), (6, "m"), (7, "m"), (9, "m"), (12, "m"), (15, "m"),
+                    (18, "m"), (20, "m"), (24, "m"), (30, "m"), (36, "m"), (42, "m"), (48, "m"), (54, "m"),
+                    (60, "m"), (66, "m"), (72, "m"), (10, "y"), (11, "y"), (16, "y"))
+)
+GENDERED_VACCINE_BUCKETS = {"10y", "11y", "16y"}
+# Every key SYMPTOM_CLASSIFIER_PROMPT may answer with
+SYMPTOM_PROMPT_KEYS = frozenset(
+    [f"vaccine_{key}" for key, _ in VACCINE_BUCKETS if key not in GENDERED_VACCINE_BUCKETS]
+    + [f"vaccine_{key}_{gender}" for key in GENDERED_VACCINE_BUCKETS for gender in ("male", "female")]
+    + ["less_than_6_months", "male_child", "female_child", "general_child"])
+
+MALE_SYMPTOMS = re.compile(
+    r"\b(?:testis|testes|testicles?|testicular|scrot(?:um|al)|foreskin|prepuce|penis|penile|phimosis|"
+    r"circumcis\w*|hydrocele|undescended|balanitis)\b")
+FEMALE_SYMPTOMS = re.compile(
+    r"\b(?:white discharge|vaginal?|vulva[rl]?|labia[l]?|menstru\w*|menarche|breasts?|"
+    r"(?:first|missed|late|irregular|heavy|painful) periods?|periods? (?:pain|cramps?)|"
+    r"leu[ck]orrh?oea|dysmenorrh?oea)\b")
+# Mentions that may or may not be gender-specific: left to the LLM
+AMBIGUOUS_SYMPTOMS = re.compile(
+    r"\b(?:genital\w*|private (?:parts?|area)|groin|down there|discharge|puberty|pubertal|"
+    r"nipples?|gyn(?:a)?ecomastia)\b")
+
+YES = {"yes", "y", "true", "1"}
+NO = {"", "no", "n", "false", "0", "none"}
+
+
+def parse_age_days(age) -> Optional[float]:
+    """
+    Age in days from text like "9 months", "1.5 yrs", "6w", "2 years 3 months" or "10 weeks old".
+    None if any part has no recognisable unit (a bare "4" could be months or years).
+    """
+    text = _AGE_FILLER.sub(" ", str(age or "").lower())
+    parts = _AGE_PART.findall(text)
+    if not parts or _AGE_PART.sub("", text).strip():
+        return None
+    days = 0.0
+    for number, word in parts:
+        unit = _UNIT_BY_WORD.get(word)
+        if unit is None:
+            return None
+        days += float(number) * DAYS_PER_UNIT[unit]
+    return days
+
+
+def parse_age_months(age) -> Optional[float]:
+    days = parse_age_days(age)
+    return None if days is None else days / DAYS_PER_UNIT["m"]
+
+
+def normalize_gender(value) -> Optional[str]:
+    value = str(value or "").strip().lower()
+    if value in ("male", "m", "boy"):
+        return "male"
+    if value in ("female", "f", "girl"):
+        return "female"
+    return None
+
+
+def vaccine_bucket(days: float) -> Optional[str]:
+    """The nearest lower vaccine bucket for an age in days; None below the first (6 weeks)."""
+    bucket = None
+    for key, bucket_days in VACCINE_BUCKETS:
+        if days + 1e-9 < bucket_days:
+            break
+        bucket = key
+    return bucket
+
+
+def classify_symptom_prompt(classifier_input: dict) -> Optional[str]:
+    """The prompt key SYMPTOM_CLASSIFIER_PROMPT selects for classifier_input, or None if only the LLM can tell."""
+    vaccine_visit = str(classifier_input.get("vaccine_visit") or "").strip().lower()
+    if vaccine_visit not in YES and vaccine_visit not in NO:
+        return None
+    days = parse_age_days(classifier_input.get("age"))
+    if days is None:
+        return None
+    gender = normalize_gender(classifier_input.get("gender"))
+
+    if vaccine_visit in YES:
+        bucket = vaccine_bucket(days)
+        if bucket is None:
+            return None
+        if bucket in GENDERED_VACCINE_BUCKETS:
+            return f"vaccine_{bucket}_{gender}" if gender else None
+        return f"vaccine_{bucket}"
+
+    if days < 6 * DAYS_PER_UNIT["m"]:
+        return "less_than_6_months"
+
+    symptom = str(classifier_input.get("symptom") or "").lower()
+    male, female = bool(MALE_SYMPTOMS.search(symptom)), bool(FEMALE_SYMPTOMS.search(symptom))
+    if gender == "male" and male and not female:
+        return "male_child"
+    if gender == "female" and female and not male:
+        return "female_child"
+    if male or female or AMBIGUOUS_SYMPTOMS.search(symptom):
+        # The other gender's terms, both, an unknown gender, or a vague mention
+        return None
+    return "general_child"
+
+
+# --- Followup classifier (FOLLOWUP_CLASSIFIER_PROMPT): child_consultation vs allergy_asthma_consultation ---
+
+# The prompt's cues (allergy, asthma, wheezing, sneezing, eczema, hives) and their clinical synonyms
+ALLERGY_TERMS = (r"allerg\w*|asthma\w*|wheez\w*|sneez\w*|eczema\w*|atopic|hives|urticaria\w*|rhinitis|"
+                 r"anaphyla\w*|bronchospasm|reactive airway\w*")
+FOLLOWUP_PROMPT_KEYS = frozenset(["child_consultation", "allergy_asthma_consultation"])
+# Prescriptions that only make sense for asthma or allergy
+ALLERGY_DRUGS = (r"salbutamol|albuterol|levosalbutamol|levalbuterol|budesonide|fluticasone|beclomethasone|"
+                 r"montelukast|inhaler\w*|spacer|nebuli[sz]\w*|epipen|epinephrine auto-?injector")
+# Antihistamines are prescribed for colds too: a hint, not a decision
+WEAK_ALLERGY_DRUGS = r"cetirizine|levocetirizine|fexofenadine|loratadine|desloratadine|chlorpheniramine|hydroxyzine|antihistamine\w*"
+
+_NEGATED = re.compile(
+    r"\b(?:no|not|nil|without|denies|denied|negative for|never had)\b[^.;\n]{0,40}?\b(?:" + ALLERGY_TERMS + r")"
+    r"|\b(?:" + ALLERGY_TERMS + r")\s*[:\-]\s*(?:none|nil|no|nkda|nka|not known)\b"
+    r"|\bnk(?:d)?a\b")
+_ALLERGY = re.compile(r"\b(?:" + ALLERGY_TERMS + r")\b")
+_ALLERGY_DRUGS = re.compile(r"\b(?:" + ALLERGY_DRUGS + r")\b")
+_WEAK_ALLERGY_DRUGS = re.compile(r"\b(?:" + WEAK_ALLERGY_DRUGS + r")\b")
+
+
+def _allergy_signals(text) -> tuple:
+    """(positive mentions, negated mentions) of the allergy/asthma terms in text."""
+    text = str(text or "").lower()
+    negated = _NEGATED.findall(text)
+    # A negated phrase contains its term; what is left over is a positive mention
+    positive = len(_ALLERGY.findall(_NEGATED.sub(" ", text)))
+    return positive, len(negated)
+
+
+def classify_followup_prompt(classifier_input: dict) -> Optional[str]:
+    """
+    The prompt key FOLLOWUP_CLASSIFIER_PROMPT selects for classifier_input, or None if the signals
+    conflict and only the LLM can tell.
+    """
+    consultation_positive, consultation_negated = _allergy_signals(classifier_input.get("consultation_type"))
+    summary_positive, summary_negated = _allergy_signals(classifier_input.get("symptom_summary"))
+    prescription = str(classifier_input.get("prescription") or "").lower()
+    prescription_positive, prescription_negated = _allergy_signals(prescription)
+    drugs = bool(_ALLERGY_DRUGS.search(prescription))
+    weak_drugs = bool(_WEAK_ALLERGY_DRUGS.search(prescription))
+
+    positive = consultation_positive + summary_positive + prescription_positive
+    negated = consultation_negated + summary_negated + prescription_negated
+    if negated and (positive or drugs):
+        # e.g. "no wheezing" in the summary of an asthma consultation, or next to an inhaler
+        return None
+    if positive or drugs:
+        return "allergy_asthma_consultation"
+    if weak_drugs:
+        return None
+    return "child_consultation"
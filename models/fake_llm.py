@@ -0,0 +1,79 @@
+# models/fake_llm.py
+# Deterministic offline stand-ins for the OpenAI chat model and embeddings, selected with
+# LLM_BACKEND=fake / EMBEDDING_BACKEND=fake (see config/settings.py). They make no network calls,
+# so the whole serving path can be load-tested (benchmarks/e2e_suite.py) without an API key.
+import asyncio
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers with a fixed reply after a fixed delay (time.sleep / asyncio.sleep).
+    output_tokens, when set, repeats the reply's words up to that many tokens. When streamed, the
+    delay is spread evenly over the tokens. Reports word counts as usage_metadata so the /metrics
+    token counters move like they would with a real model.
+    """
+    latency: float = 1.0
+    reply: str = "Our clinic is open Monday to Saturday, 9am to 6pm."
+    output_tokens: Optional[int] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _words(self) -> List[str]:
+        words = self.reply.split()
+        if self.output_tokens:
+            words = [words[i % len(words)] for i in range(self.output_tokens)]
+        return words
+
+    def _usage(self, messages: List[BaseMessage]) -> dict:
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        completion_tokens = len(self._words())
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        content = " ".join(self._words())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content, usage_metadata=self._usage(messages)))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    def _tokens(self) -> List[str]:
+        return [word if i == 0 else " " + word for i, word in enumerate(self._words())]
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens()
+        for i, token in enumerate(tokens):
+            time.sleep(self.latency / len(tokens))
+            usage = self._usage(messages) if i == len(tokens) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._tokens()
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(self.latency / len(tokens))
+            usage = self._usage(messages) if i == len(tokens) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def fake_embeddings(size: int) -> DeterministicFakeEmbedding:
+    """Embeddings seeded from a hash of the text: the same text always gets the same vector."""
+    return DeterministicFakeEmbedding(size=size)
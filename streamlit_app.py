@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import uuid
+import json
 from datetime import datetime
 import os
 
@@ -120,20 +121,20 @@ def qa_wizard():
                         }
                     else:
                         # If there are appointments, require symptoms
-                    initial_message = payload.get("symptoms", "")
-                    if not initial_message:
-                        st.warning("Symptom is required to start the conversation.")
-                        return
-                    initial_payload = {
-                        "thread_id": thread_id,
-                        "age": payload.get("age"),
-                        "gender": payload.get("gender"),
-                        "vaccine_visit": "yes" if "vaccine" in payload.get("consultation_type", "").lower() else "no",
-                        "symptoms": initial_message,
-                        "message": initial_message,
-                        "specialty": payload.get("specialty"),
-                        "message_type": "human"
-                    }
+                        initial_message = payload.get("symptoms", "")
+                        if not initial_message:
+                            st.warning("Symptom is required to start the conversation.")
+                            return
+                        initial_payload = {
+                            "thread_id": thread_id,
+                            "age": payload.get("age"),
+                            "gender": payload.get("gender"),
+                            "vaccine_visit": "yes" if "vaccine" in payload.get("consultation_type", "").lower() else "no",
+                            "symptoms": initial_message,
+                            "message": initial_message,
+                            "specialty": payload.get("specialty"),
+                            "message_type": "human"
+                        }
                     try:
                         resp_msg = requests.post(f"{BACKEND_URL}/message", json=initial_payload)
                         if resp_msg.status_code == 200:
@@ -174,6 +175,32 @@ def qa_wizard():
                 st.session_state.pop(key, None)
             st.rerun()
 
+def render_bot_message(content, placeholder=None):
+    html = f"<div style='text-align: left; color: #111827;'><b>Bot:</b> {content}</div>"
+    (placeholder or st).markdown(html, unsafe_allow_html=True)
+
+def stream_bot_reply(payload, placeholder):
+    """
+    Posts to /message/stream and renders tokens into the placeholder as they arrive.
+    Returns the final /message body ({'reply', 'bot_selection'}) or {'error': ...}.
+    """
+    partial = ""
+    with requests.post(f"{BACKEND_URL}/message/stream", json=payload, stream=True) as resp:
+        if resp.status_code != 200:
+            return {"error": resp.json().get("error", resp.text)}
+        event = None
+        for line in resp.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "token":
+                    partial += data["token"]
+                    render_bot_message(partial + " ▌", placeholder)
+                elif event in ("done", "error"):
+                    return data
+    return {"error": "Stream ended before the reply was complete."}
+
 # Main logic
 if not st.session_state.conversation_started:
     qa_wizard()
@@ -242,7 +269,7 @@ if st.session_state.conversation_started:
         if msg["type"] == "user":
             st.markdown(f"<div style='text-align: right; color: #2563eb;'><b>You:</b> {msg['content']}</div>", unsafe_allow_html=True)
         else:
-            st.markdown(f"<div style='text-align: left; color: #111827;'><b>Bot:</b> {msg['content']}</div>", unsafe_allow_html=True)
+            render_bot_message(msg['content'])
     user_input = st.text_area("Your message", key="user_input", height=70, disabled=(show_doctor_info_url and not st.session_state.website_embedded))
     if st.button("Send") and user_input.strip() and (not show_doctor_info_url or st.session_state.website_embedded):
         st.session_state.messages.append({"type": "user", "content": user_input})
@@ -282,16 +309,16 @@ if st.session_state.conversation_started:
             payload["doctor_info_url"] = st.session_state.doctor_info_url.strip()
         if show_prescription and prescription_to_send is not None:
             payload["prescription"] = prescription_to_send
-        print("Sending payload to /message:", payload)  # Debug print
         try:
-            resp = requests.post(f"{BACKEND_URL}/message", json=payload)
-            if resp.status_code == 200:
-                reply = resp.json().get("reply", "(No reply)")
-                st.session_state.messages.append({"type": "bot", "content": reply})
-                # Store bot_selection for next turn
-                st.session_state.last_bot_selection = resp.json().get("bot_selection")
+            # Render the reply token by token as the backend streams it
+            reply_placeholder = st.empty()
+            result = stream_bot_reply(payload, reply_placeholder)
+            if "error" in result:
+                st.session_state.messages.append({"type": "bot", "content": f"Error: {result['error']}"})
             else:
-                st.session_state.messages.append({"type": "bot", "content": f"Error: {resp.json().get('error', resp.text)}"})
+                st.session_state.messages.append({"type": "bot", "content": result.get("reply", "(No reply)")})
+                # Store bot_selection for next turn
+                st.session_state.last_bot_selection = result.get("bot_selection")
         except Exception as e:
             st.session_state.messages.append({"type": "bot", "content": f"Error: {e}"})
         st.rerun()
@@ -0,0 +1,246 @@
+# utils/admission.py
+# Admission control for LLM-bound work: at most ADMISSION_MAX_IN_FLIGHT bot invocations run at once,
+# up to ADMISSION_MAX_QUEUE more per priority class wait for at most ADMISSION_QUEUE_TIMEOUT_SECONDS,
+# and anything beyond that is shed immediately so the API can answer 429 with Retry-After instead of
+# letting latency grow until upstream timeouts fire.
+#
+# Requests carry a priority class (see PRIORITY_CLASSES). A freed slot goes to the oldest waiter of the
+# most urgent class that is still under its own in-flight cap (ADMISSION_CLASS_LIMITS), so a wave of
+# get-info questions can neither overtake nor crowd out symptom collection for imminent appointments.
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+# 0 disables the limit (every request is admitted at once, only the counters are kept)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+# Queue bound per priority class, so a flood in one class cannot fill the queue for the others
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Most urgent first. PREWARM is the classifier LLM calls of speculative session initializations
+# (conversation/prewarm.py), which no client is waiting for yet
+SYMPTOM_IMMINENT = "symptom_imminent"
+PREWARM = "prewarm"
+PRIORITY_CLASSES = [SYMPTOM_IMMINENT, "symptom", "followup", "get_info", PREWARM]
+DEFAULT_CLASS = "get_info"
+# Share of ADMISSION_MAX_IN_FLIGHT each class may hold at once (its bulkhead)
+DEFAULT_CLASS_SHARES = {SYMPTOM_IMMINENT: 1.0, "symptom": 0.75, "followup": 0.5, "get_info": 0.5, PREWARM: 0.25}
+
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+_EWMA_ALPHA = 0.2
+
+
+def parse_class_limits(spec: str, max_in_flight: int) -> dict:
+    """
+    Per-class in-flight caps from "name=cap,name=cap" (ADMISSION_CLASS_LIMITS). Classes not listed
+    get DEFAULT_CLASS_SHARES of max_in_flight; 0 means no cap beyond max_in_flight.
+    """
+    limits = {name: max(1, int(max_in_flight * share)) if max_in_flight > 0 else 0 for name, share in DEFAULT_CLASS_SHARES.items()}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, cap = item.partition("=")
+        if name.strip() not in limits:
+            raise ValueError(f"Unknown admission class '{name.strip()}' in ADMISSION_CLASS_LIMITS")
+        limits[name.strip()] = int(cap)
+    return limits
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed. retry_after is the suggested Retry-After, in whole seconds."""
+
+    def __init__(self, reason: str, retry_after: int, priority_class: str = DEFAULT_CLASS):
+        super().__init__(f"Server busy ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+        self.priority_class = priority_class
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self, event):
+        self.event = event
+        self.granted = False
+
+
+class _ClassState:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.shed = {QUEUE_FULL: 0, QUEUE_TIMEOUT: 0}
+        self.max_queue_depth = 0
+        self.queued_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.service_seconds = 0.0  # EWMA of how long an admitted request holds its slot
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "limit": self.limit,
+            "queue_depth": len(self.waiters),
+            "max_queue_depth_seen": self.max_queue_depth,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed[QUEUE_FULL],
+            "shed_queue_timeout": self.shed[QUEUE_TIMEOUT],
+            "queue_wait_avg_seconds": round(self.wait_seconds_total / self.queued_total, 4) if self.queued_total else 0.0,
+            "queue_wait_max_seconds": round(self.wait_seconds_max, 4),
+            "service_ewma_seconds": round(self.service_seconds, 4),
+        }
+
+
+class _Scheduler:
+    """Shared bookkeeping and dispatch of the sync and async controllers (callers serialize access)."""
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout_seconds: float = ADMISSION_QUEUE_TIMEOUT_SECONDS, class_limits: dict = None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        limits = class_limits if class_limits is not None else parse_class_limits(os.getenv("ADMISSION_CLASS_LIMITS", ""), max_in_flight)
+        self._classes = {name: _ClassState(limits.get(name, 0)) for name in PRIORITY_CLASSES}
+        self._in_flight = 0
+
+    def _state(self, priority_class: str) -> _ClassState:
+        return self._classes.get(priority_class) or self._classes[DEFAULT_CLASS]
+
+    def _has_capacity(self, state: _ClassState) -> bool:
+        if self.max_in_flight <= 0:
+            return True
+        return self._in_flight < self.max_in_flight and (state.limit <= 0 or state.in_flight < state.limit)
+
+    def _dispatch(self):
+        """Hands free slots to the oldest waiter of each class, most urgent class first."""
+        for name in PRIORITY_CLASSES:
+            state = self._classes[name]
+            while state.waiters and self._has_capacity(state):
+                waiter = state.waiters.popleft()
+                waiter.granted = True
+                self._in_flight += 1
+                state.in_flight += 1
+                waiter.event.set()
+
+    def _enqueue(self, state: _ClassState, priority_class: str, waiter: _Waiter) -> bool:
+        """Admits the waiter into a free slot, or queues it; returns True if it was admitted straight away."""
+        if not state.waiters and self._has_capacity(state):
+            # Nobody of this class is ahead of it: max_queue only bounds requests that have to wait
+            self._in_flight += 1
+            state.in_flight += 1
+            waiter.granted = True
+            state.admitted += 1
+            return True
+        if len(state.waiters) >= self.max_queue:
+            raise self._reject(state, priority_class, QUEUE_FULL)
+        state.waiters.append(waiter)
+        self._dispatch()
+        if waiter.granted:
+            state.admitted += 1
+            return True
+        state.max_queue_depth = max(state.max_queue_depth, len(state.waiters))
+        return False
+
+    def _settle(self, state: _ClassState, priority_class: str, waiter: _Waiter, waited: float):
+        """After queueing: counts the admission, or withdraws the waiter and raises on timeout."""
+        state.queued_total += 1
+        state.wait_seconds_total += waited
+        state.wait_seconds_max = max(state.wait_seconds_max, waited)
+        if not waiter.granted:
+            state.waiters.remove(waiter)
+            raise self._reject(state, priority_class, QUEUE_TIMEOUT)
+        state.admitted += 1
+
+    def _release(self, state: _ClassState, held: float = None):
+        if held is not None:
+            state.service_seconds = held if not state.service_seconds else (1 - _EWMA_ALPHA) * state.service_seconds + _EWMA_ALPHA * held
+        self._in_flight -= 1
+        state.in_flight -= 1
+        self._dispatch()
+
+    def _reject(self, state: _ClassState, priority_class: str, reason: str):
+        state.shed[reason] += 1
+        return AdmissionRejected(reason, self._retry_after(state), priority_class)
+
+    def _retry_after(self, state: _ClassState) -> int:
+        """Seconds until a slot is likely to be free: the class's queue drained at its observed service rate."""
+        slots = state.limit if state.limit > 0 else self.max_in_flight
+        if slots <= 0 or not state.service_seconds:
+            return 1
+        return max(1, math.ceil(state.service_seconds * (len(state.waiters) + 1) / slots))
+
+    def stats(self) -> dict:
+        classes = {name: state.stats() for name, state in self._classes.items()}
+        queued = sum(state.queued_total for state in self._classes.values())
+        waited = sum(state.wait_seconds_total for state in self._classes.values())
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": sum(c["queue_depth"] for c in classes.values()),
+            "max_queue": self.max_queue,
+            "admitted": sum(c["admitted"] for c in classes.values()),
+            "shed_queue_full": sum(c["shed_queue_full"] for c in classes.values()),
+            "shed_queue_timeout": sum(c["shed_queue_timeout"] for c in classes.values()),
+            "queue_wait_avg_seconds": round(waited / queued, 4) if queued else 0.0,
+            "queue_wait_max_seconds": max(c["queue_wait_max_seconds"] for c in classes.values()),
+            "classes": classes,
+        }
+
+
+class AdmissionController(_Scheduler):
+    """Thread-based admission controller for the Flask app: `with controller.admit(priority_class): ...`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, priority_class: str = DEFAULT_CLASS):
+        """Holds one in-flight slot; raises AdmissionRejected when the request is shed."""
+        state = self._state(priority_class)
+        waiter = _Waiter(threading.Event())
+        with self._lock:
+            admitted = self._enqueue(state, priority_class, waiter)
+        if not admitted:
+            started = time.monotonic()
+            waiter.event.wait(self.queue_timeout_seconds)
+            with self._lock:
+                self._settle(state, priority_class, waiter, time.monotonic() - started)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._release(state, time.monotonic() - started)
+
+
+class AsyncAdmissionController(_Scheduler):
+    """asyncio counterpart of AdmissionController for the ASGI app: `async with controller.admit(priority_class): ...`."""
+
+    @asynccontextmanager
+    async def admit(self, priority_class: str = DEFAULT_CLASS):
+        state = self._state(priority_class)
+        waiter = _Waiter(asyncio.Event())
+        if not self._enqueue(state, priority_class, waiter):
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(waiter.event.wait(), self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # Client went away while queued: give back a slot handed over meanwhile
+                if waiter.granted:
+                    self._release(state)
+                else:
+                    state.waiters.remove(waiter)
+                raise
+            self._settle(state, priority_class, waiter, time.monotonic() - started)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(state, time.monotonic() - started)
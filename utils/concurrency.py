@@ -0,0 +1,158 @@
+# utils/concurrency.py
+# Per-key locks and in-flight call coalescing, in a threading flavour (Flask) and an asyncio flavour (ASGI).
+import asyncio
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager, asynccontextmanager
+
+
+class LockTimeout(Exception):
+    """Raised when a keyed lock could not be acquired within its wait budget."""
+
+
+class KeyedLock:
+    """One threading.Lock per key, created on demand and dropped once nobody holds or waits for it."""
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, holders + waiters]
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key, timeout: float = -1):
+        """Holds the lock for `key`; raises LockTimeout if it is not free within `timeout` seconds (-1 waits forever)."""
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(timeout=timeout):
+                raise LockTimeout(key)
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+class AsyncKeyedLock:
+    """asyncio counterpart of KeyedLock, for use inside a single event loop."""
+
+    def __init__(self):
+        self._locks = {}
+
+    @asynccontextmanager
+    async def hold(self, key, timeout: float = None):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise LockTimeout(key) from None
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller (the leader) does the work and
+    every caller arriving while it is in flight receives the leader's result instead of repeating it.
+    Nothing is cached once the leader finishes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key):
+        """Returns (future, is_leader). The leader must call finish(key, ...); followers wait on future.result()."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def finish(self, key, result=None, error=None):
+        """Publishes the leader's outcome to its followers. Calling it again for the same key is a no-op."""
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """Runs fn() unless an identical call is already in flight, in which case its result is shared."""
+        future, leader = self.join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return result
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+class AsyncSingleFlight(SingleFlight):
+    """asyncio counterpart of SingleFlight; followers await the leader's future."""
+
+    def join(self, key):
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future, False
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self.leaders += 1
+        return future, True
+
+    def finish(self, key, result=None, error=None):
+        future = self._calls.pop(key, None)
+        if future is None or future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+            future.exception()  # mark retrieved so a leader without followers does not log a warning
+        else:
+            future.set_result(result)
+
+    async def do(self, key, fn):
+        """Awaits fn() unless an identical call is already in flight, in which case its result is shared."""
+        future, leader = self.join(key)
+        if not leader:
+            return await asyncio.shield(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return result
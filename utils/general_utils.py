@@ -2,20 +2,18 @@
 # Contains helper utilities not specific to any other major component.
 
 # utils/general_utils.py
+# FAISS, tiktoken, the web loader and the OpenAI embeddings client are imported on first use, not at
+# import time: only /embed_website and get-info retrieval need them, and they dominate cold starts.
 import re
-import requests
-from bs4 import BeautifulSoup
-import faiss
-import numpy as np
-import tiktoken
-from langchain_openai import OpenAIEmbeddings
+import asyncio
 import os
-import hashlib
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import WebBaseLoader
+import threading
 from dotenv import load_dotenv
+from config.settings import FAISS_DB_PATH, EMBEDDING_BACKEND, FAKE_EMBEDDING_DIM
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 
 load_dotenv()
@@ -47,6 +45,7 @@ def extract_specialty_and_age(consultation_type: str):
 
 # --- Web Scraping ---
 def scrape_and_clean_text(url):
+    from langchain_community.document_loaders import WebBaseLoader
     loader = WebBaseLoader(url)
     docs = loader.load()
     text = "\n".join(doc.page_content for doc in docs)
@@ -54,6 +53,7 @@ def scrape_and_clean_text(url):
 
 # --- Chunking ---
 def chunk_text(text, max_tokens=350, overlap=50):
+    import tiktoken
     enc = tiktoken.get_encoding('cl100k_base')
     tokens = enc.encode(text)
     chunks = []
@@ -66,47 +66,99 @@ def chunk_text(text, max_tokens=350, overlap=50):
     return chunks
 
 # --- Embedding ---
-embeddings = OpenAIEmbeddings()
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings():
+    """The shared embeddings client (OpenAI, or the offline fake with EMBEDDING_BACKEND=fake), created on first use."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                if EMBEDDING_BACKEND == "fake":
+                    from models.fake_llm import fake_embeddings
+                    _embeddings = fake_embeddings(FAKE_EMBEDDING_DIM)
+                else:
+                    from langchain_openai import OpenAIEmbeddings
+                    _embeddings = OpenAIEmbeddings()
+    return _embeddings
 
 def embed_chunks(chunks):
-    return embeddings.embed_documents(chunks)
+    return get_embeddings().embed_documents(chunks)
 
 # --- FAISS DB Management ---
 def get_faiss_db_path(url=None):
-    return "faiss_main"
+    return FAISS_DB_PATH
+
+# Loaded indexes by path, with the mtime of the index file they were read from. Read once per process
+# (or once in the gunicorn master, see gunicorn.conf.py) and reloaded when /embed_website in any
+# worker rewrites the file.
+_faiss_dbs = {}
+_faiss_lock = threading.Lock()
+
+def load_faiss(db_path=None):
+    """The saved FAISS index at db_path, loaded on first use and again whenever it changes on disk; None if there is none."""
+    db_path = db_path or get_faiss_db_path()
+    try:
+        mtime = os.stat(os.path.join(db_path, "index.faiss")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _faiss_dbs.get(db_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _faiss_lock:
+        cached = _faiss_dbs.get(db_path)
+        if cached is None or cached[0] != mtime:
+            from langchain_community.vectorstores import FAISS
+            log.info("Loading FAISS DB", db_path=db_path)
+            cached = (mtime, FAISS.load_local(db_path, get_embeddings(), allow_dangerous_deserialization=True))
+            _faiss_dbs[db_path] = cached
+    return cached[1]
 
 def build_or_load_faiss(url, force_rebuild=False):
     db_path = get_faiss_db_path()
-    print(f"[DEBUG] build_or_load_faiss: db_path={db_path}, force_rebuild={force_rebuild}")
     
     # If no URL is provided, return None to indicate no context available
     if not url:
-        print("[DEBUG] No URL provided, returning None")
         return None
-        
-    if not force_rebuild and os.path.exists(db_path):
-        print(f"Loading FAISS DB from {db_path}")
-        return FAISS.load_local(db_path, OpenAIEmbeddings(), allow_dangerous_deserialization=True)
-    print(f"Scraping and building FAISS DB for {url}")
+    if not force_rebuild:
+        db = load_faiss(db_path)
+        if db is not None:
+            return db
+    from langchain_community.vectorstores import FAISS
+    log.info("Scraping and building FAISS DB", url=url, force_rebuild=force_rebuild)
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     text = scrape_and_clean_text(url)
-    print(f"Scraped text length: {len(text)}")
     splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
     docs = [Document(page_content=chunk) for chunk in splitter.split_text(text)]
-    print(f"Number of chunks: {len(docs)}")
-    db = FAISS.from_documents(docs, OpenAIEmbeddings())
+    db = FAISS.from_documents(docs, get_embeddings())
     db.save_local(db_path)
-    print(f"FAISS DB saved to {db_path}")
+    with _faiss_lock:
+        _faiss_dbs[db_path] = (os.stat(os.path.join(db_path, "index.faiss")).st_mtime_ns, db)
+    log.info("FAISS DB saved", db_path=db_path, text_chars=len(text), chunk_count=len(docs))
     return db
 
+@metrics.timed("retrieve_relevant_chunks")
 def retrieve_relevant_chunks(url, query, k=4):
-    print(f"[DEBUG] Entered retrieve_relevant_chunks with query: '{query}'")
-    db = build_or_load_faiss(url)  # Use the provided URL
+    with metrics.stage("faiss_load"):
+        db = build_or_load_faiss(url)  # Use the provided URL
     if db is None:
-        print("[DEBUG] No FAISS DB available, returning empty list")
+        log.debug("No FAISS DB available, returning no chunks")
         return []
     retriever = db.as_retriever(search_kwargs={"k": k})
-    docs = retriever.invoke(query)
-    print(f"[DEBUG] Retrieved {len(docs)} docs from retriever for query: '{query}'")
-    for i, doc in enumerate(docs):
-        print(f"[DEBUG] Chunk {i}: {doc.page_content[:200]}...")
-    return [doc.page_content for doc in docs]
\ No newline at end of file
+    with metrics.stage("embed_and_search"):
+        docs = retriever.invoke(query)
+    log.debug("Retrieved chunks", query=query, chunk_count=len(docs))
+    return [doc.page_content for doc in docs]
+
+@metrics.timed("retrieve_relevant_chunks")
+async def aretrieve_relevant_chunks(url, query, k=4):
+    """Async variant of retrieve_relevant_chunks: loads the index off the event loop and awaits the query embedding."""
+    with metrics.stage("faiss_load"):
+        db = await asyncio.to_thread(build_or_load_faiss, url)
+    if db is None:
+        return []
+    with metrics.stage("embed_and_search"):
+        docs = await db.as_retriever(search_kwargs={"k": k}).ainvoke(query)
+    return [doc.page_content for doc in docs]
@@ -0,0 +1,220 @@
+# utils/log.py
+# Structured, leveled logging for the serving path, replacing print() debugging.
+#
+# - get_logger(__name__) returns a logger that takes structured fields as keyword arguments:
+#       log.debug("Router decision", route=route, appointment_count=len(appts))
+#   Messages use %-style args, so nothing is formatted unless the level is enabled.
+# - Records go through a bounded in-memory queue to a single writer thread (QueueHandler +
+#   QueueListener), so request threads never block on stdout. When the queue is full, records
+#   are dropped and counted rather than stalling a request.
+# - DEBUG calls are sampled (LOG_DEBUG_SAMPLE_RATE) before a record is even built, and PHI fields
+#   are redacted before records are queued (see REDACTED_FIELDS).
+# - Caller file/line lookup is switched off (the formatters do not print it), which removes the
+#   stack walk that dominates the cost of building a record.
+#
+# Settings: LOG_LEVEL (INFO), LOG_FORMAT (text|json), LOG_DEBUG_SAMPLE_RATE (1.0),
+# LOG_QUEUE_SIZE (10000), LOG_REDACT (1), LOG_REDACT_FIELDS (extra comma-separated field names).
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from utils import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Fraction of DEBUG records kept once LOG_LEVEL=DEBUG; INFO and above are never sampled
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_REDACT = os.getenv("LOG_REDACT", "1") not in ("0", "false", "no")
+
+ROOT_LOGGER = "chatbot"
+
+# Field names whose values may carry patient data: logged as a type and size only
+REDACTED_FIELDS = {
+    "patient_name", "name", "age", "gender", "dob", "phone", "email", "address",
+    "appointment_data", "appointments", "doctor_appointments", "future_appointments", "past_appointments",
+    "symptom_summary", "prescription", "message", "messages", "first_message", "query", "history",
+    "chunks", "context", "prompt", "symptom_prompt", "followup_prompt", "classifier_input", "payload", "reply",
+} | {f.strip() for f in os.getenv("LOG_REDACT_FIELDS", "").split(",") if f.strip()}
+
+# Keyword arguments that belong to logging itself rather than to the record's fields
+_LOGGING_KWARGS = {"exc_info", "stack_info", "stacklevel", "extra"}
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "fields"}
+
+
+def redact(key: str, value):
+    """Replaces a PHI field's value with its type and size, recursing into dicts so nested PHI keys are caught too."""
+    if key in REDACTED_FIELDS:
+        if value is None:
+            return None
+        size = len(value) if hasattr(value, "__len__") else None
+        return f"<redacted {type(value).__name__}{f' len={size}' if size is not None else ''}>"
+    if isinstance(value, dict):
+        return {k: redact(k, v) for k, v in value.items()}
+    return value
+
+
+_debug_sample_rate = LOG_DEBUG_SAMPLE_RATE
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger that turns unknown keyword arguments into structured fields on the record."""
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        # Sample DEBUG calls here, so a dropped one costs a random() instead of a LogRecord
+        if level <= logging.DEBUG and _debug_sample_rate < 1.0 and random.random() >= _debug_sample_rate:
+            return
+        msg, kwargs = self.process(msg, kwargs)
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        if fields:
+            kwargs["extra"] = {**(kwargs.get("extra") or {}), "fields": fields}
+        return msg, kwargs
+
+
+class RedactingFilter(logging.Filter):
+    """Redacts PHI in structured fields and in dict arguments before the record leaves the calling thread."""
+
+    def filter(self, record) -> bool:
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = {key: redact(key, value) for key, value in fields.items()}
+        if isinstance(record.args, dict):
+            record.args = redact("", record.args)
+        elif record.args:
+            record.args = tuple(redact("", arg) if isinstance(arg, dict) else arg for arg in record.args)
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and leaves formatting to the listener thread. Records stay
+    in-process, so they are queued as they are; arguments must not be mutated after the call.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _fields(record) -> dict:
+    fields = dict(getattr(record, "fields", None) or {})
+    fields.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+    return fields
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_configure_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+def configure_logging(level: str = None, fmt: str = None, sample_rate: float = None, stream=None):
+    """
+    Installs the queue handler on the 'chatbot' logger and starts the writer thread. Called on
+    first use of get_logger(); call again (e.g. from a benchmark) to change the settings.
+    """
+    global _handler, _listener, _debug_sample_rate
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+        # See "Optimization" in the logging HOWTO: no caller lookup, no multiprocessing name
+        logging._srcfile = None
+        logging.logMultiprocessing = False
+        _debug_sample_rate = LOG_DEBUG_SAMPLE_RATE if sample_rate is None else sample_rate
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers.clear()
+        root.setLevel(level or LOG_LEVEL)
+        root.propagate = False
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+        _handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        if LOG_REDACT:
+            _handler.addFilter(RedactingFilter())
+        root.addHandler(_handler)
+        _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+
+
+def flush_logging(timeout: float = 5.0):
+    """Waits until the writer thread has drained the queue (benchmarks, tests, shutdown)."""
+    deadline = time.monotonic() + timeout
+    while _handler is not None and _handler.queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def restart_after_fork():
+    """
+    Gives a forked worker its own queue and writer thread. The parent's writer thread does not exist
+    in the child, so records put on the inherited queue would never be written.
+    """
+    global _listener
+    _listener = None
+    configure_logging()
+
+
+def _shutdown():
+    if _listener is not None:
+        _listener.stop()
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Structured logger under the 'chatbot' namespace, e.g. get_logger(__name__)."""
+    if _listener is None:
+        configure_logging()
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+
+def _collect_dropped():
+    return [("chatbot_log_records_dropped_total", "counter", "Log records dropped because the log queue was full.",
+             [({}, _handler.dropped if _handler is not None else 0)])]
+
+
+atexit.register(_shutdown)
+metrics.register_collector(_collect_dropped)
@@ -0,0 +1,338 @@
+# utils/metrics.py
+# In-process metrics registry served at /metrics in the Prometheus text format (version 0.0.4).
+#
+# - stage(name) times a section of a turn into chatbot_stage_duration_seconds{stage, bot}; the bot
+#   label comes from bot_context(), set once per turn, so deep helpers need not be passed the bot key
+# - token_usage is a LangChain callback attached to the shared chat model that counts LLM calls,
+#   their latency and prompt/completion tokens per bot
+# - register_collector() adds values read at scrape time (cache hit ratios, queue depths)
+#
+# Each worker process keeps its own registry; scrape every worker (or sum in the query).
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Plain stdlib logger under the 'chatbot' namespace (utils.log depends on this module, not the reverse)
+log = logging.getLogger("chatbot.utils.metrics")
+
+# METRICS_STAGE_CPU=1 also adds the CPU time of each stage's thread to chatbot_stage_cpu_seconds_total.
+# Off by default: under asyncio the thread runs other tasks while a stage awaits, so the numbers are
+# only exact on the threaded Flask path (benchmarks/e2e_suite.py turns it on).
+STAGE_CPU = os.getenv("METRICS_STAGE_CPU", "0") == "1"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_bot = contextvars.ContextVar("chatbot_current_bot", default="none")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """
+        collect() is called at scrape time and returns (name, type, help, samples) tuples, where
+        samples is a list of (labels_dict, value). A collector that raises is skipped for that scrape.
+        """
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                log.warning("Metrics collector %s failed: %s", getattr(collect, '__name__', collect), e)
+                continue
+            for name, type_, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "chatbot_stage_duration_seconds", "Time spent in each stage of a /message turn.", ["stage", "bot"])
+STAGE_CPU_SECONDS = REGISTRY.counter(
+    "chatbot_stage_cpu_seconds_total", "Thread CPU time spent in each stage (METRICS_STAGE_CPU=1).", ["stage", "bot"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "chatbot_request_duration_seconds", "HTTP request latency by endpoint and status.", ["endpoint", "status"])
+LLM_CALLS = REGISTRY.counter("chatbot_llm_calls_total", "LLM calls by bot and outcome.", ["bot", "outcome"])
+LLM_SECONDS = REGISTRY.histogram("chatbot_llm_call_duration_seconds", "Latency of individual LLM calls.", ["bot"])
+LLM_TOKENS = REGISTRY.counter("chatbot_llm_tokens_total", "LLM tokens by bot and kind (prompt/completion).", ["bot", "kind"])
+CLASSIFIER_DECISIONS = REGISTRY.counter(
+    "chatbot_classifier_decisions_total", "Prompt classifier decisions by classifier and source (rules/llm).", ["classifier", "source"])
+CLASSIFIER_SHADOW = REGISTRY.counter(
+    "chatbot_classifier_shadow_total", "CLASSIFIER_RULES=shadow: rule decisions compared with the LLM's.", ["classifier", "agreement"])
+PROMPT_CACHE_RELOADS = REGISTRY.counter(
+    "chatbot_prompt_cache_reloads_total", "Prompt table reloads by trigger (initial/poll/notify/manual).", ["trigger"])
+SESSION_PREWARM = REGISTRY.counter(
+    "chatbot_session_prewarm_total", "Speculative bot session initializations by bot and outcome.", ["bot", "outcome"])
+SESSION_PREWARM_WASTED = REGISTRY.counter(
+    "chatbot_session_prewarm_wasted_total",
+    "Speculative session initializations the first bot turn discarded, by predicted bot and whether they called the classifier LLM.",
+    ["bot", "llm"])
+LLM_TOKENS_PER_CALL = REGISTRY.histogram(
+    "chatbot_llm_tokens_per_call", "Total tokens per LLM call.", ["bot"],
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def register_collector(collect):
+    REGISTRY.register_collector(collect)
+
+
+_caches = {}
+
+
+def register_cache(name: str, stats):
+    """Exports hit and miss counters and the hit ratio of a cache whose stats() returns 'hits' and 'misses'."""
+    _caches[name] = stats
+
+
+def _collect_caches():
+    hits, misses, ratios = [], [], []
+    for name, stats in list(_caches.items()):
+        current = stats()
+        h, m = current.get("hits", 0), current.get("misses", 0)
+        labels = {"cache": name}
+        hits.append((labels, h))
+        misses.append((labels, m))
+        ratios.append((labels, round(h / (h + m), 4) if h + m else 0.0))
+    return [
+        ("chatbot_cache_hits_total", "counter", "Cache hits since start.", hits),
+        ("chatbot_cache_misses_total", "counter", "Cache misses since start.", misses),
+        ("chatbot_cache_hit_ratio", "gauge", "Cache hit ratio since start.", ratios),
+    ]
+
+
+REGISTRY.register_collector(_collect_caches)
+
+
+def register_service_collectors(sessions, coalescing, admission):
+    """
+    Scrape-time metrics for the serving objects shared by application.py and asgi_application.py:
+    session and replay cache hit ratios, coalesced duplicates, and per-class admission queues. Totals
+    since start are counters (rate() handles a worker restart); current levels are gauges.
+    """
+    register_cache("sessions", sessions.stats)
+    register_cache("replay", lambda: sessions.stats()["replay"])
+
+    def collect():
+        flights = coalescing.stats()
+        classes = admission.stats()["classes"]
+
+        def per_class(field):
+            return [({"class": name}, c[field]) for name, c in classes.items()]
+
+        shed = [({"class": name, "reason": reason}, c[f"shed_{reason}"])
+                for name, c in classes.items() for reason in ("queue_full", "queue_timeout")]
+        return [
+            ("chatbot_sessions_live", "gauge", "Live session records.", [({}, sessions.stats()["live_sessions"])]),
+            ("chatbot_coalesced_messages_total", "counter", "Duplicate messages answered by an in-flight turn since start.", [({}, flights["coalesced"])]),
+            ("chatbot_admission_in_flight", "gauge", "Admitted turns currently running.", per_class("in_flight")),
+            ("chatbot_admission_queue_depth", "gauge", "Turns waiting for an admission slot.", per_class("queue_depth")),
+            ("chatbot_admission_admitted_total", "counter", "Turns admitted since start.", per_class("admitted")),
+            ("chatbot_admission_shed_total", "counter", "Turns shed with 429 since start.", shed),
+            ("chatbot_admission_queue_wait_avg_seconds", "gauge", "Average admission queue wait.", per_class("queue_wait_avg_seconds")),
+        ]
+
+    register_collector(collect)
+
+
+@contextmanager
+def bot_context(bot_key):
+    """Labels every stage and LLM call made inside the block (and in contexts copied from it) with bot_key."""
+    token = _current_bot.set(bot_key or "none")
+    try:
+        yield
+    finally:
+        _current_bot.reset(token)
+
+
+def current_bot() -> str:
+    return _current_bot.get()
+
+
+@contextmanager
+def stage(name: str, bot: str = None):
+    """Times the block into chatbot_stage_duration_seconds{stage=name}. Works around awaits too."""
+    started = time.perf_counter()
+    cpu_started = time.thread_time() if STAGE_CPU else None
+    try:
+        yield
+    finally:
+        bot = bot or _current_bot.get()
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name, bot=bot)
+        if cpu_started is not None:
+            STAGE_CPU_SECONDS.inc(time.thread_time() - cpu_started, stage=name, bot=bot)
+
+
+def timed(name: str):
+    """Decorator form of stage() for plain and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Counts LLM calls, latency and token usage per bot. Attached to the shared chat model."""
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = (time.perf_counter(), _current_bot.get())
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = (time.perf_counter(), _current_bot.get())
+
+    def _finish(self, run_id, outcome):
+        started, bot = self._started.pop(run_id, (None, _current_bot.get()))
+        if started is not None:
+            LLM_SECONDS.observe(time.perf_counter() - started, bot=bot)
+        LLM_CALLS.inc(bot=bot, outcome=outcome)
+        return bot
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        bot = self._finish(run_id, "ok")
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens or completion_tokens:
+            LLM_TOKENS.inc(prompt_tokens, bot=bot, kind="prompt")
+            LLM_TOKENS.inc(completion_tokens, bot=bot, kind="completion")
+            LLM_TOKENS_PER_CALL.observe(prompt_tokens + completion_tokens, bot=bot)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "error")
+
+
+def _token_usage(response):
+    """(prompt, completion) tokens from an LLMResult: provider llm_output first, else the messages' usage_metadata."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += metadata.get("input_tokens", 0)
+            completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+token_usage = TokenUsageCallback()
@@ -1,32 +1,328 @@
-from middleware.config.db import SessionLocal, ClassifierPrompt, QuestionerPrompt, followUpQuestionerPrompt
+# utils/prompt_db.py
+# Classifier and questioner prompt lookups. The prompt tables are small and change a few times a
+# week, so they are read whole into an in-process snapshot and a lookup is a dict read. A key may
+# have several versions; the newest active row (highest id with is_active) is served.
+#
+# Once the first snapshot is loaded, lookups never wait on the database. When the snapshot has not
+# been checked for PROMPT_CACHE_POLL_SECONDS, the lookup that notices starts a background check of
+# the tables' version: row count, max(updated_at) and max(id) per table, in one round-trip. Only a
+# changed version reloads the tables, and the new snapshot replaces the old one in a single
+# assignment. On Postgres, PROMPT_CACHE_LISTEN=1 also LISTENs on PROMPT_CHANNEL, which
+# middleware/config/db.py NOTIFYs whenever a transaction that wrote prompts commits, and reloads
+# as soon as a notification arrives.
+#
+# PROMPT_CACHE selects the mode:
+#   "on" (default) - the polled snapshot above
+#   "snapshot"     - the prompts are loaded once at startup (load_at_startup()) and the lookups
+#                    never touch the database again, so a slow or unreachable Postgres does not
+#                    affect serving. A new snapshot is loaded only on POST /admin/reload_prompts or
+#                    SIGHUP (install_reload_signal()). If a reload fails, the old snapshot is kept.
+#   "off"          - a query per lookup
+import asyncio
+import os
+import select as select_fd
+import signal
+import sys
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+from sqlalchemy import select, func, literal, cast, null, union_all, Integer, String
+from middleware.config.db import (SessionLocal, AsyncSessionLocal, engine, ClassifierPrompt, QuestionerPrompt,
+                                  followUpClassifierPrompt, followUpQuestionerPrompt, PROMPT_CHANNEL)
+from utils import metrics
+from utils.log import get_logger
 
-def get_classifier_prompt(specialty_name: str, doctor_id: int) -> str:
-    session = SessionLocal()
+log = get_logger(__name__)
+
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "on").lower()
+PROMPT_CACHE_POLL_SECONDS = float(os.getenv("PROMPT_CACHE_POLL_SECONDS", "30"))
+PROMPT_CACHE_LISTEN = os.getenv("PROMPT_CACHE_LISTEN", "0") == "1"
+
+# snapshot field -> (table, key columns); classifier tables are keyed by (specialty_name, doctor_id)
+_TABLES = {
+    "classifier": (ClassifierPrompt, ("specialty_name", "doctor_id")),
+    "followup_classifier": (followUpClassifierPrompt, ("specialty_name", "doctor_id")),
+    "questioner": (QuestionerPrompt, ("prompt_key",)),
+    "followup_questioner": (followUpQuestionerPrompt, ("prompt_key",)),
+}
+
+
+class PromptSnapshot(NamedTuple):
+    """Read-only maps of prompt_text, with repeated texts and keys stored once."""
+    version: tuple
+    classifier: Mapping           # (specialty_name, doctor_id) -> prompt_text
+    followup_classifier: Mapping  # (specialty_name, doctor_id) -> prompt_text
+    questioner: Mapping           # prompt_key -> prompt_text
+    followup_questioner: Mapping  # prompt_key -> prompt_text
+
+
+def _version(session) -> tuple:
+    columns = []
+    for model, _ in _TABLES.values():
+        columns += [select(func.count(model.id)).scalar_subquery(),
+                    select(func.max(model.updated_at)).scalar_subquery(),
+                    select(func.max(model.id)).scalar_subquery()]
+    return tuple(session.execute(select(*columns)).one())
+
+
+def _rows_query():
+    """The active rows of the four tables in one UNION ALL, newest first: (field, id, name, doctor_id, prompt_text)."""
+    parts = []
+    for field, (model, key_columns) in _TABLES.items():
+        doctor_id = model.doctor_id if "doctor_id" in key_columns else cast(null(), Integer)
+        parts.append(select(literal(field, String).label("field"), model.id, getattr(model, key_columns[0]).label("name"),
+                            doctor_id.label("doctor_id"), model.prompt_text).where(model.is_active.is_(True)))
+    combined = union_all(*parts).subquery()
+    return select(combined).order_by(combined.c.field, combined.c.id.desc())
+
+
+def load_snapshot(session) -> PromptSnapshot:
+    """
+    Reads the prompt tables with one query and keeps the newest active row per key, the row the
+    per-key queries return. Keys are interned and equal texts share one string.
+    """
+    # The version is read first: a write that lands during the load makes the next check reload again
+    version = _version(session)
+    prompts = {field: {} for field in _TABLES}
+    texts = {}
+    for field, _, name, doctor_id, prompt_text in session.execute(_rows_query()):
+        key = sys.intern(name) if doctor_id is None else (sys.intern(name), doctor_id)
+        prompts[field].setdefault(key, texts.setdefault(prompt_text, prompt_text))
+    return PromptSnapshot(version=version, **{field: MappingProxyType(values) for field, values in prompts.items()})
+
+
+class PromptCache:
+    """The current PromptSnapshot, refreshed in the background when the tables' version changes."""
+
+    def __init__(self, poll_seconds: float = PROMPT_CACHE_POLL_SECONDS, listen: bool = PROMPT_CACHE_LISTEN):
+        # poll_seconds=None never checks on its own ("snapshot" mode)
+        self.poll_seconds = poll_seconds
+        self.listen = listen
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self._listener_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def snapshot(self) -> PromptSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Only the first lookup in a process waits for the database
+            self.misses += 1
+            return self.refresh("initial")
+        self.hits += 1
+        if self.poll_seconds is None:
+            return snapshot
+        if time.monotonic() - self._checked_at >= self.poll_seconds and not self._refreshing:
+            self._start_refresh()
+        if self.listen and self._listener_pid != os.getpid():
+            self._start_listener()
+        return snapshot
+
+    async def asnapshot(self) -> PromptSnapshot:
+        """snapshot() for the event loop: only the first load waits, in a thread."""
+        if self._snapshot is None:
+            return await asyncio.to_thread(self.snapshot)
+        return self.snapshot()
+
+    def refresh(self, trigger: str = "manual", force: bool = False) -> PromptSnapshot:
+        """
+        Checks the tables' version and reloads them if it changed (always with force). Readers keep
+        the old snapshot until the new one replaces it.
+        """
+        with self._load_lock:
+            if trigger == "initial" and self._snapshot is not None:
+                # Another first lookup loaded it while this one waited for the lock
+                return self._snapshot
+            session = SessionLocal()
+            try:
+                if force or self._snapshot is None or _version(session) != self._snapshot.version:
+                    started = time.perf_counter()
+                    self._snapshot = load_snapshot(session)
+                    self.reloads += 1
+                    metrics.PROMPT_CACHE_RELOADS.inc(trigger=trigger)
+                    log.info("Prompt cache loaded", trigger=trigger, seconds=round(time.perf_counter() - started, 4),
+                             **{f"{field}_count": len(getattr(self._snapshot, field)) for field in _TABLES})
+            finally:
+                session.close()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def _start_refresh(self):
+        """
+        Starts one background poll. The flag is tested and set under _load_lock, so concurrent
+        readers start one refresh between them. A reader never waits for the lock: if it is taken,
+        a load is running already.
+        """
+        if not self._load_lock.acquire(blocking=False):
+            return
+        try:
+            if self._refreshing or time.monotonic() - self._checked_at < self.poll_seconds:
+                return
+            self._refreshing = True
+        finally:
+            self._load_lock.release()
+        threading.Thread(target=self._refresh_quietly, args=("poll",), name="prompt-cache-refresh", daemon=True).start()
+
+    def _refresh_quietly(self, trigger: str):
+        try:
+            self.refresh(trigger)
+        except Exception as e:
+            # Keep serving the snapshot we have; the next poll tries again
+            self._checked_at = time.monotonic()
+            log.warning("Prompt cache refresh failed", trigger=trigger, error=str(e))
+        finally:
+            self._refreshing = False
+
+    def _start_listener(self):
+        """LISTENs on PROMPT_CHANNEL from a thread of this process (threads do not survive a fork)."""
+        if engine.dialect.name != "postgresql":
+            log.warning("PROMPT_CACHE_LISTEN needs Postgres, polling only", dialect=engine.dialect.name)
+            self.listen = False
+            return
+        # Claimed under _load_lock like the poll, so concurrent readers start one listener
+        if not self._load_lock.acquire(blocking=False):
+            return
+        try:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        finally:
+            self._load_lock.release()
+        threading.Thread(target=self._listen, name="prompt-cache-listen", daemon=True).start()
+
+    def _listen(self):
+        pid = os.getpid()
+        while self._listener_pid == pid:
+            try:
+                connection = engine.raw_connection()
+                try:
+                    connection.driver_connection.autocommit = True
+                    connection.cursor().execute(f"LISTEN {PROMPT_CHANNEL}")
+                    # Changes made while the listener was down are picked up here
+                    self._refresh_quietly("notify")
+                    while self._listener_pid == pid:
+                        if select_fd.select([connection.driver_connection], [], [], 60) == ([], [], []):
+                            continue
+                        connection.driver_connection.poll()
+                        if connection.driver_connection.notifies:
+                            connection.driver_connection.notifies.clear()
+                            self._refresh_quietly("notify")
+                finally:
+                    connection.invalidate()
+            except Exception as e:
+                log.warning("Prompt change listener failed, retrying", error=str(e))
+                time.sleep(5)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "reloads": self.reloads}
+
+
+if PROMPT_CACHE == "snapshot":
+    prompt_cache = PromptCache(poll_seconds=None, listen=False)
+else:
+    prompt_cache = PromptCache()
+metrics.register_cache("prompts", prompt_cache.stats)
+
+
+def reload_prompts(trigger: str = "admin") -> dict:
+    """Loads a new snapshot now and swaps it in; raises if the database fails (the old one keeps serving)."""
+    started = time.perf_counter()
+    snapshot = prompt_cache.refresh(trigger, force=True)
+    return {"pid": os.getpid(), "seconds": round(time.perf_counter() - started, 4),
+            **{f"{field}_count": len(getattr(snapshot, field)) for field in _TABLES}}
+
+
+def reload_quietly(trigger: str):
     try:
-        prompt = session.query(ClassifierPrompt).filter(
-            ClassifierPrompt.specialty_name == specialty_name,
-            ClassifierPrompt.doctor_id == doctor_id
-        ).first()
-        return prompt.prompt_text if prompt else ""
-    finally:
-        session.close()
+        reload_prompts(trigger)
+    except Exception as e:
+        log.error("Prompt reload failed, keeping the previous snapshot", trigger=trigger, error=str(e))
 
-def get_questioner_prompt(prompt_key: str) -> str:
+
+def load_at_startup():
+    """Loads the snapshot at boot in "snapshot" mode; on failure the first lookup tries again."""
+    if PROMPT_CACHE == "snapshot":
+        reload_quietly("initial")
+
+
+def install_reload_signal():
+    """SIGHUP reloads the prompts, from a thread: a signal handler must not wait on the database."""
+    if PROMPT_CACHE == "off" or not hasattr(signal, "SIGHUP") or threading.current_thread() is not threading.main_thread():
+        return
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+        target=reload_quietly, args=("sighup",), name="prompt-reload", daemon=True).start())
+
+
+def _prompt_text(model, *criteria):
+    # The newest active version: a backward scan of the model's partial ix_*_active index, no sort
+    return select(model.prompt_text).where(*criteria, model.is_active.is_(True)).order_by(model.id.desc()).limit(1)
+
+
+def _query_first(statement) -> Optional[str]:
     session = SessionLocal()
     try:
-        prompt = session.query(QuestionerPrompt).filter(
-            QuestionerPrompt.prompt_key == prompt_key
-        ).first()
-        return prompt.prompt_text if prompt else ""
+        return session.execute(statement).scalar()
     finally:
         session.close()
 
+
+async def _aquery_first(statement) -> Optional[str]:
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(statement)).scalar()
+
+
+def _classifier_query(specialty_name: str, doctor_id: int):
+    return _prompt_text(ClassifierPrompt, ClassifierPrompt.specialty_name == specialty_name, ClassifierPrompt.doctor_id == doctor_id)
+
+
+def _questioner_query(prompt_key: str):
+    return _prompt_text(QuestionerPrompt, QuestionerPrompt.prompt_key == prompt_key)
+
+
+def _followup_questioner_query(prompt_key: str):
+    return _prompt_text(followUpQuestionerPrompt, followUpQuestionerPrompt.prompt_key == prompt_key)
+
+
+def get_classifier_prompt(specialty_name: str, doctor_id: int) -> str:
+    if PROMPT_CACHE == "off":
+        return _query_first(_classifier_query(specialty_name, doctor_id)) or ""
+    return prompt_cache.snapshot().classifier.get((specialty_name, doctor_id), "")
+
+
+def get_questioner_prompt(prompt_key: str) -> str:
+    if PROMPT_CACHE == "off":
+        return _query_first(_questioner_query(prompt_key)) or ""
+    return prompt_cache.snapshot().questioner.get(prompt_key, "")
+
+
 def get_followup_questioner_prompt(prompt_key: str) -> str:
-    session = SessionLocal()
-    try:
-        prompt = session.query(followUpQuestionerPrompt).filter(
-            followUpQuestionerPrompt.prompt_key == prompt_key
-        ).first()
-        return prompt.prompt_text if prompt else None
-    finally:
-        session.close()
\ No newline at end of file
+    if PROMPT_CACHE == "off":
+        return _query_first(_followup_questioner_query(prompt_key))
+    return prompt_cache.snapshot().followup_questioner.get(prompt_key)
+
+
+# Async variants for the ASGI serving path. With a cache they answer from the snapshot without
+# blocking the event loop (the first load in a process runs in a thread); with PROMPT_CACHE=off
+# they query through the async engine.
+
+async def aget_classifier_prompt(specialty_name: str, doctor_id: int) -> str:
+    if PROMPT_CACHE == "off":
+        return await _aquery_first(_classifier_query(specialty_name, doctor_id)) or ""
+    return (await prompt_cache.asnapshot()).classifier.get((specialty_name, doctor_id), "")
+
+
+async def aget_questioner_prompt(prompt_key: str) -> str:
+    if PROMPT_CACHE == "off":
+        return await _aquery_first(_questioner_query(prompt_key)) or ""
+    return (await prompt_cache.asnapshot()).questioner.get(prompt_key, "")
+
+
+async def aget_followup_questioner_prompt(prompt_key: str) -> str:
+    if PROMPT_CACHE == "off":
+        return await _aquery_first(_followup_questioner_query(prompt_key))
+    return (await prompt_cache.asnapshot()).followup_questioner.get(prompt_key)
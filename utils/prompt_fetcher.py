@@ -1,4 +1,7 @@
 import requests
+from utils.log import get_logger
+
+log = get_logger(__name__)
 
 MIDDLEWARE_URL = "http://localhost:8000"  # Change if your FastAPI runs elsewhere
 
@@ -11,7 +14,7 @@ def fetch_classifier_prompt(specialty_name: str, doctor_id: int) -> str:
         data = resp.json()
         return data.get("prompt_text", "")
     except Exception as e:
-        print(f"[PromptFetcher] Error fetching classifier prompt: {e}")
+        log.error("Error fetching classifier prompt: %s", e)
         return ""
 
 def fetch_questioner_prompt(prompt_key: str) -> str:
@@ -23,5 +26,5 @@ def fetch_questioner_prompt(prompt_key: str) -> str:
         data = resp.json()
         return data.get("prompt_text", "")
     except Exception as e:
-        print(f"[PromptFetcher] Error fetching questioner prompt: {e}")
+        log.error("Error fetching questioner prompt: %s", e)
         return "" 
\ No newline at end of file
@@ -0,0 +1,93 @@
+# utils/ttl_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = "missing"
+EXPIRED = "expired"
+FOUND = "found"
+_ABSENT = object()
+
+
+class TTLCache:
+    """
+    Thread-safe, bounded LRU map whose entries expire `ttl_seconds` after they were last written.
+
+    Capacity overflow evicts the least recently used entry; expired entries are dropped when they
+    are looked up or by sweep(). Counters for hits, misses, evictions and expirations are kept so
+    callers can expose them as metrics.
+    """
+
+    def __init__(self, capacity: int, ttl_seconds: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def lookup(self, key):
+        """Returns (value, FOUND), (None, EXPIRED) if the entry just expired, or (None, MISSING)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, MISSING
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None, EXPIRED
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, FOUND
+
+    def get(self, key, default=None):
+        value, state = self.lookup(key)
+        return value if state == FOUND else default
+
+    def set(self, key, value):
+        """Stores value, refreshing its TTL and LRU position, and evicts the oldest entries over capacity."""
+        with self._lock:
+            self._entries[key] = (value, self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def sweep(self) -> int:
+        """Drops every expired entry and returns how many were removed."""
+        now = self._clock()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+            self.expirations += len(expired)
+        return len(expired)
+
+    def __contains__(self, key):
+        return self.get(key, _ABSENT) is not _ABSENT
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }